@@ -30,6 +30,8 @@ from utils.mpt_monitor_helpers import (
     load_trade_log, save_trade_log_row, update_trade_log_row, delete_trade_log_row,
     run_refresh,
 )
+from utils.trade_paths import trade_path_stats_by_date
+from utils.trading_calendar import business_days_left
 
 
 def _friendly_leg_label(leg: str) -> str:
@@ -50,12 +52,7 @@ def _roll_day_label(today: date) -> str | None:
     'Roll day X' where X counts UP from the start of the roll window
     (1 = 5th-last BD, 5 = final BD). Returns None outside that window.
     Non-business days snap forward to the next BD's count."""
-    first_next = date(today.year + (today.month == 12), (today.month % 12) + 1, 1)
-    last_bd = np.busday_offset(np.datetime64(first_next, "D"), -1, roll="backward")
-    today64 = np.busday_offset(np.datetime64(today, "D"), 0, roll="forward")
-    if today64 > last_bd:
-        return None
-    bd_remaining = int(np.busday_count(today64, last_bd)) + 1  # inclusive of today
+    bd_remaining = int(business_days_left(today))  # inclusive of today; <= 0 once past
     if 1 <= bd_remaining <= 5:
         return f"Roll day {6 - bd_remaining}"  # 5th-last BD → 1, final BD → 5
     return None
@@ -548,8 +545,12 @@ if not trades.empty:
     st.markdown("**Recent closed trades (last 10)**")
     cols_show = ["entry_date", "exit_date", "side", "entry", "exit", "pnl",
                  "max_loss", "holding_bd", "exit_reason"]
+    # MFE / time-to-MAE / drawdown duration from the pick's EW_adj path.
+    paths = trade_path_stats_by_date(df["Date"], df["EW_adj"], trades) if not df.empty else None
     show = trades.sort_values("exit_date", ascending=False).head(10)[cols_show]
     show = show.copy()
+    if paths is not None:
+        show = show.join(paths[["mfe", "bars_to_mae", "drawdown_bars"]].round(3))
     show["entry_date"] = show["entry_date"].dt.date
     show["exit_date"] = show["exit_date"].dt.date
     st.dataframe(show, use_container_width=True, hide_index=True)
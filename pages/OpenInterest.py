@@ -6,15 +6,12 @@ warnings.filterwarnings("ignore")
 
 from utils.oi_constants import OI_V2_SYMBOLS, OI_V2_MONTHS, OI_V2_YEARS, OI_V2_FORWARDS_MOD
 from utils.oi_daily import (
-    get_combined_n_day_OI,
-    get_all_OI,
-    get_pivot_table,
     style_forward_cells,
-    plot_forwards_combined,
-    get_n_day_OI,
+    plot_forward_curves,
     get_OI_volume_table,
     format_last_refreshed,
 )
+from utils.oi_bundle import load_bundle, live_page_data
 
 st.set_page_config(layout="wide")
 st.title("Open Interest")
@@ -97,21 +94,23 @@ conv_factor_map = dict(zip(df[symbol_col], df[conversion_factor_col]))
 # ── Main content ────────────────────────────────────────────────────────────────
 if selected_symbols:
     try:
-        df_n_day = get_combined_n_day_OI(selected_symbols, OI_V2_MONTHS, OI_V2_YEARS, OI_V2_FORWARDS_MOD, conv_factor_map)
-        pivot_n_day = get_pivot_table(df_n_day)
-        styled_n_day = style_forward_cells(pivot_n_day)
+        # Nightly bundle (python -m utils.oi_bundle) when it covers the
+        # selection and its workbooks are unchanged, else one pass over each
+        # symbol's history.
+        bundle = load_bundle(OI_V2_MONTHS, OI_V2_YEARS, OI_V2_FORWARDS_MOD)
+        if bundle is not None and bundle.covers(selected_symbols) and bundle.is_current(selected_symbols):
+            data = bundle.page_data(selected_symbols, conv_factor_map)
+        else:
+            data = live_page_data(selected_symbols, OI_V2_MONTHS, OI_V2_YEARS, OI_V2_FORWARDS_MOD, conv_factor_map)
+        styled_n_day = style_forward_cells(data["pivot_n_day"])
 
-        df_terminal = get_all_OI(selected_symbols, OI_V2_MONTHS, OI_V2_YEARS, OI_V2_FORWARDS_MOD, conv_factor_map)
-        pivot_terminal = get_pivot_table(df_terminal)
-        styled_terminal = style_forward_cells(pivot_terminal)
+        df_terminal = data["terminal"]
+        styled_terminal = style_forward_cells(data["pivot_terminal"])
         latest_date = df_terminal["Date"].max()
 
         if len(selected_symbols) == 1:
             s = selected_symbols[0]
-            suffix = "price"
-            df_prices = get_n_day_OI(s, OI_V2_MONTHS, OI_V2_YEARS, OI_V2_FORWARDS_MOD, conv_factor_map, suffix)
-            pivot_prices = get_pivot_table(df_prices, suffix)
-            styled_prices = style_forward_cells(pivot_prices)
+            styled_prices = style_forward_cells(data["pivot_price"])
             price_unit_label = price_unit_map.get(s, "")
             oi_unit_label = oi_unit_map.get(s, "")
 
@@ -134,7 +133,7 @@ if selected_symbols:
                 st.markdown(f"#### Historical Nth-Day Prices ({price_unit_label})")
                 st.dataframe(styled_prices, height=460)
 
-        plot_forwards_combined(selected_symbols, OI_V2_FORWARDS_MOD, conv_factor_map)
+        plot_forward_curves(data["curves"], selected_symbols)
         if len(selected_symbols) == 1:
             get_OI_volume_table(selected_symbols[0])
 
@@ -1,16 +1,17 @@
 import streamlit as st
 import pandas as pd
-import urllib.parse
 import warnings
 warnings.filterwarnings("ignore")
 
 import matplotlib.colors as mcolors
+from io import BytesIO
+
+from utils.firebase_client import get_client
 
 st.set_page_config(layout="wide")
 
 # ── Config ────────────────────────────────────────────────────────
 
-FIREBASE_BUCKET = "hotei-streamlit.firebasestorage.app"
 FIREBASE_FOLDER = "ResidOI"
 FILENAME = "resid_oi_latest.xlsx"
 
@@ -63,24 +64,27 @@ def highlight_oi(val):
 
 # ── Fetch data ────────────────────────────────────────────────────
 
-@st.cache_data(ttl=300)
+def _read_resid_oi(source):
+    return {
+        'symbol_data': pd.read_excel(source, sheet_name='symbol_data'),
+        'meta': pd.read_excel(source, sheet_name='meta'),
+        'info': pd.read_excel(source, sheet_name='info'),
+    }
+
+def _parse_resid_oi(raw):
+    return _read_resid_oi(BytesIO(raw))
+
+@st.cache_data(ttl=60)
 def load_resid_oi():
     import os
-    def _read(source):
-        return {
-            'symbol_data': pd.read_excel(source, sheet_name='symbol_data'),
-            'meta': pd.read_excel(source, sheet_name='meta'),
-            'info': pd.read_excel(source, sheet_name='info'),
-        }
     if os.path.exists(LOCAL_FILE):
         try:
-            return _read(LOCAL_FILE)
+            return _read_resid_oi(LOCAL_FILE)
         except Exception:
             pass
-    encoded = urllib.parse.quote(FILENAME)
-    url = f"https://firebasestorage.googleapis.com/v0/b/{FIREBASE_BUCKET}/o/{FIREBASE_FOLDER}%2F{encoded}?alt=media"
     try:
-        return _read(url)
+        # Re-downloaded and re-parsed only when the blob's generation changes.
+        return get_client().get_parsed(f"{FIREBASE_FOLDER}/{FILENAME}", _parse_resid_oi)
     except Exception:
         return None
 
@@ -7,8 +7,6 @@ Layout: Dubai on row 1, SGO + SKO on row 2; each table is 1/4 of the page width.
 """
 import json
 import time
-import urllib.request
-import urllib.parse
 from datetime import datetime, timedelta, timezone
 
 import pandas as pd
@@ -16,10 +14,10 @@ import streamlit as st
 from streamlit_sortables import sort_items
 
 from utils import taps_alerts
+from utils.firebase_client import get_client
 
 st.set_page_config(page_title="TAPS", layout="wide")
 
-FIREBASE_BUCKET = "hotei-streamlit.firebasestorage.app"
 REMOTE_PATH = "taps/display.json"
 REFRESH_SEC = 30
 PAGE_POLL_SEC = 5   # page Firebase-read rate DURING the daemon's fast (10s ICE) window (NO ICE).
@@ -54,16 +52,12 @@ FAMILIES = {
 GRID_ORDER = ["Dubai", "Brent SMM", "S92", "MOPJ", "SGO", "SKO", "S0.5", "S380", "LSGO SMM"]
 
 
-def _public_url() -> str:
-    p = urllib.parse.quote(REMOTE_PATH, safe="")
-    return f"https://firebasestorage.googleapis.com/v0/b/{FIREBASE_BUCKET}/o/{p}?alt=media"
-
-
 def fetch():
     # cache-bust so a proxy can never hand us a stale copy
-    url = _public_url() + f"&_={int(time.time())}"
-    with urllib.request.urlopen(url, timeout=15) as r:
-        return json.loads(r.read().decode("utf-8"))
+    raw = get_client().get(REMOTE_PATH, params={"_": int(time.time())})
+    if raw is None:
+        raise FileNotFoundError(REMOTE_PATH)
+    return json.loads(raw.decode("utf-8"))
 
 
 # --- alert on first highlight -------------------------------------------------------
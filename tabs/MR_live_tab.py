@@ -1,15 +1,9 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
-from utils.plot_live import add_rolling_cols, plot_live_contract_roll_plotly
-from utils.backtest import generate_sd_entry_sd_exit_signals_with_rolling
+from utils.plot_live import plot_live_contract_roll_plotly
+from utils.backtest import render_backtest_results
 from utils.constants import DIFF_NAMES, CONTRACT_TYPES, MONTHS_SCENARIO_MAP, DIFFS_MAP
-from utils.month_offsets import get_price_series
-
-@st.cache_data(show_spinner=False)
-def load_price_data(diff_scenario, months_scenario, months_m1_lst, years):
-    df = get_price_series(diff_scenario, months_scenario, months_m1_lst, years)
-    return df
+from utils import compute
 
 def render():
     # Step 1: Set initial session state values (only if not already set)
@@ -58,32 +52,23 @@ def render():
             )
 
         # --- Load and Plot Data ---
-        # months_m1_lst = ["Mar", "Jun", "Sep", "Dec"]
-        months_m1_lst=["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-        _current_year_2d = datetime.now().year % 100
-        years = list(range(16, _current_year_2d + 1))
+        # Cached by id in utils.compute: no DataFrame is hashed on rerun.
+        version = compute.data_version()
+        df = compute.rolling_frame(diff_scenario, months_scenario, selected_rolling_window, selected_sd, version)
 
-        # Step 1: Load big data, cached
-        df_raw = load_price_data(diff_scenario, months_scenario, months_m1_lst, years)
-        # df = get_price_series(diff_scenario, months_scenario, months_m1_lst, years)
-        
-        if df_raw is None:
+        if df is None or df.empty:
+            st.warning("No data found")
             return
 
-        df = add_rolling_cols(df_raw, selected_rolling_window, selected_sd)
         plot_live_contract_roll_plotly(df, diff, selected_contract, selected_rolling_window, selected_sd)
 
     with col_right:
         try:
-            generate_sd_entry_sd_exit_signals_with_rolling(
-                df, 
-                diff, 
-                selected_contract,
-                'entry_norm_price', 
-                'exit_norm_price',
-                selected_rolling_window,
-                selected_sd
-            )
+            trades = compute.trades_table(diff, selected_contract, diff_scenario, months_scenario,
+                                          selected_rolling_window, selected_sd, version)
+            paths = compute.trade_paths(diff, selected_contract, diff_scenario, months_scenario,
+                                        selected_rolling_window, selected_sd, version)
+            render_backtest_results(trades, df['Date'].max(), path_stats=paths)
 
         except Exception as e:
             st.error(f"Error generating backtest results: {e}")
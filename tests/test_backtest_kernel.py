@@ -0,0 +1,89 @@
+"""Stop-loss, pause-after-stop and minimum-band rules of `run_sd_backtest`."""
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.backtest_kernel import MIN_BAND, run_sd_backtest
+
+PICKS_DIR = Path(__file__).resolve().parents[1] / "data" / "entry_var_shadow" / "picks"
+
+
+def _run(price, band=1.0, **kwargs):
+    n = len(price)
+    price = np.asarray(price, dtype=float)
+    mid = np.zeros(n)
+    kwargs = {"max_hold_days": None, "close_last": False, **kwargs}
+    return run_sd_backtest(pd.bdate_range("2024-01-01", periods=n), price, price, mid,
+                           mid + band, mid - band, np.zeros(n, dtype=bool), **kwargs)
+
+
+def _trades(res):
+    return list(zip(res["entry_idx"].tolist(), res["exit_idx"].tolist(),
+                    res["direction"].tolist(), res["stop"].tolist()))
+
+
+#        0  1  2  3  4  5    6    7    8    9    10    11   12   13   14    15
+PRICE = [0, 0, 0, 0, 0, 1.2, 1.5, 2.0, 1.5, 1.5, -1.5, 0.2, 0.5, 1.3, -0.1, 0]
+
+
+def test_stop_exits_at_stop_distance():
+    res = _run(PRICE, stop_dist=np.full(len(PRICE), 0.5))
+    # Short at 1.2; 1.5 is 0.3 against it, 2.0 is 0.8 >= 0.5: stopped on bar 7.
+    assert _trades(res)[0] == (5, 7, -1, True)
+    assert res["returns"][0] == pytest.approx(-0.8)
+
+
+def test_median_exit_wins_over_stop_on_same_bar():
+    price = [0, 0, 1.2, -3.0, 0]
+    res = _run(price, stop_dist=np.full(len(price), 0.5), band=1.0)
+    # -3.0 would be a stop for a long, but for the short it is a median exit.
+    assert _trades(res)[0] == (2, 3, -1, False)
+
+
+def test_pause_after_stop_blocks_the_stopped_side_only():
+    res = _run(PRICE, stop_dist=np.full(len(PRICE), 0.5), pause_after_stop=True)
+    # Shorts on bars 8-9 are paused; the long on bar 10 is not, and bar 10
+    # (back at or below the median) clears the short pause for bar 13.
+    assert _trades(res) == [(5, 7, -1, True), (10, 11, 1, False), (13, 14, -1, False)]
+
+    unpaused = _run(PRICE, stop_dist=np.full(len(PRICE), 0.5))
+    assert _trades(unpaused)[1][:3] == (8, 10, -1)
+
+
+def test_min_band_blocks_narrow_bands():
+    price = [0, 0.2, 0, -0.25, 0, 0]
+    assert len(_run(price, band=0.2)["entry_idx"]) == 2
+    assert len(_run(price, band=0.2, min_band=MIN_BAND)["entry_idx"]) == 0
+    assert len(_run(price, band=MIN_BAND)["entry_idx"]) == 0
+    assert len(_run([0, 0.3, 0, -0.3, 0, 0], band=MIN_BAND, min_band=MIN_BAND)["entry_idx"]) == 2
+
+
+@pytest.mark.parametrize("name", [
+    "S92-BrtM11box_W3M_SE1.0_SL3.0_SLP0",
+    "FEI_Propane-MOPJ_NaphM11box_W3M_SE1.0_SL1.0_SLP0",
+    "RegradeM31_W12M_SE1.0_SL1.0_SLP0",
+])
+def test_replays_shadow_pick(name):
+    """The pick's own bands reproduce its exported trade list, stops included."""
+    if not (PICKS_DIR / f"{name}__df.parquet").exists():
+        pytest.skip("shadow picks not available")
+    se, sl = map(float, re.search(r"_SE([\d.]+)_SL([\d.]+)_", name).groups())
+    df = pd.read_parquet(PICKS_DIR / f"{name}__df.parquet")
+    trades = pd.read_parquet(PICKS_DIR / f"{name}__trades.parquet")
+    px = df["EW_adj"].to_numpy()
+    mid, upper = df["rolling_median"].to_numpy(), df["upper_bound"].to_numpy()
+    res = run_sd_backtest(df["Date"].to_numpy(), px, px, mid, upper, df["lower_bound"].to_numpy(),
+                          np.zeros(len(df), dtype=bool), max_hold_days=None, close_last=False,
+                          stop_dist=sl * (upper - mid) / se, pause_after_stop=True,
+                          min_band=MIN_BAND)
+    dates = df["Date"].to_numpy()
+    got = pd.DataFrame({"entry_date": dates[res["entry_idx"]], "exit_date": dates[res["exit_idx"]],
+                        "stop": res["stop"]})
+    # The trades file was exported before the last bars of the frame.
+    got = got[got["entry_date"] <= trades["exit_date"].max()].reset_index(drop=True)
+    want = pd.DataFrame({"entry_date": trades["entry_date"], "exit_date": trades["exit_date"],
+                         "stop": trades["exit_reason"].eq("stop")})
+    pd.testing.assert_frame_equal(got, want, check_dtype=False)
@@ -0,0 +1,19 @@
+"""`trade_path_stats_by_date` on trades that do not line up with the bars."""
+import numpy as np
+import pandas as pd
+
+from utils.trade_paths import trade_path_stats_by_date
+
+
+def test_trades_off_the_bars_get_nan_stats():
+    dates = pd.bdate_range("2024-01-01", periods=10)
+    trades = pd.DataFrame({
+        "entry_date": pd.to_datetime(["2024-01-02", "2024-01-06", "2024-02-01", "2024-01-03"]),
+        "exit_date": pd.to_datetime(["2024-01-05", "2024-01-09", "2024-02-05", "2024-03-01"]),
+        "side": ["long", "short", "long", "long"],
+    })
+    # Entry on a Saturday, entry after the last bar, exit after the last bar.
+    stats = trade_path_stats_by_date(dates, np.arange(10.0), trades)
+    assert list(stats.index) == list(trades.index)
+    assert stats.loc[0, "returns"] == 3.0 and stats.loc[0, "holding_bars"] == 3
+    assert stats.loc[1:].isna().all().all()
@@ -0,0 +1,34 @@
+"""Atomic file replacement safe across threads and processes.
+
+Writers open a uniquely named temporary file next to the target and
+`os.replace` it over the target when done, so readers see either the old
+or the new file, and two concurrent writers never share (or delete) each
+other's temporary file.
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+
+@contextmanager
+def atomic_path(fp):
+    """Yield a fresh temporary path in `fp`'s directory; on success it
+    replaces `fp`, on error it is removed.
+
+        with atomic_path(fp) as tmp:
+            df.to_parquet(tmp)
+    """
+    fp = Path(fp)
+    fp.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=fp.parent, prefix=f".{fp.name}.", suffix=".tmp",
+                                     delete=False) as f:
+        tmp = Path(f.name)
+    try:
+        yield tmp
+        os.replace(tmp, fp)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
@@ -0,0 +1,221 @@
+"""Incremental backtest refresh from persisted kernel checkpoints.
+
+A checkpoint holds everything the array kernel needs to continue a cell
+(diff_scenario × months_scenario × window × SD) from where it stopped: the
+in-trade flag, direction, entry date, entry (anchor) price, running
+trade_low/high, returns/max_loss banked on earlier contract legs, the
+skip-next-entry flag, plus every trade already closed.
+
+The last bar of any run is end-of-data (a still-open trade is force-closed
+there), so the checkpoint is taken one bar earlier and that final exit is
+recomputed on each refresh. A refresh therefore processes only the bars after
+the checkpoint, O(new bars) instead of O(history).
+
+`get_price_series` back-adjusts older contracts relative to the newest one,
+so a new contract shifts the whole normalised history by a constant. The
+checkpoint stores the prices of its last few bars to detect that shift and
+re-base the carried prices, plus a hash of the whole consumed prefix (dates
+and bar-to-bar price changes, which a constant shift leaves alone), so a
+revision anywhere in history triggers a full replay.
+
+Files live under `data/backtest_checkpoints/` as one JSON file per cell.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.atomic_file import atomic_path
+from utils.backtest_kernel import (contract_end_mask, display_contract, run_sd_backtest,
+                                   trades_from_result)
+
+CHECKPOINT_DIR = Path(__file__).resolve().parents[1] / "data" / "backtest_checkpoints"
+CHECKPOINT_VERSION = 2
+# Bars of exit price kept to measure the constant shift of a re-based history.
+N_REF_BARS = 5
+REF_TOL = 1e-9
+# Price changes are hashed on this grid, well above re-basing round-off.
+PREFIX_QUANTUM = 1e-8
+
+
+def checkpoint_key(diff_scenario, months_scenario, window: str, sd_entry) -> str:
+    return f"{'|'.join(diff_scenario)}__{months_scenario[0]}-{months_scenario[1]}__{window}__{sd_entry}sd"
+
+
+def _checkpoint_path(key: str, checkpoint_dir: Path) -> Path:
+    # Keys contain '+', '|' and '.', so hash them into a safe file name.
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return Path(checkpoint_dir) / f"{digest}.json"
+
+
+def load_checkpoint(key: str, checkpoint_dir: Path = CHECKPOINT_DIR) -> dict | None:
+    fp = _checkpoint_path(key, checkpoint_dir)
+    if not fp.exists():
+        return None
+    try:
+        ckpt = json.loads(fp.read_text())
+    except (OSError, ValueError):
+        return None
+    if ckpt.get("version") != CHECKPOINT_VERSION or ckpt.get("key") != key:
+        return None
+    return ckpt
+
+
+def save_checkpoint(key: str, ckpt: dict, checkpoint_dir: Path = CHECKPOINT_DIR) -> None:
+    # Sessions on the same cell may save at once: unique temp file per writer.
+    with atomic_path(_checkpoint_path(key, checkpoint_dir)) as tmp:
+        tmp.write_text(json.dumps(ckpt))
+
+
+def _prefix_hash(dates: np.ndarray, entry_px: np.ndarray, exit_px: np.ndarray) -> str:
+    """Hash of bars' dates and price changes: unchanged by a constant shift
+    of the prices, changed by any revised, inserted or removed bar."""
+    h = hashlib.sha1(dates.astype("datetime64[ns]").view(np.int64).tobytes())
+    for px in (entry_px, exit_px):
+        steps = np.round(np.diff(px) / PREFIX_QUANTUM)
+        h.update(np.where(np.isnan(steps), np.iinfo(np.int64).min, steps).astype(np.int64).tobytes())
+        h.update(np.isnan(px).tobytes())
+    return h.hexdigest()
+
+
+def _resume_point(ckpt: dict | None, dates: np.ndarray, entry_px: np.ndarray,
+                  exit_px: np.ndarray) -> tuple[int, float] | None:
+    """(first bar to process, price shift) or None if a full replay is needed."""
+    if ckpt is None:
+        return None
+    c = int(np.searchsorted(dates, np.datetime64(ckpt["last_date"], "ns")))
+    if c >= len(dates) - 1 or dates[c] != np.datetime64(ckpt["last_date"], "ns"):
+        return None
+    ref = np.asarray(ckpt["ref_prices"], dtype=float)
+    lo = c + 1 - len(ref)
+    if lo < 0:
+        return None
+    now = exit_px[lo:c + 1]
+    shift = float(now[-1] - ref[-1])
+    if not np.allclose(now - shift, ref, rtol=0.0, atol=REF_TOL, equal_nan=True):
+        return None
+    if ckpt.get("prefix_hash") != _prefix_hash(dates[:c + 1], entry_px[:c + 1], exit_px[:c + 1]):
+        return None
+    return c + 1, shift
+
+
+def _rebase_state(state: dict, shift: float) -> dict:
+    state = dict(state)
+    if state.get("in_trade") and shift:
+        for field in ("anchor", "trade_low", "trade_high"):
+            state[field] = state[field] + shift
+    return state
+
+
+def _trade_records(res: dict, offset: int, dates: np.ndarray, labels: list,
+                   carried: dict | None) -> list[dict]:
+    """Closed trades from one kernel run as JSON-able records."""
+    contracts = [[] for _ in range(len(res["entry_idx"]))]
+    for tr, end in zip(res["leg_trade"].tolist(), res["leg_end"].tolist()):
+        contracts[tr].append(labels[offset + end])
+    records = []
+    for i, (k, j) in enumerate(zip(res["entry_idx"].tolist(), res["exit_idx"].tolist())):
+        if k == -1:
+            entry_date = carried["entry_date"]
+            legs = carried["contracts"] + contracts[i]
+        else:
+            entry_date = str(dates[offset + k])[:10]
+            legs = contracts[i]
+        records.append({
+            "direction": int(res["direction"][i]),
+            "entry_date": entry_date,
+            "exit_date": str(dates[offset + j])[:10],
+            "returns": float(res["returns"][i]),
+            "max_loss": float(res["max_loss"][i]),
+            "contracts": legs,
+        })
+    return records
+
+
+def _open_trade(state: dict, offset: int, labels: list, carried: dict | None) -> dict | None:
+    """Entry date and banked contract labels of a trade left open by a run."""
+    if not state.get("in_trade"):
+        return None
+    legs = [labels[offset + e] for e in state["leg_ends"]]
+    entry_date = str(np.datetime64(state["entry_time"], "ns"))[:10]
+    if carried is not None and entry_date == carried["entry_date"]:
+        legs = carried["contracts"] + legs
+    return {"entry_date": entry_date, "contracts": legs}
+
+
+def _records_to_table(records: list[dict], diff: str, window: str, sd_entry) -> pd.DataFrame:
+    n = len(records)
+    dates = np.array([r["entry_date"] for r in records] + [r["exit_date"] for r in records],
+                     dtype="datetime64[ns]")
+    res = {
+        "entry_idx": np.arange(n, dtype=np.int64),
+        "exit_idx": np.arange(n, 2 * n, dtype=np.int64),
+        "direction": np.array([r["direction"] for r in records], dtype=np.int64),
+        "returns": np.array([r["returns"] for r in records], dtype=float),
+        "max_loss": np.array([r["max_loss"] for r in records], dtype=float),
+        "leg_trade": np.repeat(np.arange(n, dtype=np.int64), [len(r["contracts"]) for r in records]),
+    }
+    labels = [c for r in records for c in r["contracts"]]
+    res["leg_end"] = np.arange(len(labels), dtype=np.int64)
+    # Labels are already in display form, so pass them through unchanged.
+    return trades_from_result(res, dates, labels, diff, "", window, sd_entry)
+
+
+def incremental_trades_table(df: pd.DataFrame, diff: str, selected_contract: str,
+                             entry_col: str, exit_col: str, window: str, sd_entry,
+                             key: str, checkpoint_dir: Path = CHECKPOINT_DIR) -> pd.DataFrame:
+    """Same table as `build_trades_table`, resumed from the cell's checkpoint.
+
+    `df` must carry the rolling columns for at least the bars after the
+    checkpoint. The checkpoint is rewritten at the second-to-last bar."""
+    dates = pd.to_datetime(df['Date']).to_numpy(dtype="datetime64[ns]")
+    entry_px = df[entry_col].to_numpy(dtype=float)
+    exit_px = df[exit_col].to_numpy(dtype=float)
+    mid = df['rolling_median'].to_numpy(dtype=float)
+    upper = df['upper_bound'].to_numpy(dtype=float)
+    lower = df['lower_bound'].to_numpy(dtype=float)
+    contract_end = contract_end_mask(df['exit_contract_month'].to_numpy())
+    labels = [display_contract(c, selected_contract) for c in df['exit_contract'].tolist()]
+    n = len(dates)
+
+    ckpt = load_checkpoint(key, checkpoint_dir)
+    resume = _resume_point(ckpt, dates, entry_px, exit_px)
+    if resume is None:
+        start, state, records, carried = 0, None, [], None
+    else:
+        start, shift = resume
+        state = _rebase_state(ckpt["state"], shift)
+        records = list(ckpt["trades"])
+        carried = ckpt.get("open_trade")
+
+    def run(lo, hi, state, close_last):
+        return run_sd_backtest(dates[lo:hi], entry_px[lo:hi], exit_px[lo:hi], mid[lo:hi],
+                               upper[lo:hi], lower[lo:hi], contract_end[lo:hi],
+                               state=state, close_last=close_last)
+
+    # Bars up to the second-to-last are final; checkpoint after them.
+    if n >= 2 and start <= n - 2:
+        res = run(start, n - 1, state, close_last=False)
+        records += _trade_records(res, start, dates, labels, carried)
+        carried = _open_trade(res["state"], start, labels, carried)
+        state = res["state"]
+        save_checkpoint(key, {
+            "version": CHECKPOINT_VERSION,
+            "key": key,
+            "last_date": str(dates[n - 2])[:10],
+            "ref_prices": exit_px[max(n - 1 - N_REF_BARS, 0):n - 1].tolist(),
+            "prefix_hash": _prefix_hash(dates[:n - 1], entry_px[:n - 1], exit_px[:n - 1]),
+            "state": state,
+            "open_trade": carried,
+            "trades": records,
+        }, checkpoint_dir)
+        start = n - 1
+
+    # The final bar is provisional: recomputed on every refresh.
+    final = run(start, n, state, close_last=True)
+    provisional = _trade_records(final, start, dates, labels, carried)
+    return _records_to_table(records + provisional, diff, window, sd_entry)
@@ -0,0 +1,370 @@
+"""Array-based SD entry / median exit backtest kernel.
+
+Pure NumPy + pandas (no Streamlit) so it can be called from pages, batch
+scripts and sweeps alike. Reproduces the rules of the original row-by-row
+loop in `utils/backtest.py`:
+
+  * FLAT: enter LONG when entry price <= lower band, else SHORT when entry
+    price >= upper band (long is checked first).
+  * IN TRADE: exit LONG when exit price >= median, SHORT when exit price <=
+    median, on the last bar of data, or once 90 calendar days have passed
+    since entry (time stop). A time stop suppresses the next bar's entry.
+  * On the last day of a contract (while still in the trade after the exit
+    check) the position is rolled: the leg P&L is banked at the exit price
+    and the trade re-anchors at the next contract's entry price.
+
+Optional production rules (the `_SL<x>_SLP0` cells of the MPT monitor):
+
+  * Minimum band (`min_band`): no entry while the band half-width SE·sigma
+    (`upper - mid` for shorts, `mid - lower` for longs) is below `min_band`.
+    Production uses `MIN_BAND` (0.30 price units); every shadow pick's
+    `sigma_entry × SE` is at least that.
+  * Stop-loss: with `stop_dist` (SL × rolling std per bar) a trade also exits
+    once its roll-adjusted P&L falls to -stop_dist at the entry bar, i.e. at
+    `sl_price = entry ∓ SL·sigma_entry`. A median exit on the same bar wins.
+  * Pause after stop (`pause_after_stop`): after a stopped LONG no new long is
+    entered until the exit price is back at or above the median (SHORT:
+    at or below), as in the monitor's "cooldown after stop". The other side
+    may still trade. Production cells run with `max_hold_days=None`.
+
+Instead of walking every bar, the kernel jumps from event to event with
+`searchsorted` over precomputed candidate indices, so the Python loop runs
+once per trade rather than once per row. Per-leg P&L and low/high water marks
+are then computed for all legs at once with segment reductions.
+"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+MAX_HOLD_DAYS = 90
+# Narrowest band half-width (price units) production enters on.
+MIN_BAND = 0.30
+
+TRADE_COLUMNS = [
+    "trade_direction",
+    "entry_date",
+    "exit_date",
+    "returns",
+    "max_loss",
+    "holding_period",
+    "contracts",
+    "year",
+    "rolling_window",
+    "entry_sd",
+    "diff",
+]
+
+
+def contract_end_mask(contract_months) -> np.ndarray:
+    """True on the last bar of each contract (and on the last bar of data)."""
+    months = np.asarray(contract_months, dtype=object)
+    end = np.ones(len(months), dtype=bool)
+    if len(months) > 1:
+        end[:-1] = months[1:] != months[:-1]
+    return end
+
+
+def flat_state() -> dict:
+    """Kernel state before the first bar: flat, nothing banked."""
+    return {"in_trade": False, "skip_next_entry": False}
+
+
+def _empty_result(state: dict) -> dict:
+    ints = np.empty(0, dtype=np.int64)
+    return {
+        "entry_idx": ints, "exit_idx": ints, "direction": ints,
+        "returns": np.empty(0), "max_loss": np.empty(0),
+        "time_stop": np.empty(0, dtype=bool), "stop": np.empty(0, dtype=bool),
+        "leg_trade": ints, "leg_start": ints, "leg_end": ints,
+        "leg_returns": np.empty(0), "leg_max_loss": np.empty(0),
+        "state": dict(state), "carried_in": False,
+    }
+
+
+def run_sd_backtest(dates, entry_px, exit_px, mid, upper, lower, contract_end,
+                    max_hold_days: int | None = MAX_HOLD_DAYS, state: dict | None = None,
+                    close_last: bool = True, stop_dist=None,
+                    pause_after_stop: bool = False, min_band: float | None = None) -> dict:
+    """Run the SD-entry / median-exit state machine over aligned arrays.
+
+    `dates` must be ascending. `entry_px` / `exit_px` are the normalised entry
+    and exit prices, `mid` / `upper` / `lower` the rolling median and bands
+    (NaN where the window is not yet full), `contract_end` the boolean mask
+    from `contract_end_mask`.
+
+    `max_hold_days=None` disables the time stop. `stop_dist` (per bar, in
+    price units), `pause_after_stop` and `min_band` enable the production
+    rules above.
+
+    Returns a dict of arrays, one row per closed trade:
+        entry_idx, exit_idx, direction (+1 long / -1 short), returns,
+        max_loss, time_stop, stop
+    plus one row per contract leg of those trades:
+        leg_trade, leg_start, leg_end, leg_returns, leg_max_loss
+    and `state`, the machine state after the last bar (see `flat_state`).
+
+    With `close_last` (the default) the final bar is end of data: a trade
+    still open there is force-closed, and a trade entered on it is dropped.
+    Pass `close_last=False` to stop short of that and carry an open trade in
+    `state` instead; feeding that `state` to the next call over the following
+    bars continues exactly where this one stopped. A trade carried in from
+    `state` reports entry_idx -1 and, in its open-trade fields, any legs
+    banked before this call (`returns`, `max_loss`, `trade_low`/`trade_high`).
+    """
+    t = np.asarray(dates, dtype="datetime64[ns]").astype(np.int64)
+    entry_px = np.asarray(entry_px, dtype=float)
+    exit_px = np.asarray(exit_px, dtype=float)
+    mid = np.asarray(mid, dtype=float)
+    n = len(t)
+    if n > 1 and np.any(t[1:] < t[:-1]):
+        raise ValueError("dates must be sorted ascending")
+    state = flat_state() if state is None else state
+    if n == 0:
+        return _empty_result(state)
+
+    upper = np.asarray(upper, dtype=float)
+    lower = np.asarray(lower, dtype=float)
+    is_long_entry = entry_px <= lower
+    is_short_entry = entry_px >= upper
+    if min_band is not None:
+        is_long_entry &= mid - lower >= min_band
+        is_short_entry &= upper - mid >= min_band
+    long_entries = np.flatnonzero(is_long_entry)
+    short_entries = np.flatnonzero(is_short_entry)
+    long_exits = np.flatnonzero(exit_px >= mid)
+    short_exits = np.flatnonzero(exit_px <= mid)
+    end_mask = np.asarray(contract_end, dtype=bool)
+    ends = np.flatnonzero(end_mask)
+    hold_ns = None if max_hold_days is None else np.int64(max_hold_days) * np.int64(86_400 * 10**9)
+    last_exit_bar = n - 1 if close_last else n
+    if stop_dist is not None:
+        stop_dist = np.asarray(stop_dist, dtype=float)
+        # Roll gaps removed from the price path, so a stop sees the trade's
+        # roll-adjusted P&L: roll_gap[b] sums (entry - exit) over rolls before b.
+        gap = np.where(end_mask, entry_px - exit_px, 0.0)
+        roll_gap = np.concatenate(([0.0], np.cumsum(np.nan_to_num(gap))))
+
+    def first_after(idx, start):
+        i = np.searchsorted(idx, start)
+        return int(idx[i]) if i < len(idx) else n
+
+    entry_idx, exit_idx, direction, time_stop, stop = [], [], [], [], []
+    leg_trade, leg_start, leg_end = [], [], []
+    open_trade = None
+
+    carried = state if state.get("in_trade") else None
+    pos = 1 if (carried is None and state.get("skip_next_entry")) else 0
+    # Side whose entries are paused after a stop (+1 long, -1 short, 0 none).
+    block = int(state.get("block", 0))
+    while True:
+        if carried is not None:
+            k = -1
+            is_long = carried["direction"] == 1
+            t_entry = np.int64(carried["entry_time"])
+        else:
+            # The pause clears on the first flat bar back across the median.
+            clear = n
+            if block == 1:
+                clear = first_after(long_exits, pos)
+            elif block == -1:
+                clear = first_after(short_exits, pos)
+            k_long = first_after(long_entries, max(pos, clear) if block == 1 else pos)
+            k_short = first_after(short_entries, max(pos, clear) if block == -1 else pos)
+            k = min(k_long, k_short)
+            if k >= n or (k >= n - 1 and close_last):
+                if clear < n:
+                    block = 0
+                break
+            if clear <= k:
+                block = 0
+            is_long = k_long <= k_short
+            t_entry = t[k]
+        exits = long_exits if is_long else short_exits
+        x = np.searchsorted(exits, k, side="right")
+        j_signal = int(exits[x]) if x < len(exits) else n
+        j_time = n if hold_ns is None else int(np.searchsorted(t, t_entry + hold_ns, side="left"))
+        j = min(j_signal, j_time, last_exit_bar)
+        j_stop = n
+        if stop_dist is not None:
+            if k == -1:
+                lo, banked, anchor0, dist = 0, carried["returns"], carried["anchor"], carried.get("stop_dist", np.nan)
+            else:
+                lo, banked, anchor0, dist = k + 1, 0.0, entry_px[k], stop_dist[k]
+            hi = min(j, n - 1) + 1
+            if lo < hi and dist == dist:
+                sign = 1.0 if is_long else -1.0
+                path = banked + sign * (exit_px[lo:hi] - (roll_gap[lo:hi] - roll_gap[lo]) - anchor0)
+                hit = np.flatnonzero(path <= -dist)
+                if len(hit):
+                    j_stop = lo + int(hit[0])
+                    j = min(j, j_stop)
+
+        rolls = ends[np.searchsorted(ends, k, side="right"):np.searchsorted(ends, j, side="left")]
+        bounds = [k, *rolls.tolist(), j]
+        trade_no = len(entry_idx)
+        leg_trade.extend([trade_no] * (len(bounds) - 1))
+        leg_start.extend(bounds[:-1])
+        leg_end.extend(bounds[1:])
+
+        entry_idx.append(k)
+        exit_idx.append(j)
+        direction.append(1 if is_long else -1)
+        if j >= n:
+            # Still open after the last bar: the final "leg" is unbanked.
+            open_trade = {"entry_time": int(t_entry), "carried": k == -1,
+                          "stop_dist": (carried.get("stop_dist", np.nan) if k == -1
+                                        else (stop_dist[k] if stop_dist is not None else np.nan))}
+            break
+        stopped = j == j_time
+        stop_loss = j == j_stop and j != j_signal and not stopped
+        time_stop.append(stopped)
+        stop.append(stop_loss)
+        if stop_loss and pause_after_stop:
+            block = 1 if is_long else -1
+        pos = j + 2 if stopped else j + 1
+        carried = None
+
+    leg_trade = np.asarray(leg_trade, dtype=np.int64)
+    leg_start = np.asarray(leg_start, dtype=np.int64)
+    leg_end = np.asarray(leg_end, dtype=np.int64)
+    direction = np.asarray(direction, dtype=np.int64)
+
+    # ── Per-leg P&L via segment reductions over (start, end] ──────────
+    # Leg start -1 is a trade carried in from `state`; its anchor and
+    # running extremes come from the state. Leg end n is the open leg.
+    padded = np.append(exit_px, np.nan)
+    anchor = np.where(leg_start >= 0, entry_px[np.maximum(leg_start, 0)],
+                      state.get("anchor", np.nan))
+    if len(leg_start):
+        idx = np.empty(2 * len(leg_start), dtype=np.int64)
+        idx[0::2] = leg_start + 1
+        idx[1::2] = np.minimum(leg_end + 1, n)
+        seg_low = np.fmin(anchor, np.fmin.reduceat(padded, idx)[0::2])
+        seg_high = np.fmax(anchor, np.fmax.reduceat(padded, idx)[0::2])
+        if leg_start[0] == -1:
+            seg_low[0] = np.fmin(seg_low[0], state["trade_low"])
+            seg_high[0] = np.fmax(seg_high[0], state["trade_high"])
+        empty = leg_start + 1 >= np.minimum(leg_end + 1, n)
+        seg_low[empty] = np.where(leg_start[empty] == -1, state.get("trade_low", np.nan), anchor[empty])
+        seg_high[empty] = np.where(leg_start[empty] == -1, state.get("trade_high", np.nan), anchor[empty])
+    else:
+        seg_low = seg_high = np.empty(0)
+    leg_long = direction[leg_trade] == 1 if len(leg_trade) else np.empty(0, dtype=bool)
+    leg_exit = padded[np.minimum(leg_end, n)]
+    leg_returns = np.where(leg_long, leg_exit - anchor, anchor - leg_exit)
+    leg_max_loss = np.where(leg_long, seg_low - anchor, anchor - seg_high)
+
+    # Sequential accumulation keeps the float results bit-identical to the
+    # original `trade_returns += ...` loop.
+    returns = np.zeros(len(entry_idx))
+    max_loss = np.zeros(len(entry_idx))
+    if carried_in := state.get("in_trade", False):
+        returns[0] = state["returns"]
+        max_loss[0] = state["max_loss"]
+    banked = leg_end < n
+    for tr, r, m, b in zip(leg_trade.tolist(), leg_returns.tolist(),
+                           leg_max_loss.tolist(), banked.tolist()):
+        if b:
+            returns[tr] += r
+            max_loss[tr] += m
+
+    if open_trade is not None:
+        last = len(entry_idx) - 1
+        open_leg = len(leg_start) - 1
+        new_state = {
+            "in_trade": True,
+            "skip_next_entry": False,
+            "direction": int(direction[last]),
+            "entry_time": open_trade["entry_time"],
+            "anchor": float(anchor[open_leg]),
+            "trade_low": float(seg_low[open_leg]),
+            "trade_high": float(seg_high[open_leg]),
+            "returns": float(returns[last]),
+            "max_loss": float(max_loss[last]),
+            "leg_ends": leg_end[leg_trade == last][:-1].tolist(),
+            "stop_dist": float(open_trade["stop_dist"]),
+            "block": block,
+        }
+        n_closed = last
+    else:
+        new_state = {"in_trade": False, "skip_next_entry": pos == n + 1, "block": block}
+        n_closed = len(entry_idx)
+
+    closed_legs = leg_trade < n_closed
+    return {
+        "entry_idx": np.asarray(entry_idx[:n_closed], dtype=np.int64),
+        "exit_idx": np.asarray(exit_idx[:n_closed], dtype=np.int64),
+        "direction": direction[:n_closed],
+        "returns": returns[:n_closed],
+        "max_loss": max_loss[:n_closed],
+        "time_stop": np.asarray(time_stop, dtype=bool),
+        "stop": np.asarray(stop, dtype=bool),
+        "leg_trade": leg_trade[closed_legs],
+        "leg_start": leg_start[closed_legs],
+        "leg_end": leg_end[closed_legs],
+        "leg_returns": leg_returns[closed_legs],
+        "leg_max_loss": leg_max_loss[closed_legs],
+        "state": new_state,
+        "carried_in": carried_in,
+    }
+
+
+def display_contract(contract: str, selected_contract: str) -> str:
+    """Contract label as shown in the trades table ("Jun25/Sep25" for boxes)."""
+    if selected_contract == "Box":
+        return contract.replace('-', '/')
+    if selected_contract == "Outright":
+        return contract[:5]
+    return contract
+
+
+def build_trades_table(df: pd.DataFrame, diff: str, selected_contract: str,
+                       entry_col: str, exit_col: str, window: str, sd_entry) -> pd.DataFrame:
+    """Full-history trades table for one (window, sd_entry) cell.
+
+    `df` is a `get_price_series` frame with `add_rolling_cols` applied. The
+    frame is not modified. Columns follow `TRADE_COLUMNS`."""
+    dates = pd.to_datetime(df['Date']).to_numpy()
+    res = run_sd_backtest(
+        dates,
+        df[entry_col].to_numpy(dtype=float),
+        df[exit_col].to_numpy(dtype=float),
+        df['rolling_median'].to_numpy(dtype=float),
+        df['upper_bound'].to_numpy(dtype=float),
+        df['lower_bound'].to_numpy(dtype=float),
+        contract_end_mask(df['exit_contract_month'].to_numpy()),
+    )
+    return trades_from_result(res, dates, df['exit_contract'].to_numpy(),
+                              diff, selected_contract, window, sd_entry)
+
+
+def trades_from_result(res: dict, dates, exit_contracts, diff: str, selected_contract: str,
+                       window: str, sd_entry) -> pd.DataFrame:
+    """Turn a `run_sd_backtest` result into the dashboard's trades table."""
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    n_trades = len(res["entry_idx"])
+    contracts = [[] for _ in range(n_trades)]
+    for tr, end in zip(res["leg_trade"].tolist(), res["leg_end"].tolist()):
+        contracts[tr].append(display_contract(exit_contracts[end], selected_contract))
+
+    entry_dates = dates[res["entry_idx"]]
+    exit_dates = dates[res["exit_idx"]]
+    temp = pd.DataFrame({
+        "trade_direction": res["direction"],
+        "entry_date": pd.to_datetime(entry_dates).strftime("%Y-%m-%d"),
+        "exit_date": pd.to_datetime(exit_dates).strftime("%Y-%m-%d"),
+        "returns": res["returns"].round(2),
+        "max_loss": res["max_loss"].round(2),
+        "holding_period": np.busday_count(entry_dates.astype('datetime64[D]'),
+                                          exit_dates.astype('datetime64[D]')),
+        "contracts": contracts,
+        "year": pd.to_datetime(entry_dates).year.astype(np.int32),
+        "rolling_window": window,
+        "entry_sd": sd_entry,
+        "diff": diff,
+    })
+    # A forced exit on a missing price leaves NaN P&L; the original loop
+    # dropped those rows, so do the same.
+    temp = temp.dropna(subset=["returns", "max_loss"]).reset_index(drop=True)
+    return temp[TRADE_COLUMNS]
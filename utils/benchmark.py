@@ -0,0 +1,259 @@
+"""Offline benchmarks for the dashboard's slow paths.
+
+Times `get_price_series`, `add_rolling_cols`, the backtest trades table and
+`compute_daily_pnl` at several history lengths, using only the bundled
+parquet data — no Firebase access:
+
+- `data/raw_products/<P>/M1..M6.parquet` are expanded into the per-contract
+  `<P>_<Mon>` sheets `calculate_outright` expects and handed to
+  `get_price_series` through its `df_cache` argument;
+- `data/spreads/*.parquet` (continuous `EW_adj` series, no contract rolls)
+  are run through `add_rolling_cols` and the trades table together, as the
+  many-spread screens do;
+- `data/entry_var_shadow/picks/*__df.parquet` / `*__trades.parquet` feed
+  `compute_daily_pnl`.
+
+Each case records the best and median wall time over `--repeat` runs and the
+peak traced allocation (tracemalloc, which includes NumPy buffers). The JSON
+report can be compared against a stored baseline; the run exits non-zero if
+any case slowed down by more than `--tolerance`.
+
+Usage:
+    python -m utils.benchmark --out bench_report.json
+    python -m utils.benchmark --save-baseline data/bench_baseline.json
+    python -m utils.benchmark --baseline data/bench_baseline.json --tolerance 0.25
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.backtest_kernel import build_trades_table
+from utils.month_offsets import get_price_series, month_dct
+from utils.mpt_monitor_helpers import compute_daily_pnl
+from utils.plot_live import add_rolling_cols
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+RAW_DIR = DATA_DIR / "raw_products"
+SPREADS_DIR = DATA_DIR / "spreads"
+PICKS_DIR = DATA_DIR / "entry_var_shadow" / "picks"
+
+# Box on two bundled products, as the MR tab builds it.
+DIFF_SCENARIO = ("SYS-SZS", "SYS-SZS")
+MONTHS_SCENARIO = (1, 4)
+MONTHS_M1_LST = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+# Years of history per case; None is the full 2016+ history.
+HISTORY_YEARS = [2, 5, None]
+ROLLING_WINDOW = '3m'
+ENTRY_SD = 2
+# compute_daily_pnl is timed over the first few picks to keep a run short.
+MAX_PICKS = 8
+
+
+# ── Fixtures ──────────────────────────────────────────────────────────
+
+def product_sheets(product: str) -> dict[tuple[str, str], pd.DataFrame]:
+    """(product, month) -> contract sheet built from the M1..M6 parquet files.
+
+    Contract `MonYY` on date t is priced from `M{k}`, k the number of months
+    between t and delivery (1..6), so each contract has a ~6-month history."""
+    tenors = {}
+    for k in range(1, 7):
+        fp = RAW_DIR / product / f"M{k}.parquet"
+        if fp.exists():
+            s = pd.read_parquet(fp).set_index('Date')['EW_adj']
+            tenors[k] = s
+    if not tenors:
+        raise FileNotFoundError(f"no M*.parquet for {product} in {RAW_DIR}")
+    frames = []
+    for k, s in tenors.items():
+        idx = pd.to_datetime(s.index)
+        delivery = idx.to_period('M') + k
+        frames.append(pd.DataFrame({
+            'Date': idx,
+            'contract': [f"{p.strftime('%b')}{p.year % 100}" for p in delivery],
+            'price': s.to_numpy(dtype=float),
+        }))
+    df = pd.concat(frames, ignore_index=True).sort_values(['contract', 'Date'], ignore_index=True)
+    month = df['contract'].str[:3]
+    return {(product, m): df[month == m].reset_index(drop=True) for m in month_dct}
+
+
+def series_cache(diff_scenario=DIFF_SCENARIO) -> dict:
+    products = {p.strip() for leg in diff_scenario for p in leg.replace('+', '-').split('-')}
+    cache = {}
+    for product in sorted(products):
+        cache.update(product_sheets(product))
+    return cache
+
+
+def history_years(n_years: int | None) -> list[int]:
+    last = datetime.now().year % 100
+    first = 16 if n_years is None else max(16, last - n_years + 1)
+    return list(range(first, last + 1))
+
+
+def spread_fixtures() -> list[tuple[str, pd.DataFrame]]:
+    """(name, frame) per `data/spreads/*.parquet`, shaped like a
+    `get_price_series` frame with one contract spanning the whole history."""
+    out = []
+    for fp in sorted(SPREADS_DIR.glob("*.parquet")):
+        df = pd.read_parquet(fp, columns=['Date', 'EW_adj'])
+        out.append((fp.stem, pd.DataFrame({
+            'Date': pd.to_datetime(df['Date']),
+            'entry_norm_price': df['EW_adj'].to_numpy(dtype=float),
+            'exit_norm_price': df['EW_adj'].to_numpy(dtype=float),
+            'exit_contract': fp.stem,
+            'exit_contract_month': fp.stem,
+        })))
+    return out
+
+
+def pick_fixtures(max_picks: int = MAX_PICKS) -> list[tuple[str, pd.Series, pd.DataFrame]]:
+    out = []
+    for fp in sorted(PICKS_DIR.glob("*__df.parquet"))[:max_picks]:
+        trades_fp = fp.with_name(fp.name.replace("__df", "__trades"))
+        if not trades_fp.exists():
+            continue
+        df = pd.read_parquet(fp)
+        ew = pd.Series(df['EW_adj'].to_numpy(), index=pd.to_datetime(df['Date']))
+        out.append((fp.name.split("__")[0], ew, pd.read_parquet(trades_fp)))
+    return out
+
+
+# ── Runner ────────────────────────────────────────────────────────────
+
+def measure(fn, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'best_s': round(min(times), 6),
+        'median_s': round(statistics.median(times), 6),
+        'peak_mb': round(peak / 2**20, 3),
+    }
+
+
+def run_benchmarks(repeat: int = 3, history=HISTORY_YEARS) -> list[dict]:
+    cache = series_cache()
+    spreads = spread_fixtures()
+    picks = pick_fixtures()
+    results = []
+
+    def record(name, n_years, n_rows, fn):
+        res = {'case': name, 'history': 'full' if n_years is None else f'{n_years}y', 'rows': n_rows}
+        res.update(measure(fn, repeat))
+        results.append(res)
+        print(f"{name:<20} {res['history']:>5} {n_rows:>7} rows  "
+              f"best {res['best_s'] * 1e3:9.2f} ms  peak {res['peak_mb']:8.2f} MB")
+
+    for n_years in history:
+        years = history_years(n_years)
+
+        def build():
+            return get_price_series(DIFF_SCENARIO, MONTHS_SCENARIO, MONTHS_M1_LST, years,
+                                    df_cache=dict(cache))
+        df = build()
+        record('get_price_series', n_years, len(df), build)
+
+        record('add_rolling_cols', n_years, len(df),
+               lambda: add_rolling_cols(df, ROLLING_WINDOW, ENTRY_SD))
+
+        rolled = add_rolling_cols(df, ROLLING_WINDOW, ENTRY_SD)
+        record('backtest_trades', n_years, len(df),
+               lambda: build_trades_table(rolled, 'bench', 'Box', 'entry_norm_price', 'exit_norm_price',
+                                          ROLLING_WINDOW, ENTRY_SD))
+
+        start = pd.Timestamp(2000 + years[0], 1, 1)
+        if spreads:
+            cut_spreads = [(name, df[df['Date'] >= start].reset_index(drop=True)) for name, df in spreads]
+
+            def spread_backtests():
+                for name, df in cut_spreads:
+                    build_trades_table(add_rolling_cols(df, ROLLING_WINDOW, ENTRY_SD), name, 'EW',
+                                       'entry_norm_price', 'exit_norm_price', ROLLING_WINDOW, ENTRY_SD)
+            record('spread_backtests', n_years, sum(len(df) for _, df in cut_spreads), spread_backtests)
+
+        if picks:
+            cut = [(ew[ew.index >= start], trades) for _, ew, trades in picks]
+            cal_years = sorted({d.year for ew, _ in cut for d in ew.index})
+
+            def daily_pnl():
+                for ew, trades in cut:
+                    for year in cal_years:
+                        compute_daily_pnl(trades, ew, year)
+            record('compute_daily_pnl', n_years, sum(len(ew) for ew, _ in cut), daily_pnl)
+    return results
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    """Cases whose best time grew by more than `tolerance` (fraction) vs baseline."""
+    base = {(r['case'], r['history']): r for r in baseline.get('results', [])}
+    regressions = []
+    for r in results:
+        b = base.get((r['case'], r['history']))
+        if b is None or not b['best_s']:
+            continue
+        change = r['best_s'] / b['best_s'] - 1
+        r['vs_baseline'] = round(change, 3)
+        if change > tolerance:
+            regressions.append(f"{r['case']} ({r['history']}): {b['best_s'] * 1e3:.2f} ms -> "
+                               f"{r['best_s'] * 1e3:.2f} ms (+{change:.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the dashboard hot paths")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default="bench_report.json")
+    parser.add_argument("--baseline", help="report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown vs baseline, as a fraction (default 0.25)")
+    parser.add_argument("--save-baseline", help="also write the report here as the new baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(repeat=args.repeat)
+    regressions = []
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'repeat': args.repeat,
+        'results': results,
+        'regressions': regressions,
+    }
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2))
+    print(f"{len(results)} cases -> {args.out}")
+
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
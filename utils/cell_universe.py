@@ -0,0 +1,200 @@
+"""Regenerate the per-family cell universe from the bundled spreads.
+
+Every spread in `data/spreads/index.json` is run through the array kernel for
+each window × entry SD × stop-loss cell with the production rules of the MPT
+monitor: entry only on bands at least `MIN_BAND` wide, exit at the rolling
+median, stop-loss at `entry ∓ SL·sigma_entry`, a pause after a stop until the
+spread is back across the median (SLP0) and no time stop. The result is the daily close-to-close P&L per cell, laid out
+like `data/perfamily/<F>/cells.parquet` (`Date` + one column per cell named
+`<fname>_W<W>M_SE<SE>_SL<SL>_SLP0`) with a matching `meta.json`.
+
+The spreads are loaded once, aligned on one date axis and published through
+shared memory as in `utils.scoreboard`; a task is `(series_row, window)` and
+runs every SE × SL cell for that window off one rolling median/std pass.
+
+`data/spreads/` ships one shape per diff, so only those shapes are
+regenerated — not every shape of the original per-family export.
+
+Usage:
+    python -m utils.cell_universe --out-dir data/perfamily_local
+    python -m utils.cell_universe --families C D --windows 3 6
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.backtest_kernel import MIN_BAND, run_sd_backtest
+from utils.constants import TRADING_DAYS_MAP
+from utils.scoreboard import _SHARED, _attach, publish_arrays, release
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+SPREADS_DIR = DATA_DIR / "spreads"
+OUT_DIR = DATA_DIR / "perfamily_local"
+
+WINDOWS = [3, 6, 12]
+ENTRY_SDS = [1.0, 2.0, 3.0]
+STOP_SDS = [1.0, 2.0, 3.0]
+
+# `product_group` of the spreads index -> family folder under data/perfamily.
+FAMILY_MAP = {"Crude": "C", "Dist": "D", "GTGN": "D", "FO": "F", "Lights": "L", "IP": "I"}
+
+
+def cell_name(fname: str, window: int, sd: float, sl: float) -> str:
+    return f"{fname}_W{window}M_SE{float(sd):.1f}_SL{float(sl):.1f}_SLP0"
+
+
+# ── Series loading ────────────────────────────────────────────────────
+
+def load_spreads(families=None, spreads_dir: Path = SPREADS_DIR) -> tuple[pd.DataFrame, dict]:
+    """Index entries (one row per spread) and their aligned `EW_adj` arrays.
+
+    Returns (series_meta, arrays) with `dates` (n_dates,), `present`
+    (n_series, n_dates), True on a spread's own rows, and `ew`, NaN where a
+    spread has no bar."""
+    index = json.loads((spreads_dir / "index.json").read_text())
+    meta, frames = [], []
+    for entry in index:
+        family = FAMILY_MAP.get(entry["product_group"], entry["product_group"])
+        if families and family not in families:
+            continue
+        fp = spreads_dir / entry["data_file"]
+        if not fp.exists():
+            print(f"{entry['fname']}: skipped (no {fp.name})")
+            continue
+        meta.append({"family": family, "diff": entry["diff"], "shape": entry["shape"],
+                     "fname": entry["fname"]})
+        frames.append(pd.read_parquet(fp, columns=["Date", "EW_adj"]))
+
+    if not frames:
+        return pd.DataFrame(meta), {"dates": np.empty(0, dtype="datetime64[ns]"),
+                                    "present": np.empty((0, 0), dtype=bool), "ew": np.empty((0, 0))}
+    dates = np.unique(np.concatenate(
+        [pd.to_datetime(df["Date"]).to_numpy(dtype="datetime64[ns]") for df in frames]))
+    present = np.zeros((len(frames), len(dates)), dtype=bool)
+    ew = np.full((len(frames), len(dates)), np.nan)
+    for i, df in enumerate(frames):
+        pos = np.searchsorted(dates, pd.to_datetime(df["Date"]).to_numpy(dtype="datetime64[ns]"))
+        present[i, pos] = True
+        ew[i, pos] = df["EW_adj"].to_numpy(dtype=float)
+    return pd.DataFrame(meta), {"dates": dates, "present": present, "ew": ew}
+
+
+# ── Daily P&L ─────────────────────────────────────────────────────────
+
+def daily_pnl(ew: np.ndarray, res: dict, entry_bar_open: int | None = None) -> np.ndarray:
+    """Close-to-close MTM per bar for one kernel result.
+
+    A trade entered on bar k and closed on bar j earns dir·(ew[b] - ew[b-1])
+    for b in (k, j], as in `compute_daily_pnl`; an open trade accrues up to
+    the last bar."""
+    n = len(ew)
+    position = np.zeros(n + 1)
+    np.add.at(position, res["entry_idx"] + 1, res["direction"])
+    np.add.at(position, res["exit_idx"] + 1, -res["direction"])
+    if entry_bar_open is not None:
+        position[entry_bar_open + 1] += res["state"]["direction"]
+    position = np.cumsum(position[:n])
+    move = np.diff(ew, prepend=ew[:1])
+    return np.where(position != 0, position * move, 0.0)
+
+
+# ── Worker ────────────────────────────────────────────────────────────
+
+def _run_cells(row: int, window: int, sds: tuple, sls: tuple) -> list[tuple[int, float, float, np.ndarray, int]]:
+    """Every SE × SL cell of one spread × window. Returns (window, sd, sl, pnl, n_trades)."""
+    present = _SHARED["present"][row]
+    dates = _SHARED["dates"][present]
+    ew = _SHARED["ew"][row][present]
+    no_rolls = np.zeros(len(ew), dtype=bool)
+
+    n = TRADING_DAYS_MAP[window]
+    rolling = pd.Series(ew).rolling(n, min_periods=n)
+    median, std = rolling.median().to_numpy(), rolling.std().to_numpy()
+    out = []
+    for sd in sds:
+        upper, lower = median + sd * std, median - sd * std
+        for sl in sls:
+            res = run_sd_backtest(dates, ew, ew, median, upper, lower, no_rolls,
+                                  max_hold_days=None, close_last=False,
+                                  stop_dist=sl * std, pause_after_stop=True, min_band=MIN_BAND)
+            open_bar = None
+            if res["state"]["in_trade"]:
+                open_bar = int(np.searchsorted(dates, np.datetime64(res["state"]["entry_time"], "ns")))
+            pnl = np.zeros(len(present))
+            pnl[present] = daily_pnl(ew, res, open_bar)
+            out.append((window, sd, sl, pnl, len(res["entry_idx"]) + (open_bar is not None)))
+    return out
+
+
+# ── Universe ──────────────────────────────────────────────────────────
+
+def run_universe(meta: pd.DataFrame, arrays: dict, windows=WINDOWS, sds=ENTRY_SDS,
+                 sls=STOP_SDS, workers: int | None = None) -> dict[str, tuple[pd.DataFrame, dict]]:
+    """{family: (cells, meta)} for every spread × window × SE × SL cell."""
+    handles, spec = publish_arrays(arrays)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(spec,)) as executor:
+            futures = {(row, w): executor.submit(_run_cells, row, w, tuple(sds), tuple(sls))
+                       for row in range(len(meta)) for w in windows}
+            results = {key: f.result() for key, f in futures.items()}
+    finally:
+        release(handles)
+
+    dates = pd.DatetimeIndex(arrays["dates"])
+    columns: dict[str, dict[str, np.ndarray]] = {}
+    cell_meta: dict[str, dict] = {}
+    for (row, _), cells in results.items():
+        info = meta.iloc[row]
+        for window, sd, sl, pnl, n_trades in cells:
+            name = cell_name(info["fname"], window, sd, sl)
+            columns.setdefault(info["family"], {})[name] = pnl
+            cell_meta.setdefault(info["family"], {})[name] = {
+                "diff": info["diff"], "shape": info["shape"],
+                "family_tag": f"{info['family']}_{info['diff']}_{info['shape']}",
+                "num_trades": int(n_trades),
+            }
+
+    out = {}
+    for family, cols in columns.items():
+        cells = pd.DataFrame(cols, index=dates)
+        out[family] = (cells.rename_axis("Date").reset_index(), cell_meta[family])
+    return out
+
+
+def write_universe(universe: dict[str, tuple[pd.DataFrame, dict]], out_dir: Path = OUT_DIR) -> None:
+    for family, (cells, meta) in universe.items():
+        fam_dir = Path(out_dir) / family
+        fam_dir.mkdir(parents=True, exist_ok=True)
+        cells.to_parquet(fam_dir / "cells.parquet", index=False)
+        (fam_dir / "meta.json").write_text(json.dumps(meta, indent=2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regenerate per-family cell P&L from data/spreads")
+    parser.add_argument("--families", nargs="*", help="family letters, e.g. C D (default: all)")
+    parser.add_argument("--windows", nargs="*", type=int, default=WINDOWS, help="months, e.g. 3 6 12")
+    parser.add_argument("--entry-sds", nargs="*", type=float, default=ENTRY_SDS)
+    parser.add_argument("--stop-sds", nargs="*", type=float, default=STOP_SDS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out-dir", default=str(OUT_DIR))
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    meta, arrays = load_spreads(args.families)
+    universe = run_universe(meta, arrays, args.windows, args.entry_sds, args.stop_sds, args.workers)
+    write_universe(universe, Path(args.out_dir))
+    n_cells = sum(cells.shape[1] - 1 for cells, _ in universe.values())
+    print(f"{len(meta)} spreads, {n_cells} cells in {time.perf_counter() - t0:.1f}s -> {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Cached computation layer for the mean-reversion tabs, keyed by identifiers.
+
+Every cached function here takes only small hashable arguments
+(diff_scenario, months_scenario, window, SD, data version), so a cache lookup
+hashes a handful of strings instead of a multi-thousand-row DataFrame.
+Results live in `st.cache_resource`: one shared object per key, never pickled
+or copied per rerun. Callers must treat them as read-only; derived frames are
+built with `assign`, which under pandas copy-on-write shares the parent's
+columns instead of duplicating them per window/SD variant.
+
+`data_version()` is the calendar day: the Firebase workbooks are refreshed
+once per day, so a new day maps to new cache keys.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime
+
+import pandas as pd
+import streamlit as st
+
+from utils.backtest_checkpoint import checkpoint_key, incremental_trades_table
+from utils.backtest_kernel import contract_end_mask
+from utils.constants import TRADING_DAYS_MAP
+from utils.series_cache import cached_price_series
+from utils.trade_paths import trade_path_stats_by_date
+
+MONTHS_M1_LST = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def data_version() -> str:
+    return date.today().isoformat()
+
+
+def default_years() -> tuple[int, ...]:
+    return tuple(range(16, datetime.now().year % 100 + 1))
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def price_series(diff_scenario: tuple, months_scenario: tuple, version: str,
+                 months_m1_lst: tuple = MONTHS_M1_LST, years: tuple | None = None) -> pd.DataFrame | None:
+    """`get_price_series` output with `Date` parsed; shared, read-only.
+
+    Backed by the on-disk series cache, so a restart only rebuilds series
+    whose source workbooks changed."""
+    years = default_years() if years is None else years
+    df = cached_price_series(diff_scenario, months_scenario, months_m1_lst, years)
+    if df is None or df.empty:
+        return df
+    return df.assign(Date=pd.to_datetime(df['Date']))
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def rolling_stats(diff_scenario: tuple, months_scenario: tuple, rolling_window: str,
+                  version: str) -> pd.DataFrame | None:
+    """Rolling median/std of `exit_norm_price` for one window (no SD yet)."""
+    df = price_series(diff_scenario, months_scenario, version)
+    if df is None or df.empty:
+        return df
+    window = TRADING_DAYS_MAP[int(rolling_window[:-1])]
+    rolling = df['exit_norm_price'].rolling(window=window, min_periods=window)
+    return pd.DataFrame({'rolling_median': rolling.median(), 'rolling_std': rolling.std()}, index=df.index)
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def rolling_frame(diff_scenario: tuple, months_scenario: tuple, rolling_window: str, sd,
+                  version: str) -> pd.DataFrame | None:
+    """Price series plus rolling median/std and the ±SD bands."""
+    df = price_series(diff_scenario, months_scenario, version)
+    stats = rolling_stats(diff_scenario, months_scenario, rolling_window, version)
+    if df is None or df.empty:
+        return df
+    return df.assign(
+        rolling_median=stats['rolling_median'],
+        rolling_std=stats['rolling_std'],
+        upper_bound=stats['rolling_median'] + sd * stats['rolling_std'],
+        lower_bound=stats['rolling_median'] - sd * stats['rolling_std'],
+    )
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def trades_table(diff: str, selected_contract: str, diff_scenario: tuple, months_scenario: tuple,
+                 rolling_window: str, sd, version: str) -> pd.DataFrame:
+    """Backtest trades for one cell, resumed from its on-disk checkpoint."""
+    df = rolling_frame(diff_scenario, months_scenario, rolling_window, sd, version)
+    return incremental_trades_table(
+        df, diff, selected_contract, 'entry_norm_price', 'exit_norm_price', rolling_window, sd,
+        key=checkpoint_key(diff_scenario, months_scenario, rolling_window, sd),
+    )
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def trade_paths(diff: str, selected_contract: str, diff_scenario: tuple, months_scenario: tuple,
+                rolling_window: str, sd, version: str) -> pd.DataFrame:
+    """MAE/MFE and path stats for `trades_table` rows (same index)."""
+    df = price_series(diff_scenario, months_scenario, version)
+    trades = trades_table(diff, selected_contract, diff_scenario, months_scenario, rolling_window, sd, version)
+    return trade_path_stats_by_date(
+        df['Date'], df['exit_norm_price'], trades, entry_px=df['entry_norm_price'],
+        contract_end=contract_end_mask(df['exit_contract_month'].to_numpy()),
+    )
@@ -67,6 +67,15 @@ MONTHS_SCENARIO_MAP = {
 }
 
 
+# Mapping of rolling-window months to approximate trading days
+TRADING_DAYS_MAP = {
+    1: 22, 2: 44, 3: 65, 4: 87, 5: 108,
+    6: 130, 9: 195, 12: 260,
+    15: 325, 18: 390, 21: 455, 24: 520,
+    27: 585, 30: 650, 33: 715, 36: 780
+}
+
+
 DIFFS_MAP = {
     '[Crude] Brt-Dub': [('BSP','DBI'), ('BSP-DBI','BSP-DBI')],
     '[Crude] Dated-Brt': [('PDB','BSP'), ('PDB-BSP','PDB-BSP')],
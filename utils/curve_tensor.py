@@ -0,0 +1,181 @@
+"""Dense date × product × tenor tensor of the bundled raw-product curves.
+
+`data/raw_products/<PRODUCT>/M1..M6.parquet` hold one tenor each, so a box on
+two products opens and date-merges four files. The builder packs every
+product and tenor into one float64 array on the union of their dates:
+
+    data/curve_tensor/values.npy   (n_products, n_tenors, n_dates), NaN where no bar
+    data/curve_tensor/mask.npy     same shape, True where a bar exists
+    data/curve_tensor/dates.npy    (n_dates,) datetime64[ns], ascending
+    data/curve_tensor/index.json   products, tenors, source mtimes
+
+The `.npy` files are opened memory-mapped, so loading is instant and a leg
+(`values[p, t]`, contiguous over dates) is a zero-copy view. A rebuild
+writes every file to a fresh temporary file and renames it over the old
+one, so a process still mapping the old arrays keeps reading them intact. Expressions
+are compiled with `utils.expressions` and evaluated as array arithmetic in
+term order, so `spread(expr, k)` equals the leg-by-leg `weighted_sum` on the
+same tenor. Calendar spreads, boxes and flies are signed sums of one
+expression over tenors (`combine(expr, {1: 1, 4: -1})`).
+
+Usage:
+    python -m utils.curve_tensor
+    python -m utils.curve_tensor --raw-dir data/raw_products --out-dir data/curve_tensor
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.atomic_file import atomic_path
+from utils.expressions import ExpressionCompiler, default_compiler
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+RAW_DIR = DATA_DIR / "raw_products"
+TENSOR_DIR = DATA_DIR / "curve_tensor"
+TENSOR_VERSION = 1
+
+
+def _sources(raw_dir: Path) -> dict[str, dict[str, int]]:
+    """{product: {"M1": mtime_ns, ...}} for every M<k>.parquet under raw_dir."""
+    out: dict[str, dict[str, int]] = {}
+    for fp in sorted(Path(raw_dir).glob("*/M*.parquet")):
+        out.setdefault(fp.parent.name, {})[fp.stem] = fp.stat().st_mtime_ns
+    return out
+
+
+# ── Build ─────────────────────────────────────────────────────────────
+
+def _save(fp: Path, arr: np.ndarray) -> None:
+    """`np.save` to a new file replacing `fp`; never rewrites a mapped file."""
+    with atomic_path(fp) as tmp, open(tmp, "wb") as f:
+        np.save(f, arr)
+
+
+def build_tensor(raw_dir: Path = RAW_DIR, out_dir: Path = TENSOR_DIR) -> Path:
+    """Pack every product × tenor under `raw_dir` into `out_dir`."""
+    raw_dir, out_dir = Path(raw_dir), Path(out_dir)
+    sources = _sources(raw_dir)
+    products = sorted(sources)
+    tenors = sorted({int(k[1:]) for files in sources.values() for k in files})
+
+    legs = {}
+    for product in products:
+        for name in sources[product]:
+            df = pd.read_parquet(raw_dir / product / f"{name}.parquet", columns=["Date", "EW_adj"])
+            legs[(product, int(name[1:]))] = (
+                pd.to_datetime(df["Date"]).to_numpy(dtype="datetime64[ns]"),
+                df["EW_adj"].to_numpy(dtype=float))
+    dates = np.unique(np.concatenate([d for d, _ in legs.values()])) if legs else \
+        np.empty(0, dtype="datetime64[ns]")
+
+    values = np.full((len(products), len(tenors), len(dates)), np.nan)
+    for (product, tenor), (d, v) in legs.items():
+        values[products.index(product), tenors.index(tenor), np.searchsorted(dates, d)] = v
+
+    _save(out_dir / "values.npy", values)
+    _save(out_dir / "mask.npy", ~np.isnan(values))
+    _save(out_dir / "dates.npy", dates)
+    with atomic_path(out_dir / "index.json") as tmp:
+        tmp.write_text(json.dumps({
+            "version": TENSOR_VERSION,
+            "products": products,
+            "tenors": tenors,
+            "n_dates": len(dates),
+            "first_date": str(dates[0])[:10] if len(dates) else None,
+            "last_date": str(dates[-1])[:10] if len(dates) else None,
+            "sources": sources,
+        }, indent=1))
+    return out_dir
+
+
+def is_stale(raw_dir: Path = RAW_DIR, out_dir: Path = TENSOR_DIR) -> bool:
+    try:
+        index = json.loads((Path(out_dir) / "index.json").read_text())
+    except (OSError, ValueError):
+        return True
+    return index.get("version") != TENSOR_VERSION or index.get("sources") != _sources(raw_dir)
+
+
+# ── Load ──────────────────────────────────────────────────────────────
+
+class CurveTensor:
+    """Memory-mapped curve tensor with product/tenor lookups."""
+
+    def __init__(self, out_dir: Path = TENSOR_DIR, mmap: bool = True):
+        out_dir = Path(out_dir)
+        index = json.loads((out_dir / "index.json").read_text())
+        mode = "r" if mmap else None
+        self.products: list[str] = index["products"]
+        self.tenors: list[int] = index["tenors"]
+        self.values = np.load(out_dir / "values.npy", mmap_mode=mode)
+        self.mask = np.load(out_dir / "mask.npy", mmap_mode=mode)
+        self.dates = pd.DatetimeIndex(np.load(out_dir / "dates.npy"))
+        self._p = {p: i for i, p in enumerate(self.products)}
+        self._t = {t: i for i, t in enumerate(self.tenors)}
+
+    def leg(self, product: str, tenor: int) -> np.ndarray:
+        """Prices of one product tenor on `dates` (NaN where no bar); a view."""
+        try:
+            return self.values[self._p[product], self._t[tenor]]
+        except KeyError:
+            raise KeyError(f"{product} M{tenor} not in curve tensor") from None
+
+    def series(self, product: str, tenor: int) -> pd.Series:
+        """One leg as the `M<k>.parquet` file has it: dated, without gaps."""
+        p, t = self._p[product], self._t[tenor]
+        present = self.mask[p, t]
+        return pd.Series(self.values[p, t][present], index=self.dates[present], name="EW_adj")
+
+    def combine(self, expr: str, tenor_weights: dict[int, float],
+                compiler: ExpressionCompiler | None = None) -> pd.Series:
+        """Σ_k w_k · expr(M_k) on the dates where every leg of every tenor
+        has a bar. Terms are added tenor by tenor, leg by leg."""
+        terms = (compiler or default_compiler()).terms(expr)
+        total = None
+        for tenor, tw in tenor_weights.items():
+            for product, w in terms:
+                coef = w * tw
+                leg = self.leg(product, tenor)
+                term = leg if coef == 1.0 else (-leg if coef == -1.0 else coef * leg)
+                total = term if total is None else total + term
+        keep = ~np.isnan(total)
+        return pd.Series(total[keep], index=self.dates[keep])
+
+    def spread(self, expr: str, tenor: int, compiler: ExpressionCompiler | None = None) -> pd.Series:
+        return self.combine(expr, {tenor: 1.0}, compiler)
+
+    def calendar(self, expr: str, near: int, far: int) -> pd.Series:
+        return self.combine(expr, {near: 1.0, far: -1.0})
+
+    def fly(self, expr: str, near: int, mid: int, far: int) -> pd.Series:
+        return self.combine(expr, {near: 1.0, mid: -2.0, far: 1.0})
+
+
+def load_tensor(raw_dir: Path = RAW_DIR, out_dir: Path = TENSOR_DIR) -> CurveTensor:
+    """The tensor under `out_dir`, rebuilt first if missing or older than its sources."""
+    if is_stale(raw_dir, out_dir):
+        build_tensor(raw_dir, out_dir)
+    return CurveTensor(out_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack data/raw_products into a memory-mapped curve tensor")
+    parser.add_argument("--raw-dir", default=str(RAW_DIR))
+    parser.add_argument("--out-dir", default=str(TENSOR_DIR))
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    out_dir = build_tensor(Path(args.raw_dir), Path(args.out_dir))
+    tensor = CurveTensor(out_dir)
+    print(f"{len(tensor.products)} products × {len(tensor.tenors)} tenors × {len(tensor.dates)} dates "
+          f"({tensor.values.nbytes / 2**20:.1f} MB) in {time.perf_counter() - t0:.1f}s -> {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Synthetic-product expressions compiled to flat linear combinations.
+
+An expression is a signed sum of terms, each an optional coefficient and a
+name: `"SGO - ICEGO"`, `"BTD+BSP"`, `"0.5 * S380 + 0.5 * S180"`. Names are raw
+products (`BSP`, `Swap_IPE_GO_FP`) or keys of `data/raw_products/aliases.json`,
+which expand recursively (`GO_EW` -> `SGO - ICEGO` -> `GST + Swap_IPE_GO_FP -
+ULA - Swap_IPE_GO_FP`). Alias keys may themselves contain operators
+(`"Brt-Dub"`, `"GO_EW-TC5"`); the longest key matching at a term boundary wins.
+
+`terms(expr)` yields the flat leg-by-leg `((raw product, coefficient), ...)`
+with every alias expanded in place; `compile(expr)` folds it into
+`{raw product: coefficient}` in order of first appearance (products whose
+coefficients cancel are kept with weight 0). Every alias is expanded once per
+compiler and reused by every expression that mentions it.
+
+Evaluation aligns the legs on their common dates and adds the terms one by
+one, left to right, so for ±1 coefficients the result equals the old
+leg-by-leg merge bit for bit, also when a product repeats
+(`SRS-GST+SRS-GST`) or cancels (`Swap_IPE_GO_FP+ULJ-Swap_IPE_GO_FP`). Folded
+weights would round differently there (about 1e-14), so they are used only
+to decide which legs to load.
+`LegCache` memoises loaded legs by (product, key), so building many
+expressions that share SGO, ICEGO or Brt loads each raw tenor once.
+"""
+from __future__ import annotations
+
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Hashable
+
+import numpy as np
+import pandas as pd
+
+ALIASES_FP = Path(__file__).resolve().parents[1] / "data" / "raw_products" / "aliases.json"
+
+_NUMBER = re.compile(r"\d+(\.\d*)?|\.\d+")
+
+
+@lru_cache(maxsize=4)
+def _read_aliases(path: str) -> tuple[tuple[str, str], ...]:
+    fp = Path(path)
+    if not fp.exists():
+        return ()
+    return tuple(json.loads(fp.read_text()).items())
+
+
+def load_aliases(path: Path = ALIASES_FP) -> dict[str, str]:
+    return dict(_read_aliases(str(path)))
+
+
+# ── Compiler ──────────────────────────────────────────────────────────
+
+class ExpressionCompiler:
+    """Compiles expressions against one alias table, memoising every alias."""
+
+    def __init__(self, aliases: dict[str, str] | None = None):
+        self.aliases = load_aliases() if aliases is None else dict(aliases)
+        # Longest first, so "GO_EW-TC5" wins over "GO_EW" at the same position.
+        self._keys = sorted(self.aliases, key=len, reverse=True)
+        self._memo: dict[str, tuple[tuple[str, float], ...]] = {}
+        self._weights: dict[str, dict[str, float]] = {}
+
+    def terms(self, expr: str) -> tuple[tuple[str, float], ...]:
+        """Leg-by-leg `((raw product, coefficient), ...)` for `expr`; raises
+        ValueError if malformed."""
+        text = re.sub(r"\s+", "", expr.replace("−", "-"))
+        if text not in self._memo:
+            self._memo[text] = self._compile(text, ())
+        return self._memo[text]
+
+    def compile(self, expr: str) -> dict[str, float]:
+        """`{raw product: coefficient}` for `expr`; raises ValueError if malformed."""
+        if expr not in self._weights:
+            weights: dict[str, float] = {}
+            for product, w in self.terms(expr):
+                weights[product] = weights.get(product, 0.0) + w
+            self._weights[expr] = weights
+        return self._weights[expr]
+
+    def _alias(self, name: str, stack: tuple) -> tuple[tuple[str, float], ...]:
+        if name in stack:
+            raise ValueError(f"circular alias: {' -> '.join(stack + (name,))}")
+        if name not in self._memo:
+            self._memo[name] = self._compile(re.sub(r"\s+", "", self.aliases[name]), stack + (name,))
+        return self._memo[name]
+
+    def _compile(self, text: str, stack: tuple) -> tuple[tuple[str, float], ...]:
+        if text in self.aliases:
+            return self._alias(text, stack)
+        if not text:
+            raise ValueError("empty expression")
+        terms: list[tuple[str, float]] = []
+        pos, sign = 0, 1.0
+        if text[0] in "+-":
+            sign = -1.0 if text[0] == "-" else 1.0
+            pos = 1
+        while True:
+            coef, pos = self._coefficient(text, pos)
+            name, pos = self._name(text, pos)
+            inner = self._alias(name, stack) if name in self.aliases else ((name, 1.0),)
+            terms.extend((product, sign * coef * w) for product, w in inner)
+            if pos == len(text):
+                return tuple(terms)
+            if text[pos] not in "+-":
+                raise ValueError(f"expected + or - at '{text[pos:]}' in '{text}'")
+            sign = -1.0 if text[pos] == "-" else 1.0
+            pos += 1
+
+    @staticmethod
+    def _coefficient(text: str, pos: int) -> tuple[float, int]:
+        m = _NUMBER.match(text, pos)
+        if m and text.startswith("*", m.end()):
+            return float(m.group()), m.end() + 1
+        return 1.0, pos
+
+    def _name(self, text: str, pos: int) -> tuple[str, int]:
+        for key in self._keys:
+            end = pos + len(key)
+            if text.startswith(key, pos) and (end == len(text) or text[end] in "+-"):
+                return key, end
+        m = re.compile(r"[^+\-*]+").match(text, pos)
+        if not m:
+            raise ValueError(f"expected a name at '{text[pos:]}' in '{text}'")
+        return m.group(), m.end()
+
+
+@lru_cache(maxsize=1)
+def default_compiler() -> ExpressionCompiler:
+    return ExpressionCompiler()
+
+
+def compile_expression(expr: str, aliases: dict[str, str] | None = None) -> dict[str, float]:
+    """Flat `{raw product: coefficient}` for `expr` (aliases.json by default)."""
+    compiler = default_compiler() if aliases is None else ExpressionCompiler(aliases)
+    return compiler.compile(expr)
+
+
+def expression_terms(expr: str, aliases: dict[str, str] | None = None) -> tuple[tuple[str, float], ...]:
+    """Leg-by-leg `((raw product, coefficient), ...)` for `expr`."""
+    compiler = default_compiler() if aliases is None else ExpressionCompiler(aliases)
+    return compiler.terms(expr)
+
+
+# ── Evaluation ────────────────────────────────────────────────────────
+
+def weighted_sum(terms, legs: dict[str, pd.Series]) -> pd.Series:
+    """Sum of `coefficient * leg` over the dates every leg has, added term by
+    term. `terms` is a `terms()` sequence or a `{product: coefficient}` map.
+
+    Legs are Series indexed by unique dates; the result keeps the first leg's
+    date order."""
+    terms = list(terms.items() if isinstance(terms, dict) else terms)
+    products = list(dict.fromkeys(product for product, _ in terms))
+    dates = legs[products[0]].index
+    pos = {}
+    keep = np.ones(len(dates), dtype=bool)
+    for product in products:
+        idx = legs[product].index.get_indexer(dates)
+        keep &= idx >= 0
+        pos[product] = idx
+    values = {p: legs[p].to_numpy(dtype=float)[pos[p][keep]] for p in products}
+    total = None
+    for product, w in terms:
+        v = values[product]
+        term = v if w == 1.0 else (-v if w == -1.0 else w * v)
+        total = term if total is None else total + term
+    return pd.Series(total, index=dates[keep])
+
+
+class LegCache:
+    """Memoised leg loader: `loader(product, key)` runs once per (product, key).
+
+    `key` identifies the tenor or contract, e.g. an offset or `"Mar26"`.
+    Create one per data refresh; loaded legs are shared read-only."""
+
+    def __init__(self, loader: Callable[[str, Hashable], pd.Series]):
+        self._loader = loader
+        self._legs: dict[tuple, pd.Series] = {}
+
+    def __call__(self, product: str, key: Hashable = None) -> pd.Series:
+        k = (product, key)
+        if k not in self._legs:
+            self._legs[k] = self._loader(product, key)
+        return self._legs[k]
+
+    def __len__(self) -> int:
+        return len(self._legs)
+
+
+def evaluate(expr: str, legs: LegCache, key: Hashable = None,
+             compiler: ExpressionCompiler | None = None) -> pd.Series:
+    terms = (compiler or default_compiler()).terms(expr)
+    return weighted_sum(terms, {p: legs(p, key) for p, _ in terms})
+
+
+def evaluate_many(exprs, legs: LegCache, key: Hashable = None,
+                  compiler: ExpressionCompiler | None = None) -> dict[str, pd.Series]:
+    """`{expr: series}` for many expressions sharing one leg cache."""
+    return {expr: evaluate(expr, legs, key, compiler) for expr in exprs}
@@ -0,0 +1,256 @@
+"""Shared Firebase Storage client: pooled keep-alive connections, single-flight.
+
+Every blob loader in the app goes through one `StorageClient`:
+
+- connections are `http.client` keep-alive connections kept in a small pool
+  per host and reused across requests, instead of a new TLS handshake per
+  `urlopen`;
+- concurrent requests for the same URL are coalesced: the first caller
+  downloads, the others wait for and share its result (single-flight), so
+  eight threads asking for one workbook cost one download;
+- at most `max_per_host` requests run against a host at once;
+- `stats()` reports requests, coalesced waits, bytes, errors and latency.
+
+`get_parsed(path, parse)` revalidates instead of re-downloading: it reads
+the blob's metadata (a few hundred bytes) and only downloads and re-parses
+when the `generation` differs from the one its cached parse was built from.
+An unchanged blob costs one metadata request, so the Streamlit TTLs around
+the loaders can be short. `max_age` skips even that request for a value
+validated less than `max_age` seconds ago. Concurrent calls for the same
+blob and parser are coalesced too, so a cold workbook is parsed once, not
+once per thread. Parsed values are held in a
+`SizedCache` bounded by `parsed_max_bytes` (the "parsed_blobs" share of the
+cache budget), least recently used first out.
+
+Blob paths are bucket-relative, e.g. `"Symbols/BSP_18m.xlsx"`. `get` returns
+the bytes (None on 404) and raises `urllib.error.HTTPError` on other errors,
+as the `urlopen` calls it replaces did. `base_url` can point at a local
+stand-in server that serves the same `/v0/b/<bucket>/o/<path>` routes.
+"""
+from __future__ import annotations
+
+import http.client
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, TypeVar
+
+from utils.memory_cache import SizedCache, budget
+
+T = TypeVar("T")
+
+FIREBASE_BUCKET = "hotei-streamlit.firebasestorage.app"
+BASE_URL = "https://firebasestorage.googleapis.com"
+
+# Errors that mean a pooled keep-alive connection went stale; retried once.
+_STALE = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+          ConnectionResetError, BrokenPipeError)
+
+
+class StorageClient:
+    def __init__(self, bucket: str = FIREBASE_BUCKET, base_url: str = BASE_URL,
+                 max_per_host: int = 8, timeout: float = 20.0,
+                 parsed_max_bytes: int | None = None):
+        parts = urllib.parse.urlsplit(base_url)
+        self.bucket = bucket
+        self.scheme = parts.scheme
+        self.host = parts.netloc
+        self.timeout = timeout
+        self._idle: list[http.client.HTTPConnection] = []
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_per_host)
+        self._inflight: dict[str, Future] = {}
+        self._parsing: dict[tuple[str, str], Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "coalesced": 0, "bytes": 0, "errors": 0,
+                       "connections": 0, "seconds": 0.0, "not_modified": 0, "parses_coalesced": 0}
+        # (path, parser) -> (generation, validated_at, parsed value)
+        self._parsed = SizedCache(budget("parsed_blobs") if parsed_max_bytes is None else parsed_max_bytes)
+
+    # ── URLs ──
+
+    def object_path(self, path: str) -> str:
+        encoded = urllib.parse.quote(path, safe="")
+        return f"/v0/b/{self.bucket}/o/{encoded}"
+
+    def media_url(self, path: str) -> str:
+        """Public download URL of a blob (for iframes and links)."""
+        return f"{self.scheme}://{self.host}{self.object_path(path)}?alt=media"
+
+    # ── Connections ──
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        self._count("connections")
+        return cls(self.host, timeout=self.timeout)
+
+    @contextmanager
+    def _connection(self):
+        with self._pool_lock:
+            conn = self._idle.pop() if self._idle else None
+        conn = conn or self._new_connection()
+        try:
+            yield conn
+        except BaseException:
+            conn.close()
+            raise
+        with self._pool_lock:
+            self._idle.append(conn)
+
+    def _request(self, target: str) -> tuple[int, bytes, http.client.HTTPMessage]:
+        with self._slots:
+            for attempt in (0, 1):
+                try:
+                    with self._connection() as conn:
+                        conn.request("GET", target, headers={"Connection": "keep-alive"})
+                        resp = conn.getresponse()
+                        body = resp.read()
+                        if resp.will_close:
+                            conn.close()
+                        return resp.status, body, resp.headers
+                except _STALE:
+                    if attempt:
+                        raise
+
+    # ── Single flight ──
+
+    def _fetch(self, target: str) -> tuple[int, bytes, http.client.HTTPMessage]:
+        with self._inflight_lock:
+            future = self._inflight.get(target)
+            leader = future is None
+            if leader:
+                future = self._inflight[target] = Future()
+        if not leader:
+            self._count("coalesced")
+            return future.result()
+
+        t0 = time.perf_counter()
+        try:
+            result = self._request(target)
+        except BaseException as e:
+            self._count("errors")
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[target]
+            self._count("seconds", time.perf_counter() - t0)
+        self._count("requests")
+        self._count("bytes", len(result[1]))
+        if result[0] >= 400 and result[0] != 404:
+            self._count("errors")
+        future.set_result(result)
+        return result
+
+    def _checked(self, target: str) -> bytes | None:
+        status, body, headers = self._fetch(target)
+        if status == 404:
+            return None
+        if status >= 400:
+            raise urllib.error.HTTPError(f"{self.scheme}://{self.host}{target}", status,
+                                         body[:200].decode("utf-8", "replace"), headers, None)
+        return body
+
+    # ── Public API ──
+
+    def get(self, path: str, params: dict | None = None) -> bytes | None:
+        """Blob bytes, or None if it does not exist."""
+        query = urllib.parse.urlencode({"alt": "media", **(params or {})})
+        return self._checked(f"{self.object_path(path)}?{query}")
+
+    def metadata(self, path: str) -> dict | None:
+        """Blob metadata JSON (`generation`, `updated`, `md5Hash`, `size`, ...)."""
+        body = self._checked(self.object_path(path))
+        return None if body is None else json.loads(body.decode("utf-8"))
+
+    def get_parsed(self, path: str, parse: Callable[[bytes], T], max_age: float = 0) -> T | None:
+        """`parse(blob bytes)`, recomputed only when the blob's generation changes.
+
+        A value validated less than `max_age` seconds ago is returned without
+        a metadata request. Concurrent callers for the same (path, parse)
+        share one revalidation and parse (single-flight). The cached value is
+        shared between callers: treat it as read-only or copy it. None if the
+        blob does not exist."""
+        key = (path, f"{parse.__module__}.{parse.__qualname__}")
+        hit = self._parsed.get(key)
+        if hit is not None and time.monotonic() - hit[1] < max_age:
+            return hit[2]
+
+        with self._inflight_lock:
+            future = self._parsing.get(key)
+            leader = future is None
+            if leader:
+                future = self._parsing[key] = Future()
+        if not leader:
+            self._count("parses_coalesced")
+            return future.result()
+        try:
+            value = self._revalidate(key, path, parse, hit)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._parsing[key]
+        future.set_result(value)
+        return value
+
+    def _revalidate(self, key: tuple[str, str], path: str, parse: Callable[[bytes], T], hit) -> T | None:
+        meta = self.metadata(path)
+        if meta is None:
+            self._parsed.pop(key)
+            return None
+        generation = meta.get("generation") or meta.get("md5Hash") or meta.get("updated")
+        if hit is not None and generation is not None and hit[0] == generation:
+            self._count("not_modified")
+            self._parsed.put(key, (generation, time.monotonic(), hit[2]))
+            return hit[2]
+        raw = self.get(path)
+        if raw is None:
+            return None
+        value = parse(raw)
+        if generation is not None:
+            self._parsed.put(key, (generation, time.monotonic(), value))
+        return value
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            out = dict(self._stats)
+        out["mean_latency_ms"] = round(1e3 * out["seconds"] / out["requests"], 2) if out["requests"] else 0.0
+        out["parsed_cache"] = self._parsed.stats()
+        return out
+
+    def close(self) -> None:
+        with self._pool_lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _count(self, name: str, value=1) -> None:
+        with self._stats_lock:
+            self._stats[name] += value
+
+
+_CLIENT: StorageClient | None = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> StorageClient:
+    """The process-wide client shared by all loaders."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = StorageClient()
+        return _CLIENT
+
+
+def set_client(client: StorageClient | None) -> None:
+    """Swap the shared client, e.g. for one pointed at a local test server."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        _CLIENT = client
@@ -0,0 +1,154 @@
+"""Memory-bounded in-process cache for downloaded workbooks and frames.
+
+`functools.lru_cache(maxsize=None)` on the workbook readers keeps every
+parsed sheet for the life of the server and never sees new data.
+`SizedCache` bounds the total size instead of the entry count:
+
+- every entry is weighed once on insert with `nbytes` (DataFrames by
+  `memory_usage(deep=True)`, bytes by length, dicts/lists/tuples by their
+  items);
+- least-recently-used entries are evicted until the total fits `max_bytes`;
+  a single entry larger than the whole budget is returned but not kept;
+- entries older than `ttl` seconds are dropped on access (None: no expiry);
+- `stats()` reports hits, misses, evictions, expirations and bytes held.
+
+`sized_cache(max_bytes, ttl)` wraps a function like `lru_cache` does, with
+`.cache`, `.cache_clear()` and `.cache_stats()` on the wrapper.
+
+`CACHE_BUDGET_MB` (environment, default 512) bounds all caches together: it
+is split between them by `CACHE_SHARES`, and each cache takes its
+`budget(name)`, so the process holds at most the configured total.
+"""
+from __future__ import annotations
+
+import functools
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+import numpy as np
+import pandas as pd
+
+CACHE_BUDGET_BYTES = int(float(os.environ.get("CACHE_BUDGET_MB", 512)) * 2**20)
+# Fraction of CACHE_BUDGET_BYTES per cache; sums to 1.
+CACHE_SHARES = {
+    "parsed_blobs": 0.6,   # StorageClient.get_parsed: OI and price workbooks
+    "oi_history": 0.3,     # oi_daily.load_oi_history
+    "oi_prompt": 0.1,      # oi_daily.construct_prompt_mth_rolling_df
+}
+
+_MISSING = object()
+
+
+def budget(name: str) -> int:
+    """Bytes of the total cache budget allotted to cache `name`."""
+    return int(CACHE_BUDGET_BYTES * CACHE_SHARES[name])
+
+
+def nbytes(obj) -> int:
+    """Approximate in-memory size of a cached value."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(nbytes(k) + nbytes(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(nbytes(v) for v in obj)
+    return sys.getsizeof(obj)
+
+
+class SizedCache:
+    """LRU cache bounded by total `nbytes` of its values, with optional TTL."""
+
+    def __init__(self, max_bytes: int, ttl: float | None = None):
+        self.max_bytes = int(max_bytes)
+        self.ttl = ttl
+        # key -> (value, size, stored_at); most recently used last
+        self._entries: OrderedDict[Hashable, tuple[object, int, float]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[2] > self.ttl:
+                self._drop(key)
+                self._stats["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value) -> None:
+        size = nbytes(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats["evictions"] += 1
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats, entries=len(self._entries), bytes=self._bytes,
+                       max_bytes=self.max_bytes)
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 3) if lookups else 0.0
+        return out
+
+
+def sized_cache(max_bytes: int, ttl: float | None = None) -> Callable:
+    """Memoise a function of hashable arguments in a `SizedCache`.
+
+    Results are shared between callers: treat them as read-only or copy."""
+    def decorator(func):
+        cache = SizedCache(max_bytes, ttl)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            value = cache.get(key, _MISSING)
+            if value is _MISSING:
+                value = func(*args, **kwargs)
+                cache.put(key, value)
+            return value
+
+        wrapper.cache = cache
+        wrapper.cache_clear = cache.clear
+        wrapper.cache_stats = cache.stats
+        return wrapper
+    return decorator
@@ -1,13 +1,17 @@
 import pandas as pd
 import numpy as np
-import re
-import urllib.parse
 from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from utils import price_store
+from utils.expressions import compile_expression, expression_terms, weighted_sum
+from utils.firebase_client import get_client
+from utils.trading_calendar import WEEKDAYS, contract_index, month_start
 
 def get_t1_date():
     """Returns the date 1 business day before today."""
     today = np.datetime64('today')
-    t1 = np.busday_offset(today, -1)
+    t1 = np.busday_offset(today, -1, roll='forward')
     return pd.Timestamp(t1)
 
 # Global month dictionary
@@ -19,22 +23,38 @@ month_dct = {
 
 # def get_start_end_dates(contract, num_lookback_months=5):
 def get_start_end_dates(contract, num_lookback_months=3):
-    # Step 1: Compute dynamic start and end dates
-    year = 2000 + int(contract[-2:])
-    month = month_dct[contract[:3]]
-    start_date = pd.Timestamp(year, month, 1) - pd.DateOffset(months=num_lookback_months)
-    end_date = pd.Timestamp(year, month, 1) - pd.DateOffset(days=1) - pd.offsets.MonthEnd(2)
+    # Step 1: Compute dynamic start and end dates: the 1st of the month
+    # `num_lookback_months` before the contract, and the last day of the
+    # month three before it.
+    idx = contract_index(contract)
+    start_date = month_start(idx - num_lookback_months)
+    end_date = month_start(idx - 2) - np.timedelta64(1, "D")
 
     # Step 2: Adjust to business days (no static file needed)
-    adj_start = np.busday_offset(start_date.date(), -2, roll='forward')
-    adj_end = np.busday_offset(end_date.date(), -1, roll='backward')
+    adj_start = np.busday_offset(start_date, -2, roll='forward', busdaycal=WEEKDAYS)
+    adj_end = np.busday_offset(end_date, -1, roll='backward', busdaycal=WEEKDAYS)
     return str(adj_start), str(adj_end)
 
-from functools import lru_cache
+# Parsed workbooks are held in the shared client's parsed-blob cache and
+# revalidated against the blob's generation at most every WORKBOOK_TTL
+# seconds, so a long-running server picks up new data. The raw bytes are
+# not kept.
+WORKBOOK_TTL = 900
+
+
+def _parse_all_sheets(raw: bytes) -> dict[str, pd.DataFrame]:
+    return pd.read_excel(BytesIO(raw), sheet_name=None)
+
 
-@lru_cache(maxsize=None)
-def read_excel_cached(url, sheet_name):
-    return pd.read_excel(url, sheet_name=sheet_name)
+def read_excel_cached(path, sheet_name):
+    """One sheet of a workbook; the workbook is downloaded and parsed once
+    per generation for all of its sheets. Shared: treat as read-only."""
+    sheets = get_client().get_parsed(path, _parse_all_sheets, max_age=WORKBOOK_TTL)
+    if sheets is None:
+        raise FileNotFoundError(path)
+    if sheet_name not in sheets:
+        raise ValueError(f"Worksheet named '{sheet_name}' not found")
+    return sheets[sheet_name]
 
 def get_m1_to_m4_contracts(contract_m1):
     month, year = contract_m1[:3], int(contract_m1[3:])
@@ -48,52 +68,51 @@ def get_m1_to_m4_contracts(contract_m1):
     return contracts
 
 
+def load_sheet(product, month, df_cache=None):
+    """The `<product>_<month>` sheet: from df_cache, the local price store
+    (while its workbook is unchanged), or Firebase."""
+    key = (product, month)
+    if df_cache and key in df_cache:
+        return df_cache[key]
+    if price_store.serves_sheet(product, month):
+        df = price_store.load_sheet(product, month)
+    else:
+        df = read_excel_cached(f"Symbols/{product}_18m.xlsx", f"{product}_{month}")
+    if df_cache is not None:
+        df_cache[key] = df
+    return df
+
+
 def calculate_outright(diff, contract_m1, month_scenario, df_cache=None):
     contracts_m1_to_m4 = get_m1_to_m4_contracts(contract_m1)
     start_date, end_date = get_start_end_dates(contract_m1)
     contract = contracts_m1_to_m4[month_scenario - 1]
     target_month = contract[:3]
 
-    tokens = re.split(r'(\+|-)', diff)
-    operators = [t for t in tokens if t in ['+', '-']]
-    products = [t.strip() for t in tokens if t not in ['+', '-']]
-
-    all_dfs = []
-    for i, product in enumerate(products):
-        key = (product, target_month)
-        if df_cache and key in df_cache:
-            df = df_cache[key]
+    # Raw products to load (aliases expand); each shared leg is loaded once.
+    weights = compile_expression(diff)
+
+    legs = {}
+    for product in weights:
+        leg_key = (product, contract, start_date, end_date)
+        if df_cache is not None and leg_key in df_cache:
+            legs[product] = df_cache[leg_key]
+            continue
+        if not (df_cache and (product, target_month) in df_cache) and price_store.serves_sheet(product, target_month):
+            # Converted sheet: read only this contract's rows in the window.
+            df = price_store.load_contract(product, contract, start_date, end_date)
         else:
-            folder = "Symbols"
-            filename = f"{product}_18m.xlsx"
-            encoded_filename = urllib.parse.quote(filename)
-            url = f"https://firebasestorage.googleapis.com/v0/b/hotei-streamlit.firebasestorage.app/o/{folder}%2F{encoded_filename}?alt=media"
-            df = read_excel_cached(url, f"{product}_{target_month}")
-            if df_cache is not None:
-                df_cache[key] = df
-
-        df = df[df['contract'] == contract][['Date', 'price']].rename(columns={'price': f'price_{i+1}'})
-        all_dfs.append(df)
-
-    if not all_dfs:
-        return pd.DataFrame(columns=["Date", "price", "diff", "contract"])
-    
-    final_df = all_dfs[0]
-    for df in all_dfs[1:]:
-        final_df = final_df.merge(df, on='Date', how='inner')
-
-    final_df = final_df[(final_df['Date'] >= start_date) & (final_df['Date'] <= end_date)]
-    if final_df.empty:
+            df = load_sheet(product, target_month, df_cache)
+        df = df[(df['contract'] == contract) & (df['Date'] >= start_date) & (df['Date'] <= end_date)]
+        legs[product] = pd.Series(df['price'].to_numpy(), index=pd.DatetimeIndex(df['Date']))
+        if df_cache is not None:
+            df_cache[leg_key] = legs[product]
+
+    final_price = weighted_sum(expression_terms(diff), legs)
+    if final_price.empty:
         return pd.DataFrame(columns=["Date", "price", "diff", "contract"])
 
-    final_price = final_df['price_1']
-    for i, op in enumerate(operators):
-        if op == '+':
-            final_price += final_df[f'price_{i+2}']
-        else:
-            final_price -= final_df[f'price_{i+2}']
-
-    final_df['price'] = final_price
+    final_df = pd.DataFrame({'Date': final_price.index, 'price': final_price.to_numpy()})
     final_df['diff'] = diff
     final_df['contract'] = contract
     return final_df[['Date', 'price', 'diff', 'contract']]
@@ -116,90 +135,132 @@ def calculate_diff(diff_scenario_tup, contract_m1, month_scenario_tup, df_cache=
     df_3['price'] = df_3['price_1'] - df_3['price_2']
     return df_3
 
-def get_price_series(diff_scenario, months_scenario, months_m1_lst, years):
-    df_cache = {}  # <-- shared cache
-    
-    def process_contract(year, month_m1):
-        contract_m1 = month_m1 + str(year)
-        return calculate_diff(diff_scenario, contract_m1, months_scenario, df_cache=df_cache)
-
-    dfs = []
-    last_price = None
-    last_norm = 0
-
-    # Step 1: Ordered task list
+def m1_contract_list(months_m1_lst, years):
+    """M1 contracts to chain, newest first (current year: up to 3 months ahead)."""
     _t1 = get_t1_date()
     _current_year_2d = _t1.year % 100
     _max_month_idx = min(_t1.month + 3, 12)
     _month_names = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]
     _current_year_months = list(reversed(_month_names[:_max_month_idx]))
-
-    task_list = [
-        (year, month_m1)
+    return [
+        month_m1 + str(year)
         for year in reversed(years)
         for month_m1 in (
             reversed(months_m1_lst) if year != _current_year_2d else _current_year_months
         )
     ]
 
-    def fetch_contract(year, month_m1):
-        df_contract = process_contract(year, month_m1)
-        return (year, month_m1, df_contract)
 
-    # Step 2: Parallel fetch (maintains task order)
+def _leg_panel(diff, month_scenario, m1_contracts, df_cache):
+    """One diff leg for every M1 contract at once.
+
+    Returns (contracts, key, dates, price) sorted by key, where
+    key = m1 position * 10**6 + day number and `contracts[i]` is the
+    contract traded for `m1_contracts[i]`. Each (product, month) sheet is
+    filtered once for all of its contracts and their windows."""
+    contracts = [get_m1_to_m4_contracts(c)[month_scenario - 1] for c in m1_contracts]
+    windows = [get_start_end_dates(c) for c in m1_contracts]
+    start = np.array([w[0] for w in windows], dtype='datetime64[D]')
+    end = np.array([w[1] for w in windows], dtype='datetime64[D]')
+    position = pd.Series(np.arange(len(contracts)), index=contracts)
+
+    legs = {}
+    for product in compile_expression(diff):
+        sheets = [load_sheet(product, month, df_cache) for month in dict.fromkeys(c[:3] for c in contracts)]
+        sheet = pd.concat([df[['Date', 'contract', 'price']] for df in sheets], ignore_index=True)
+        pos = position.reindex(sheet['contract'].to_numpy()).to_numpy()
+        dates = sheet['Date'].to_numpy()
+        found = ~np.isnan(pos)
+        pos = np.where(found, pos, 0).astype(np.int64)
+        day = dates.astype('datetime64[D]')
+        keep = found & (day >= start[pos]) & (day <= end[pos])
+        key = pos[keep] * 10**6 + day[keep].astype(np.int64)
+        order = np.argsort(key, kind='stable')
+        legs[product] = (key[order], dates[keep][order], sheet['price'].to_numpy(dtype=float)[keep][order])
+
+    # Inner-align on (contract, date) and add leg by leg, as weighted_sum does.
+    first = next(iter(legs.values()))
+    key, dates = first[0], first[1]
+    keep = np.ones(len(key), dtype=bool)
+    for k, _, _ in legs.values():
+        keep &= np.isin(key, k)
+    key, dates = key[keep], dates[keep]
+    total = None
+    for product, w in expression_terms(diff):
+        k, _, price = legs[product]
+        values = price[np.searchsorted(k, key)]
+        term = values if w == 1.0 else (-values if w == -1.0 else w * values)
+        total = term if total is None else total + term
+    return contracts, key, dates, total
+
+
+def get_price_series(diff_scenario, months_scenario, months_m1_lst, years, df_cache=None):
+    """Back-adjusted continuous series of a two-leg diff over its M1 contracts.
+
+    Both legs are built for every contract at once (`_leg_panel`). Each
+    contract's norm_value is the cumulative sum, newest to oldest, of the
+    roll gaps (its last price minus the newer contract's first price); on a
+    date covered by several contracts the entry side is the newest and the
+    exit side the oldest."""
+    # (product, month) -> workbook sheet; pass a pre-filled dict to run offline.
+    df_cache = {} if df_cache is None else df_cache  # <-- shared cache
+    m1_contracts = m1_contract_list(months_m1_lst, years)
+    diff_1, diff_2 = diff_scenario
+
+    # Fetch every sheet both legs need up front, in parallel (I/O bound).
+    needed = {
+        (product, get_m1_to_m4_contracts(c)[ms - 1][:3])
+        for diff, ms in zip(diff_scenario, months_scenario)
+        for product in compile_expression(diff)
+        for c in m1_contracts
+    }
     with ThreadPoolExecutor(max_workers=8) as executor:
-        results = list(executor.map(lambda args: fetch_contract(*args), task_list))
-
-    # Step 3: Sequential normalization
-    dfs = []
-    last_price = None
-    last_norm = 0
-
-    for year, month_m1, df_contract in results:
-        if not df_contract.empty:
-            if last_price is not None:
-                norm_diff = df_contract["price"].iloc[-1] - last_price
-                last_norm += norm_diff
-                df_contract["norm_value"] = last_norm
-            else:
-                df_contract["norm_value"] = 0.0
-            last_price = df_contract["price"].iloc[0]
-            df_contract['norm_price'] = df_contract['price'] - df_contract['norm_value']
-            dfs.append(df_contract)
-
-    if not dfs:
+        list(executor.map(lambda key: load_sheet(*key, df_cache), sorted(needed)))
+
+    contracts_1, key_1, dates, price_1 = _leg_panel(diff_1, months_scenario[0], m1_contracts, df_cache)
+    contracts_2, key_2, _, price_2 = _leg_panel(diff_2, months_scenario[1], m1_contracts, df_cache)
+
+    both = np.isin(key_1, key_2)
+    key, dates = key_1[both], dates[both]
+    price = price_1[both] - price_2[np.searchsorted(key_2, key)]
+    if len(key) == 0:
         raise ValueError("Input list of DataFrames is empty")
 
-    # Validate required columns
-    required_cols = ['Date', 'contract_1', 'contract_2', 'diff_1', 'diff_2', 'mths_scenario', 'price', 'norm_value', 'norm_price']
-    for df in dfs:
-        missing_cols = [col for col in required_cols if col not in df.columns]
-        if missing_cols:
-            raise ValueError(f"Missing required columns in DataFrame: {missing_cols}")
-
-    # Concatenate DataFrames in reverse order
-    df_new = pd.concat(dfs[::-1], ignore_index=True, copy=False)
-
-    # Create contract and contract_month columns
-    df_new['contract'] = df_new['contract_1'].astype(str) + '-' + df_new['contract_2'].astype(str)
-    df_new['contract_month'] = df_new['contract_1'].str[:3] + '-' + df_new['contract_2'].str[:3]
-
-    # Columns to keep
-    cols_to_keep = ['Date', 'diff_1', 'diff_2', 'mths_scenario', 'contract', 'contract_month', 'price', 'norm_value', 'norm_price']
-
-    # Process entry and exit DataFrames
-    df_entry = df_new.drop_duplicates(subset='Date', keep='last')[cols_to_keep]
-    df_exit = df_new.drop_duplicates(subset='Date', keep='first')[cols_to_keep]
-
-    # Rename columns
-    cols_to_rename = ['contract', 'contract_month', 'price', 'norm_value', 'norm_price']
-    rename_entry = {col: f'entry_{col}' for col in cols_to_rename}
-    rename_exit = {col: f'exit_{col}' for col in cols_to_rename}
-    
-    df_entry = df_entry.rename(columns=rename_entry)
-    df_exit = df_exit.rename(columns=rename_exit)
-
-    # Merge DataFrames
-    cols_to_merge = ['Date', 'diff_1', 'diff_2', 'mths_scenario']
-    df_final = df_entry.merge(df_exit, on=cols_to_merge, how='left', copy=False)
-    return df_final
\ No newline at end of file
+    # Contract groups, newest first; gaps chain each contract onto the newer one.
+    group = key // 10**6
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    ends = np.r_[starts[1:], len(key)] - 1
+    gaps = price[ends[1:]] - price[starts[:-1]]
+    norm_by_group = np.r_[0.0, np.cumsum(gaps)]
+    norm_value = np.repeat(norm_by_group, np.diff(np.r_[starts, len(key)]))
+    norm_price = price - norm_value
+
+    # Oldest contract first, as the chained frames were concatenated.
+    order = np.lexsort((key % 10**6, -group))
+    day = (key % 10**6)[order]
+    _, last_rev = np.unique(day[::-1], return_index=True)
+    entry_rows = order[np.sort(len(day) - 1 - last_rev)]
+    _, first = np.unique(day, return_index=True)
+    exit_by_day = pd.Series(order[first], index=day[first])
+    exit_rows = exit_by_day.reindex(key[entry_rows] % 10**6).to_numpy()
+
+    c1 = np.array(contracts_1, dtype=object)
+    c2 = np.array(contracts_2, dtype=object)
+    contract = np.array([f"{a}-{b}" for a, b in zip(c1, c2)], dtype=object)
+    contract_month = np.array([f"{a[:3]}-{b[:3]}" for a, b in zip(c1, c2)], dtype=object)
+
+    n = len(entry_rows)
+    df_final = pd.DataFrame({
+        'Date': dates[entry_rows],
+        'diff_1': [diff_1] * n,
+        'diff_2': [diff_2] * n,
+        'mths_scenario': [months_scenario] * n,
+    })
+    for side, rows in (('entry', entry_rows), ('exit', exit_rows)):
+        g = group[rows]
+        df_final[f'{side}_contract'] = contract[g]
+        df_final[f'{side}_contract_month'] = contract_month[g]
+        df_final[f'{side}_price'] = price[rows]
+        df_final[f'{side}_norm_value'] = norm_value[rows]
+        df_final[f'{side}_norm_price'] = norm_price[rows]
+    return df_final
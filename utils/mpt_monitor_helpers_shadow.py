@@ -11,8 +11,6 @@ from __future__ import annotations
 
 import json
 import subprocess
-import urllib.parse
-import urllib.request
 import uuid
 from datetime import datetime
 from io import BytesIO
@@ -22,7 +20,9 @@ import numpy as np
 import pandas as pd
 import streamlit as st
 
-FIREBASE_BUCKET = "hotei-streamlit.firebasestorage.app"
+from utils.firebase_client import get_client
+from utils.trading_calendar import roll_window_day
+
 FIREBASE_FOLDER = "mpt_shadow_v1"
 
 BLOOMBERG_COT = Path(
@@ -70,45 +70,22 @@ TRADE_LOG_COLS = [
 ]
 
 
-def _firebase_url(path: str) -> str:
-    encoded = urllib.parse.quote(path, safe="")
-    return (f"https://firebasestorage.googleapis.com/v0/b/"
-            f"{FIREBASE_BUCKET}/o/{encoded}?alt=media")
-
-
-def _fetch_bytes(path: str) -> bytes | None:
-    try:
-        with urllib.request.urlopen(_firebase_url(path), timeout=20) as r:
-            return r.read()
-    except urllib.error.HTTPError as e:
-        if e.code == 404:
-            return None
-        raise
+# Blobs are revalidated against their Firebase generation on every TTL expiry
+# and only re-downloaded when they changed, so the TTL can stay short.
+CACHE_TTL = 60
 
 
-@st.cache_data(ttl=900)
-def load_state() -> dict:
-    raw = _fetch_bytes(f"{FIREBASE_FOLDER}/state.json")
-    if raw is None:
-        return {"error": "state.json missing on Firebase — run sync", "picks": []}
+def _parse_json(raw: bytes) -> dict:
     return json.loads(raw.decode("utf-8"))
 
 
-@st.cache_data(ttl=900)
-def load_pick_df(fname: str) -> pd.DataFrame:
-    raw = _fetch_bytes(f"{FIREBASE_FOLDER}/{fname}/df.parquet")
-    if raw is None:
-        return pd.DataFrame()
+def _parse_pick_df(raw: bytes) -> pd.DataFrame:
     df = pd.read_parquet(BytesIO(raw))
     df["Date"] = pd.to_datetime(df["Date"])
     return df
 
 
-@st.cache_data(ttl=900)
-def load_pick_trades(fname: str) -> pd.DataFrame:
-    raw = _fetch_bytes(f"{FIREBASE_FOLDER}/{fname}/trades_closed.parquet")
-    if raw is None:
-        return pd.DataFrame()
+def _parse_pick_trades(raw: bytes) -> pd.DataFrame:
     t = pd.read_parquet(BytesIO(raw))
     if not t.empty:
         t["entry_date"] = pd.to_datetime(t["entry_date"])
@@ -116,15 +93,51 @@ def load_pick_trades(fname: str) -> pd.DataFrame:
     return t
 
 
-def load_pick_open_trade(fname: str) -> dict | None:
-    raw = _fetch_bytes(f"{FIREBASE_FOLDER}/{fname}/open_trade.json")
-    if raw is None:
-        return None
+def _parse_open_trade(raw: bytes) -> dict:
     d = json.loads(raw.decode("utf-8"))
     d["entry_date"] = pd.Timestamp(d["entry_date"])
     return d
 
 
+def _parse_daily_pnl_sheet(raw: bytes) -> pd.DataFrame | None:
+    try:
+        s = pd.read_excel(BytesIO(raw), sheet_name="daily_pnl")
+    except Exception:
+        return None
+    s["Date"] = pd.to_datetime(s["Date"])
+    return s.set_index("Date")
+
+
+def _fetch_parsed(path: str, parse):
+    """Parsed blob (shared, do not mutate), re-parsed only when it changed."""
+    return get_client().get_parsed(path, parse)
+
+
+@st.cache_data(ttl=CACHE_TTL)
+def load_state() -> dict:
+    state = _fetch_parsed(f"{FIREBASE_FOLDER}/state.json", _parse_json)
+    if state is None:
+        return {"error": "state.json missing on Firebase — run sync", "picks": []}
+    return state
+
+
+@st.cache_data(ttl=CACHE_TTL)
+def load_pick_df(fname: str) -> pd.DataFrame:
+    df = _fetch_parsed(f"{FIREBASE_FOLDER}/{fname}/df.parquet", _parse_pick_df)
+    return pd.DataFrame() if df is None else df
+
+
+@st.cache_data(ttl=CACHE_TTL)
+def load_pick_trades(fname: str) -> pd.DataFrame:
+    t = _fetch_parsed(f"{FIREBASE_FOLDER}/{fname}/trades_closed.parquet", _parse_pick_trades)
+    return pd.DataFrame() if t is None else t
+
+
+def load_pick_open_trade(fname: str) -> dict | None:
+    d = _fetch_parsed(f"{FIREBASE_FOLDER}/{fname}/open_trade.json", _parse_open_trade)
+    return None if d is None else dict(d)
+
+
 def compute_daily_pnl(trades_closed: pd.DataFrame, ew: pd.Series,
                       year: int, open_trade: dict | None = None) -> pd.Series:
     """Daily MTM in raw spread units for one cell over `year`.
@@ -196,7 +209,7 @@ def compute_daily_pnl(trades_closed: pd.DataFrame, ew: pd.Series,
     return daily
 
 
-@st.cache_data(ttl=900)
+@st.cache_data(ttl=CACHE_TTL)
 def build_portfolio_daily_pnl(year: int = YEAR) -> pd.DataFrame:
     """Weighted daily P&L across all 7 picks for `year`.
     Returns DataFrame with Date index and columns = pick fnames + portfolio + cum."""
@@ -221,7 +234,7 @@ def build_portfolio_daily_pnl(year: int = YEAR) -> pd.DataFrame:
     return portfolio
 
 
-@st.cache_data(ttl=900)
+@st.cache_data(ttl=CACHE_TTL)
 def spread_return_correlation(window_months: int = 12) -> pd.DataFrame:
     """Pearson correlation of daily EW_adj returns (diff) across picks over the
     trailing `window_months`. Independent of trade state — reflects underlying
@@ -244,23 +257,36 @@ def spread_return_correlation(window_months: int = 12) -> pd.DataFrame:
     return pd.concat(returns, axis=1).corr()
 
 
-@st.cache_data(ttl=900)
+@st.cache_data(ttl=CACHE_TTL)
 def load_backtest_baseline_daily_pnl(year: int = YEAR) -> pd.Series:
     """The shadow backtest's own daily_pnl sheet, sliced to `year`. From Firebase."""
-    raw = _fetch_bytes(f"{FIREBASE_FOLDER}/portfolio_MPT_entry_var_SHADOW.xlsx")
-    if raw is None:
-        return pd.Series(dtype=float)
-    try:
-        s = pd.read_excel(BytesIO(raw), sheet_name="daily_pnl")
-    except Exception:
+    s = _fetch_parsed(f"{FIREBASE_FOLDER}/portfolio_MPT_entry_var_SHADOW.xlsx", _parse_daily_pnl_sheet)
+    if s is None:
         return pd.Series(dtype=float)
-    s["Date"] = pd.to_datetime(s["Date"])
-    s = s.set_index("Date")
     # Shadow xlsx uses 'daily_pnl'; prod uses 'portfolio_daily_pnl'. Handle both.
     col = "daily_pnl" if "daily_pnl" in s.columns else "portfolio_daily_pnl"
     return s.loc[s.index.year == year, col]
 
 
+def blend_roll_window(raw_series: pd.Series, ew_adj_series: pd.Series | None,
+                      n: int = 5) -> pd.Series:
+    """Calendar-correct roll blend of a whole series.
+
+    On the real last-`n` business days of each calendar month (strategy
+    holidays), with k business days left including the date (k=n on the
+    first roll day, k=1 on the last),
+        blended = (k-1)/n * raw + (n-k+1)/n * ew_adj
+    where EW_adj is the framework's 100%-NEW value; raw is used where EW_adj
+    has no bar. Every other date is raw. Indexed like `raw_series`."""
+    raw = raw_series.to_numpy(dtype=float)
+    ew = raw if ew_adj_series is None else \
+        ew_adj_series.reindex(raw_series.index).fillna(raw_series).to_numpy(dtype=float)
+    k = roll_window_day(raw_series.index, n=n)
+    old_w = (k - 1) / n
+    new_w = (n - k + 1) / n
+    return pd.Series(np.where(k > 0, old_w * raw + new_w * ew, raw), index=raw_series.index)
+
+
 def derive_status_row(pick: dict) -> dict:
     """Build one row for the Section B status grid.
 
@@ -312,45 +338,16 @@ def derive_status_row(pick: dict) -> dict:
     # For the LAST bar, replace EW_adj with the calendar-correct blend
     # using the REAL last-5 BDs of that calendar month (holiday-aware).
     # The framework's last-5-populated convention gets fixed live here.
-    from pandas.tseries.holiday import AbstractHolidayCalendar, Holiday, GoodFriday
-    from pandas.tseries.offsets import CustomBusinessDay
-    class _StratCal(AbstractHolidayCalendar):
-        rules = [Holiday("NewYears", month=1, day=1), GoodFriday,
-                 Holiday("Christmas", month=12, day=25)]
-    _bday = CustomBusinessDay(calendar=_StratCal())
-
-    def _real_last_n_bds(yr: int, mo: int, n: int = 5) -> list[pd.Timestamp]:
-        ms = pd.Timestamp(yr, mo, 1)
-        me = ms + pd.offsets.MonthEnd(0)
-        bds = list(pd.bdate_range(start=ms, end=me, freq=_bday))
-        return [pd.Timestamp(d).normalize() for d in bds[-n:]]
+    # The whole history is blended once; lookups below are searches into it.
+    blended_series = blend_roll_window(raw_series, ew_adj_series) if raw_series is not None else None
 
     def _blended_at(ts: pd.Timestamp) -> float | None:
-        """Calendar-correct blended price at `ts`. On dates inside the real
-        last-5-BDs of the month, computes
-            old_w * raw[ts] + new_w * ew_adj[ts]
-        where the framework's EW_adj equals 100%-NEW on the latest populated
-        date. On dates outside the roll window, returns raw."""
-        if raw_series is None:
+        """Calendar-correct blended price at `ts`, or at the last bar before
+        it. None if there is no such bar."""
+        if blended_series is None:
             return None
-        if ts not in raw_series.index:
-            prior = raw_series.index[raw_series.index <= ts]
-            if len(prior) == 0:
-                return None
-            ts = prior[-1]
-        ts_n = pd.Timestamp(ts).normalize()
-        real_last5 = _real_last_n_bds(int(ts_n.year), int(ts_n.month), n=5)
-        if ts_n not in real_last5:
-            return float(raw_series.loc[ts])
-        # ts is in real last-5-BDs of its calendar month → blend
-        k = 5 - real_last5.index(ts_n)   # k=5 first day, k=1 last day
-        old_w = (k - 1) / 5
-        new_w = (5 - k + 1) / 5
-        raw_v = float(raw_series.loc[ts])
-        ew_v = (float(ew_adj_series.loc[ts])
-                if ew_adj_series is not None and ts in ew_adj_series.index
-                else raw_v)
-        return old_w * raw_v + new_w * ew_v
+        pos = blended_series.index.searchsorted(pd.Timestamp(ts), side="right") - 1
+        return float(blended_series.iloc[pos]) if pos >= 0 else None
 
     # Displayed Current = calendar-correct blend at the latest bar.
     if raw_series is not None and len(raw_series) > 0:
@@ -0,0 +1,266 @@
+"""Nightly materialised Open Interest views for the products in
+`data/OI_product_map.xlsx`.
+
+The Open Interest page builds its Nth-day, terminal and price tables and the
+forward curves from the raw OI workbooks on every selection. The builder
+does that work once for every symbol of the product map and writes a
+versioned bundle:
+
+    data/oi_bundle/CURRENT                      name of the live version
+    data/oi_bundle/<version>/manifest.json      format, build time, months,
+                                                years, forwards, conversion
+                                                factors, products, sources
+    data/oi_bundle/<version>/<table>.parquet    terminal, forward, n_day,
+                                                price, curves: one long table
+                                                each, unscaled, with `symbol`
+    data/oi_bundle/<version>/pages.pkl          {symbols: page_data} for every
+                                                single symbol and every
+                                                product's full symbol list
+
+A precomputed selection is a dict lookup. Any other set of ticked symbols is
+combined from the per-symbol tables with the same `combine_views` /
+`combine_forward_curves` the live path uses, so the page does no workbook
+reads either way. A new version is written next to
+the old ones and `CURRENT` is switched last; the newest `keep` versions are
+kept. `load_bundle` returns None when there is no bundle, it is older than
+`MAX_AGE`, or it was built for other months, years or forwards (e.g. before
+the T-2 date rolled). `OIBundle.is_current` compares the workbook
+generations recorded at build time with the current ones (re-checked at most
+every `oi_store.METADATA_TTL`). The page falls back to the live path in
+all of these cases, so a stopped nightly job never serves old OI.
+
+Usage:
+    python -m utils.oi_bundle
+    python -m utils.oi_bundle --product-map data/OI_product_map.xlsx --keep 3
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import pickle
+import shutil
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+
+from utils import oi_store
+from utils.atomic_file import atomic_path
+from utils.oi_constants import OI_V2_FORWARDS_MOD, OI_V2_MONTHS, OI_V2_YEARS
+from utils.oi_daily import (
+    _history,
+    combine_forward_curves,
+    combine_views,
+    forward_curve_frame,
+    get_pivot_table,
+    n_day_slice,
+    oi_slices,
+)
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+PRODUCT_MAP = DATA_DIR / "OI_product_map.xlsx"
+BUNDLE_DIR = DATA_DIR / "oi_bundle"
+BUNDLE_FORMAT = 1
+# A nightly bundle older than this (seconds) is not served.
+MAX_AGE = 26 * 3600
+TABLES = ("terminal", "forward", "n_day", "price", "curves")
+
+
+def read_product_map(path: Path = PRODUCT_MAP) -> pd.DataFrame:
+    """The `Data` sheet with the columns the page uses, as the page reads it."""
+    df = pd.read_excel(path, sheet_name="Data")
+    cols = ["Label", "Symbol", "Symbol Description", "Price Unit", "OI Unit", "conversion_factor"]
+    return df[cols].dropna()
+
+
+def symbol_tables(symbol: str, months, years, forwards, price: bool = True) -> dict[str, pd.DataFrame]:
+    """One symbol's rows of every bundle table (without "price" if not `price`)."""
+    tables = oi_slices(symbol, months, years, forwards)
+    if price:
+        tables["price"] = n_day_slice(_history(symbol, months, years, "price"), forwards, "price")
+    tables["curves"] = forward_curve_frame(symbol, forwards)
+    return tables
+
+
+def page_data(symbols, tables, forwards, conv_factor_map) -> dict:
+    """Everything the Open Interest page shows for `symbols`, from per-symbol
+    tables ({symbol: symbol_tables(...)}): the "n_day" and "terminal" views,
+    their pivots (and "price" for a single symbol), and forward "curves"."""
+    symbols = list(symbols)
+    views = combine_views(symbols, tables, conv_factor_map)
+    if len(symbols) == 1:
+        views["price"] = tables[symbols[0]]["price"]
+    out = dict(views)
+    for view, df in views.items():
+        out[f"pivot_{view}"] = get_pivot_table(df.copy(), "price" if view == "price" else "OI")
+    out["curves"] = combine_forward_curves([tables[s]["curves"] for s in symbols], symbols,
+                                           forwards, conv_factor_map)
+    return out
+
+
+def live_page_data(symbols, months, years, forwards, conv_factor_map) -> dict:
+    """`page_data` computed from the workbooks."""
+    tables = {s: symbol_tables(s, months, years, forwards, price=len(symbols) == 1) for s in symbols}
+    return page_data(symbols, tables, forwards, conv_factor_map)
+
+
+# ── Build ─────────────────────────────────────────────────────────────
+
+def _source_generations(symbol: str) -> dict[str, str | None]:
+    out = {}
+    for suffix in oi_store.SUFFIXES:
+        try:
+            out[suffix] = oi_store.source_generation(symbol, suffix)
+        except Exception:
+            out[suffix] = None
+    return out
+
+
+def build_bundle(product_map: Path = PRODUCT_MAP, bundle_dir: Path = BUNDLE_DIR, keep: int = 3,
+                 months=OI_V2_MONTHS, years=OI_V2_YEARS, forwards=OI_V2_FORWARDS_MOD) -> Path:
+    """Materialise every symbol and product of `product_map` into a new
+    version under `bundle_dir` and make it the current one."""
+    bundle_dir = Path(bundle_dir)
+    df = read_product_map(product_map)
+    products: dict[str, list[str]] = {}
+    for label, symbol in zip(df["Label"], df["Symbol"]):
+        products.setdefault(str(label).strip(), []).append(str(symbol).strip())
+    conv_factor_map = dict(zip(df["Symbol"].astype(str).str.strip(), df["conversion_factor"].astype(float)))
+
+    tables, sources = {}, {}
+    for symbol in dict.fromkeys(s for members in products.values() for s in members):
+        t0 = time.perf_counter()
+        try:
+            tables[symbol] = symbol_tables(symbol, months, years, forwards)
+        except Exception as e:
+            print(f"{symbol}: skipped ({e})")
+            continue
+        sources[symbol] = _source_generations(symbol)
+        print(f"{symbol}: {time.perf_counter() - t0:.1f}s")
+
+    combos = {(s,) for s in tables}
+    combos |= {tuple(members) for members in products.values() if all(s in tables for s in members)}
+    pages = {}
+    for combo in sorted(combos):
+        try:
+            pages[combo] = page_data(combo, tables, forwards, conv_factor_map)
+        except Exception as e:
+            print(f"{'+'.join(combo)}: not precomputed ({e})")
+
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    out_dir = bundle_dir / version
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name in TABLES:
+        frames = [t[name] for t in tables.values() if not t[name].empty]
+        long = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["symbol"])
+        long.to_parquet(out_dir / f"{name}.parquet", index=False)
+    with open(out_dir / "pages.pkl", "wb") as f:
+        pickle.dump(pages, f, protocol=pickle.HIGHEST_PROTOCOL)
+    (out_dir / "manifest.json").write_text(json.dumps({
+        "format": BUNDLE_FORMAT,
+        "version": version,
+        "built_at": time.time(),
+        "months": list(months),
+        "years": list(years),
+        "forwards": list(forwards),
+        "conversion_factors": conv_factor_map,
+        "symbols": sorted(tables),
+        "products": products,
+        "sources": sources,
+    }, indent=1))
+
+    with atomic_path(bundle_dir / "CURRENT") as tmp:
+        tmp.write_text(version)
+    for old in sorted(p for p in bundle_dir.iterdir() if p.is_dir())[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
+    return out_dir
+
+
+# ── Load ──────────────────────────────────────────────────────────────
+
+class OIBundle:
+    """One materialised version, split into per-symbol tables."""
+
+    def __init__(self, path: Path):
+        path = Path(path)
+        self.path = path
+        self.manifest = json.loads((path / "manifest.json").read_text())
+        self.version: str = self.manifest["version"]
+        self.symbols = set(self.manifest["symbols"])
+        self._tables: dict[str, dict[str, pd.DataFrame]] = {s: {} for s in self.symbols}
+        for name in TABLES:
+            long = pd.read_parquet(path / f"{name}.parquet")
+            empty = long.iloc[:0]
+            groups = dict(tuple(long.groupby("symbol", sort=False))) if not long.empty else {}
+            for symbol in self.symbols:
+                self._tables[symbol][name] = groups.get(symbol, empty).reset_index(drop=True)
+        with open(path / "pages.pkl", "rb") as f:
+            self._pages: dict[tuple[str, ...], dict] = pickle.load(f)
+
+    def covers(self, symbols) -> bool:
+        return all(s in self.symbols for s in symbols)
+
+    def is_current(self, symbols) -> bool:
+        """False if any workbook `symbols` are shown from (price: single symbol
+        only) changed since the build. Unreadable generations do not count."""
+        suffixes = ("OI", "price") if len(symbols) == 1 else ("OI",)
+        for symbol in symbols:
+            built = self.manifest["sources"].get(symbol, {})
+            for suffix in suffixes:
+                now = oi_store.current_generation(symbol, suffix)
+                if now is not None and built.get(suffix) is not None and now != built[suffix]:
+                    return False
+        return True
+
+    def page_data(self, symbols, conv_factor_map) -> dict:
+        """`page_data` for `symbols`. A precomputed selection is returned as
+        is (shared: do not mutate) if the conversion factors match the ones
+        it was built with."""
+        built = self.manifest["conversion_factors"]
+        key = tuple(symbols)
+        if key in self._pages and all(float(conv_factor_map[s]) == built.get(s) for s in symbols):
+            return self._pages[key]
+        return page_data(symbols, self._tables, self.manifest["forwards"], conv_factor_map)
+
+
+@lru_cache(maxsize=2)
+def _open_bundle(path: Path) -> OIBundle:
+    return OIBundle(path)
+
+
+def load_bundle(months=OI_V2_MONTHS, years=OI_V2_YEARS, forwards=OI_V2_FORWARDS_MOD,
+                bundle_dir: Path = BUNDLE_DIR) -> OIBundle | None:
+    """The current bundle, or None if there is none, it is older than
+    `MAX_AGE` or was built for other months, years or forwards. Opened once
+    per version."""
+    try:
+        version = (Path(bundle_dir) / "CURRENT").read_text().strip()
+        bundle = _open_bundle(Path(bundle_dir) / version)
+    except (OSError, ValueError, KeyError):
+        return None
+    m = bundle.manifest
+    if (m.get("format") != BUNDLE_FORMAT or m["months"] != list(months)
+            or m["years"] != list(years) or m["forwards"] != list(forwards)
+            or time.time() - m["built_at"] > MAX_AGE):
+        return None
+    return bundle
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Materialise the Open Interest page for every product")
+    parser.add_argument("--product-map", default=str(PRODUCT_MAP))
+    parser.add_argument("--bundle-dir", default=str(BUNDLE_DIR))
+    parser.add_argument("--keep", type=int, default=3, help="versions to keep")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    out_dir = build_bundle(Path(args.product_map), Path(args.bundle_dir), max(args.keep, 1))
+    manifest = json.loads((out_dir / "manifest.json").read_text())
+    print(f"{len(manifest['symbols'])} symbols, {len(manifest['products'])} products "
+          f"in {time.perf_counter() - t0:.1f}s -> {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ from datetime import datetime
 def get_t2_date():
     """Returns the date 2 business days before today."""
     today = np.datetime64('today')
-    t2 = np.busday_offset(today, -2)
+    t2 = np.busday_offset(today, -2, roll='forward')
     return datetime.fromisoformat(str(t2))
 
 def generate_forwards(t2_date, max_year_2digit, include_prompt_month=True):
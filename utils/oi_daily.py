@@ -1,19 +1,19 @@
 import pandas as pd
 from datetime import datetime
-import calendar
-import json
-from functools import reduce, lru_cache
-import urllib.parse
-import urllib.request
+from functools import reduce
 import streamlit as st
 import plotly.graph_objects as go
 import numpy as np
 from datetime import datetime, timedelta, timezone
 from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from utils.firebase_client import get_client
+from utils import oi_store
+from utils.memory_cache import budget, sized_cache
 from utils.oi_constants import OI_V2_SPREAD_SYMBOLS
+from utils.trading_calendar import n_trading_days, terminal_dates
 
-
-FIREBASE_BUCKET = "hotei-streamlit.firebasestorage.app"
+WORKBOOK_TTL = 300
 
 
 @st.cache_data(ttl=600)
@@ -24,11 +24,7 @@ def get_firebase_last_updated(remote_path: str) -> datetime | None:
     Uses the /o/{path} endpoint WITHOUT ?alt=media which returns JSON metadata
     instead of the file bytes."""
     try:
-        encoded = urllib.parse.quote(remote_path, safe="")
-        url = (f"https://firebasestorage.googleapis.com/v0/b/"
-               f"{FIREBASE_BUCKET}/o/{encoded}")
-        with urllib.request.urlopen(url, timeout=10) as r:
-            meta = json.loads(r.read().decode("utf-8"))
+        meta = get_client().metadata(remote_path) or {}
         updated_str = meta.get("updated")
         if not updated_str:
             return None
@@ -48,27 +44,50 @@ def format_last_refreshed(remote_path: str, tz_offset_hours: float = 8.0) -> str
     ts_local = ts_utc.astimezone(timezone(timedelta(hours=tz_offset_hours)))
     return ts_local.strftime("%Y-%m-%d %H:%M SGT")
 
-@lru_cache(maxsize=None)
+def _parse_workbook(raw):
+    return pd.read_excel(BytesIO(raw), sheet_name=None)
+
+
+def _parse_first_sheet(raw):
+    return pd.read_excel(BytesIO(raw))
+
+
 def read_dfs(symbol, suffix="OI"):
     folder = "OI"
     if suffix == 'price' and symbol in OI_V2_SPREAD_SYMBOLS:
         filename = f"{symbol}_24m_{suffix}_spr.xlsx"
     else:
         filename = f"{symbol}_24m_{suffix}.xlsx"
-    encoded_filename = urllib.parse.quote(filename)
-    url = f"https://firebasestorage.googleapis.com/v0/b/hotei-streamlit.firebasestorage.app/o/{folder}%2F{encoded_filename}?alt=media"
-    dfs = pd.read_excel(url, sheet_name=None)
-    return dfs
+    # Parsed once per blob generation (revalidated at most every WORKBOOK_TTL
+    # seconds, held within the client's memory budget); callers get their own
+    # copy-on-write frames.
+    dfs = get_client().get_parsed(f"{folder}/{filename}", _parse_workbook, max_age=WORKBOOK_TTL)
+    return {name: df.copy(deep=False) for name, df in dfs.items()}
+
+def read_contract(symbol, contract, suffix="OI", columns=None):
+    """Rows of one contract of the `{symbol}_{Mon}` sheet, sorted by Date.
+
+    Served from the local parquet OI store when the symbol has been
+    converted from the current workbook generation (only that contract's
+    row groups and `columns` are read), otherwise cut from the workbook.
+    None if the sheet does not exist."""
+    if oi_store.is_fresh(symbol, suffix):
+        return oi_store.load_contract(symbol, contract, suffix, columns)
+    dfs = read_dfs(symbol, suffix)
+    sheet = f"{symbol}_{contract[:3]}"
+    if sheet not in dfs:
+        return None
+    df = dfs[sheet]
+    df = df[df["contract"] == contract].assign(Date=lambda d: pd.to_datetime(d["Date"]))
+    return df[list(columns)] if columns else df
 
 #####
 #####
-@st.cache_data
+@st.cache_data(ttl=60)
 def read_OI_volume():
     folder = "Test"
     filename = f"OI_volume.xlsx"
-    encoded_filename = urllib.parse.quote(filename)
-    url = f"https://firebasestorage.googleapis.com/v0/b/hotei-streamlit.firebasestorage.app/o/{folder}%2F{encoded_filename}?alt=media"
-    df = pd.read_excel(url)
+    df = get_client().get_parsed(f"{folder}/{filename}", _parse_first_sheet)
     return df
 
 def style_OI_column_groups(df):
@@ -119,325 +138,234 @@ def get_terminal_date(contract: str) -> datetime:
     Given a contract string like "Jun25", return the day before the 1st of that month.
     Compatible with pandas datetime format.
     """
-    month_str = contract[:3]
-    year_suffix = contract[3:]
-    
-    # Convert to numeric month and full year
-    month_number = datetime.strptime(month_str, "%b").month
-    year_full = 2000 + int(year_suffix)
-    
-    # First of the contract month
-    first_of_month = datetime(year_full, month_number, 1)
-    
-    # Return the previous day
-    return first_of_month - timedelta(days=1)
+    return pd.Timestamp(terminal_dates(contract)).to_pydatetime()
 
-def get_terminal_OI(symbol, months, years, forwards):
-    dfs = read_dfs(symbol)
-    
-    forward_27 = [c for c in forwards if c.endswith("27")]
+# ── OI aggregation engine ─────────────────────────────────────────────
+# Each symbol's contracts are loaded once into a long table (one row per
+# contract × date, with its terminal date and trading-day count precomputed).
+# The terminal, forward-today and Nth-trading-day views are slices of it, and
+# multi-symbol views are one groupby over the stacked, conversion-factor
+# scaled slices.
 
-    def process_contract(month, year):
-        contract = f"{month}{year}"
-        if contract in forward_27:
-            return None
+_MERGE_KEYS = ["contract", "Date", "contract_month", "year"]
+_N_DAY_KEYS = ["contract", "n_trading_day", "contract_month", "year"]
+_VIEW_COLS = ["Date", "OI", "symbol", "contract", "n_trading_day", "contract_month", "year"]
 
-        sheet = f"{symbol}_{month}"
-        if sheet not in dfs:
-            return None
 
-        df = dfs[sheet]
-        df["Date"] = pd.to_datetime(df["Date"])
-        df_contract = df[df["contract"] == contract].copy()
-        if df_contract.empty:
-            return None
+@sized_cache(budget("oi_history"), ttl=WORKBOOK_TTL)
+def load_oi_history(symbol, months, years, suffix="OI"):
+    """Long table of every row of the symbol's `{month}{year}` contracts.
 
-        # Step: Apply cutoff date filter
-        month_num = datetime.strptime(month, "%b").month  # e.g., 'Jul' -> 7
-        cutoff_date = datetime(2000 + year, month_num, 1) - timedelta(days=1)
-        df_contract = df_contract[df_contract["Date"] <= cutoff_date]
-        if df_contract.empty:
-            return None
+    Columns: Date, `suffix`, symbol, contract, contract_month, year,
+    terminal, n_trading_day (business days since the terminal date), order
+    (position of the contract in years × months order). Shared: do not mutate."""
+    contracts = [f"{month}{year}" for year in years for month in months]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        frames = list(executor.map(
+            lambda c: read_contract(symbol, c, suffix, columns=["Date", "contract", suffix]), contracts))
+    parts = [f.assign(order=i) for i, f in enumerate(frames) if f is not None and not f.empty]
+    if not parts:
+        return pd.DataFrame(columns=["Date", suffix, "symbol", "contract", "contract_month", "year",
+                                     "terminal", "n_trading_day", "order"])
+    df = pd.concat(parts, ignore_index=True)
+    df["contract"] = df["contract"].astype(str)
+    df["symbol"] = symbol
+    df["contract_month"] = df["contract"].str[:3]
+    df["year"] = 2000 + df["contract"].str[3:].astype(int)
+    df["terminal"] = terminal_dates(df["contract"].to_numpy())
+    df["n_trading_day"] = n_trading_days(df["Date"], df["terminal"])
+    return df
 
-        df_contract["n_trading_day"] = 0
-        df_contract["contract_month"] = month
-        df_contract["year"] = 2000 + year
-        return df_contract.tail(1)
 
+def _history(symbol, months, years, suffix="OI"):
+    return load_oi_history(symbol, tuple(months), tuple(years), suffix)
 
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        futures = [
-            executor.submit(process_contract, month, year)
-            for year in years for month in months
-        ]
-        results = [f.result() for f in futures if f.result() is not None]
-
-    if results:
-        df = pd.concat(results, ignore_index=True)
-        df = df.sort_values("Date").reset_index(drop=True)
-    else:
-        df = pd.DataFrame()
 
-    return df
+def terminal_slice(hist, forwards, suffix="OI"):
+    """Last row on or before the terminal date of every contract not in the
+    '27 forwards, by Date."""
+    forward_27 = [c for c in forwards if c.endswith("27")]
+    df = hist[~hist["contract"].isin(forward_27) & (hist["Date"] <= hist["terminal"])]
+    df = df.groupby(["symbol", "order"], sort=False).tail(1)
+    df = df.assign(n_trading_day=0)[["Date", suffix, "symbol", "contract", "n_trading_day",
+                                     "contract_month", "year"]]
+    return df.sort_values("Date").reset_index(drop=True)
 
-def get_forward_today_OI(symbol, months, years, forwards, suffix="OI"):
-    dfs = read_dfs(symbol, suffix)
-    def process_forward(month, year):
-        contract = f"{month}{year}"
-        if contract not in forwards:
-            return None
 
-        sheet = f"{symbol}_{month}"
-        if sheet not in dfs:
-            return None
+def forward_slice(hist, forwards, suffix="OI"):
+    """Latest row of every forward contract, in years × months order."""
+    df = hist[hist["contract"].isin(forwards)].groupby(["symbol", "order"], sort=False).tail(1)
+    return df[["Date", suffix, "symbol", "contract", "n_trading_day",
+               "contract_month", "year"]].reset_index(drop=True)
 
-        terminal_date = get_terminal_date(contract)
-        df = dfs[sheet]
-        df["Date"] = pd.to_datetime(df["Date"])
-        df_contract = df[df["contract"] == contract].copy()
 
-        if df_contract.empty:
-            return None
+def n_day_slice(hist, forwards, suffix="OI"):
+    """Per contract, the rows at the trading-day counts today's forwards of
+    the same delivery month are at (the nearest within 5 days if that day
+    has no row), plus the forward rows, latest first.
 
-        df_contract["contract_month"] = month
-        df_contract["year"] = 2000 + year
-        df_contract["n_trading_day"] = df_contract["Date"].apply(
-            lambda d: np.busday_count(terminal_date.date(), d.date())
-        )
-        return df_contract.tail(1)
+    `hist` may hold several symbols; each is matched against its own forwards."""
+    forward = forward_slice(hist, forwards, suffix)
+    forward_26 = [c for c in forwards if c.endswith("26")]
+    forward_27 = [c for c in forwards if c.endswith("27")]
 
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        futures = [
-            executor.submit(process_forward, month, year)
-            for year in years for month in months
-        ]
-        results = [f.result() for f in futures if f.result() is not None]
-
-    if results:
-        df = pd.concat(results, ignore_index=True)
+    # (contract, target day) pairs: every forward day of the contract's
+    # month, only the second one for a '26 forward that has two.
+    days = forward[["symbol", "contract_month", "n_trading_day"]].rename(columns={"n_trading_day": "target"})
+    by_month = days.groupby(["symbol", "contract_month"], sort=False)
+    days["seq"], days["n_days"] = by_month.cumcount(), by_month["target"].transform("size")
+    contracts = hist.loc[~hist["contract"].isin(forward_27), ["symbol", "order", "contract", "contract_month"]]
+    targets = contracts.drop_duplicates(["symbol", "order"]).merge(days, on=["symbol", "contract_month"])
+    targets = targets[~(targets["contract"].isin(forward_26) & (targets["n_days"] > 1) & (targets["seq"] != 1))]
+    targets = targets[["symbol", "order", "seq", "target"]]
+
+    rows = hist.reset_index(drop=True).rename_axis("row").reset_index()
+    keys = ["symbol", "order", "seq"]
+    exact = rows[["row", "symbol", "order", "n_trading_day"]].merge(
+        targets, left_on=["symbol", "order", "n_trading_day"], right_on=["symbol", "order", "target"])
+    # Holiday calendars differ between years: fall back to the nearest day
+    # within 5 (ties to the earlier day) as an as-of join per contract.
+    missing = targets.merge(exact[keys].drop_duplicates(), how="left", on=keys, indicator=True)
+    missing = missing[missing["_merge"] == "left_only"].drop(columns="_merge")
+    nearest = pd.merge_asof(
+        missing.sort_values("target"),
+        rows[["row", "symbol", "order", "n_trading_day"]].sort_values("n_trading_day", kind="stable"),
+        left_on="target", right_on="n_trading_day", by=["symbol", "order"],
+        direction="nearest", tolerance=5).dropna(subset=["row"])
+    nth = pd.concat([exact[keys + ["row"]], nearest[keys + ["row"]].astype({"row": "int64"})])
+    nth = rows.loc[nth.sort_values(keys + ["row"], kind="stable")["row"]]
+
+    cols = [c for c in hist.columns if c not in ("terminal", "order")]
+    out = pd.concat([nth[cols], forward], ignore_index=True)
+    out = out[["Date", suffix, "symbol", "contract", "n_trading_day", "contract_month", "year"]]
+    out = out.sort_values("Date", ascending=False).reset_index(drop=True)
+    return out.drop_duplicates()
+
+
+def _scaled(df, cf):
+    return df.assign(OI=(df["OI"].astype(float) * cf).round().astype("Int64"))
+
+
+def _combine(frames, keys):
+    """Rows whose `keys` appear for every symbol, OI summed (n_trading_day:
+    the max across symbols unless it is a key), in the first symbol's order."""
+    long = pd.concat(frames, ignore_index=True)
+    aggs = {"OI": ("OI", "sum"), "n_symbols": ("symbol", "nunique")}
+    if "n_trading_day" not in keys:
+        aggs["n_trading_day"] = ("n_trading_day", "max")
+    out = long.groupby(keys, sort=False).agg(**aggs)
+    return out[out["n_symbols"] == len(frames)].drop(columns="n_symbols").reset_index()
+
+
+def oi_slices(symbol, months, years, forwards):
+    """{"terminal", "forward", "n_day"}: one symbol's unscaled rows of each view."""
+    hist = _history(symbol, months, years)
+    return {"terminal": terminal_slice(hist, forwards), "forward": forward_slice(hist, forwards),
+            "n_day": n_day_slice(hist, forwards)}
+
+
+def oi_views(symbols, months, years, forwards, conv_factor_map):
+    """{"n_day", "terminal"}: the page's Nth-day and terminal + forward
+    tables for `symbols`, from one load per symbol."""
+    slices = {s: oi_slices(s, months, years, forwards) for s in symbols}
+    return combine_views(symbols, slices, conv_factor_map)
+
+
+def combine_views(symbols, slices, conv_factor_map):
+    """`oi_views` from per-symbol `oi_slices` (scaled by conversion factor
+    when there are several symbols)."""
+    scale = len(symbols) > 1
+    terminal, forward, n_day = [], [], []
+    for symbol in symbols:
+        cf = conv_factor_map[symbol]
+        t, f = slices[symbol]["terminal"], slices[symbol]["forward"]
+        terminal.append(_scaled(t, cf) if scale else t)
+        forward.append(_scaled(f, cf) if scale else f)
+        n_day.append(_scaled(slices[symbol]["n_day"], cf if scale else 1))
+
+    label = "+".join(symbols)
+    agg_terminal = _combine(terminal, _MERGE_KEYS).assign(n_trading_day=0, symbol=label)
+    agg_forward = _combine(forward, _MERGE_KEYS).assign(symbol=label)
+    if agg_terminal.empty and agg_forward.empty:
+        all_oi = pd.DataFrame()
     else:
-        df = pd.DataFrame()
+        all_oi = pd.concat([agg_terminal[_VIEW_COLS], agg_forward[_VIEW_COLS]], ignore_index=True)
+        for col in all_oi.columns:
+            if pd.api.types.is_numeric_dtype(all_oi[col]):
+                all_oi[col] = all_oi[col].astype("Int64")
 
-    return df
+    combined = _combine(n_day, _N_DAY_KEYS).assign(symbol=" + ".join(symbols))
+    return {"n_day": combined, "terminal": all_oi}
 
 
-def get_aggregated_terminal_OI(symbols, months, years, forwards, conv_factor_map):
-    """
-    Aggregates terminal OI for multiple symbols.
-    - OI is summed
-    - n_trading_day is averaged and rounded
-    - symbol column is replaced with 'SYM1+SYM2+...'
-    """
-    all_dfs = []
-
-    if len(symbols) == 1:
-        symbol = symbols[0]
-        df = get_terminal_OI(symbol, months, years, forwards)
-        all_dfs.append(df)
+# ── Per-view entry points ─────────────────────────────────────────────
 
-    else:
-        for symbol in symbols:
-            cf = conv_factor_map[symbol]
-            df = get_terminal_OI(symbol, months, years, forwards)
-            df['OI'] = (df['OI'].astype(float) * cf).round().astype('Int64')
-            all_dfs.append(df)
-
-    # Base merge keys
-    base_df = all_dfs[0][["contract", "Date", "contract_month", "year"]].copy()
-
-    for i, df in enumerate(all_dfs):
-        df_subset = df[["contract", "Date", "contract_month", "year", "OI", "n_trading_day"]].copy()
-        df_subset = df_subset.rename(columns={
-            "OI": f"OI_{i}",
-            "n_trading_day": f"n_day_{i}"
-        })
-        base_df = base_df.merge(df_subset, on=["contract", "Date", "contract_month", "year"], how="inner")
+def get_terminal_OI(symbol, months, years, forwards):
+    return terminal_slice(_history(symbol, months, years), forwards)
 
-    # Aggregate columns
-    oi_cols = [col for col in base_df.columns if col.startswith("OI_")]
-    n_day_cols = [col for col in base_df.columns if col.startswith("n_day_")]
 
-    base_df["OI"] = base_df[oi_cols].sum(axis=1)
-    base_df["n_trading_day"] = 0
+def get_forward_today_OI(symbol, months, years, forwards, suffix="OI"):
+    return forward_slice(_history(symbol, months, years, suffix), forwards, suffix)
 
-    # Clean up and finalize
-    base_df.drop(columns=oi_cols + n_day_cols, inplace=True)
-    base_df["symbol"] = "+".join(symbols)
 
-    # Reorder
-    base_df = base_df[["Date", "OI", "symbol", "contract", "n_trading_day", "contract_month", "year"]]
+def get_aggregated_terminal_OI(symbols, months, years, forwards, conv_factor_map):
+    """
+    Aggregates terminal OI for multiple symbols.
+    - OI is summed (scaled by conversion factor when there are several)
+    - symbol column is replaced with 'SYM1+SYM2+...'
+    """
+    frames = [get_terminal_OI(s, months, years, forwards) for s in symbols]
+    if len(symbols) > 1:
+        frames = [_scaled(f, conv_factor_map[s]) for f, s in zip(frames, symbols)]
+    out = _combine(frames, _MERGE_KEYS).assign(n_trading_day=0, symbol="+".join(symbols))
+    return out[_VIEW_COLS]
 
-    return base_df
 
 def get_aggregated_forward_today_OI(symbols, months, years, forwards, conv_factor_map):
     """
     Aggregates forward OI for multiple symbols.
-    - OI is summed
-    - n_trading_day is averaged and rounded
+    - OI is summed (scaled by conversion factor when there are several)
+    - n_trading_day is the max across symbols
     - symbol column is replaced with 'SYM1+SYM2+...'
     """
-    all_dfs = []
-
-    if len(symbols) == 1:
-        symbol = symbols[0]
-        df = get_forward_today_OI(symbol, months, years, forwards)
-        all_dfs.append(df)
-
-    else:
-        for symbol in symbols:
-            cf = conv_factor_map[symbol]
-            df = get_forward_today_OI(symbol, months, years, forwards)
-            df['OI'] = (df['OI'].astype(float) * cf).round().astype('Int64')
-            all_dfs.append(df)
-
-    # Start with base keys
-    base_df = all_dfs[0][["contract", "Date", "contract_month", "year"]].copy()
-
-    for i, df in enumerate(all_dfs):
-        df_subset = df[["contract", "Date", "contract_month", "year", "OI", "n_trading_day"]].copy()
-        df_subset = df_subset.rename(columns={
-            "OI": f"OI_{i}",
-            "n_trading_day": f"n_day_{i}"
-        })
-        base_df = base_df.merge(df_subset, on=["contract", "Date", "contract_month", "year"], how="inner")
+    frames = [get_forward_today_OI(s, months, years, forwards) for s in symbols]
+    if len(symbols) > 1:
+        frames = [_scaled(f, conv_factor_map[s]) for f, s in zip(frames, symbols)]
+    out = _combine(frames, _MERGE_KEYS).assign(symbol="+".join(symbols))
+    return out[_VIEW_COLS]
 
-    # Sum OI and average n_trading_day
-    oi_cols = [col for col in base_df.columns if col.startswith("OI_")]
-    n_day_cols = [col for col in base_df.columns if col.startswith("n_day_")]
-
-    base_df["OI"] = base_df[oi_cols].sum(axis=1)
-    base_df["n_trading_day"] = base_df[n_day_cols].max(axis=1)
-    # Final cleanup
-    base_df.drop(columns=oi_cols + n_day_cols, inplace=True)
-    base_df["symbol"] = "+".join(symbols)
-
-    # Reorder columns
-    base_df = base_df[["Date", "OI", "symbol", "contract", "n_trading_day", "contract_month", "year"]]
-
-    return base_df
 
 def get_all_OI(symbols, months, years, forwards, conv_factor_map):
     """
     Combines terminal and forward OI into a single DataFrame.
     Keeps None/NaN values, but ensures numbers are stored as integers.
     """
-    df_terminal = get_aggregated_terminal_OI(symbols, months, years, forwards, conv_factor_map)
-    df_forward = get_aggregated_forward_today_OI(symbols, months, years, forwards, conv_factor_map)
-
-    if df_terminal.empty and df_forward.empty:
-        return pd.DataFrame()
+    return oi_views(symbols, months, years, forwards, conv_factor_map)["terminal"]
 
-    combined_df = pd.concat([df_terminal, df_forward], ignore_index=True)
-
-    # Convert numeric columns to nullable Int64 (keeps None/NaN)
-    for col in combined_df.columns:
-        if pd.api.types.is_numeric_dtype(combined_df[col]):
-            combined_df[col] = combined_df[col].astype("Int64")
-
-    return combined_df
 
 def get_n_day_OI(symbol, months, years, forwards, cf, suffix="OI"):
     """
-    Combines terminal and forward OI into a single DataFrame.
+    Nth-trading-day and forward rows of one symbol, latest first.
     """
-    df_forward = get_forward_today_OI(symbol, months, years, forwards, suffix)
-
-    n_trading_day_dct = (
-        df_forward
-        .groupby("contract_month")["n_trading_day"]
-        .apply(lambda x: tuple(x))  # Will return a tuple even if there's only one value
-        .to_dict()
-    )
-
-    dfs = read_dfs(symbol, suffix)
-    
-    contract_lst = []
-    for year in years:
-        for month in months:
-            contract = f"{month}{year}"
-            
-            forward_26 = [c for c in forwards if c.endswith("26")]
-            forward_27 = [c for c in forwards if c.endswith("27")]
-
-            if contract in forward_27:
-                continue
-
-            sheet = f"{symbol}_{month}"
-            if sheet not in dfs:
-                continue
-
-            terminal_date = get_terminal_date(contract)
-            df = dfs[sheet]
-            df["Date"] = pd.to_datetime(df["Date"])
-            df_contract = df[df["contract"] == contract].copy()
-            df_contract["n_trading_day"] = df_contract["Date"].apply(
-                lambda d: np.busday_count(terminal_date.date(), d.date()))
-            df_contract["contract_month"] = month
-            df_contract["year"] = 2000+year
-
-            days = n_trading_day_dct[month]  # tuple of 1 or 2 days
-            if contract in forward_26 and len(days) > 1:
-                days_to_do = days[1:2]   # only the second element
-            else:
-                days_to_do = days        # 1-element or both
-
-            for n_trading_day in days_to_do:
-                df_nth_day = df_contract[df_contract["n_trading_day"] == n_trading_day]
-                if df_nth_day.empty and not df_contract.empty:
-                    # Nearest match (within 5 days) to handle holiday calendar differences between years
-                    diffs = (df_contract["n_trading_day"] - n_trading_day).abs()
-                    if diffs.min() <= 5:
-                        df_nth_day = df_contract.iloc[diffs.argsort()[:1]]
-                if not df_nth_day.empty:
-                    contract_lst.append(df_nth_day)
-
-    df = pd.concat(contract_lst, ignore_index=True)
-
-    combined_df = pd.concat([df, df_forward], ignore_index=True)
-    combined_df = combined_df.sort_values("Date", ascending=False).reset_index(drop=True)
-    combined_df = combined_df.drop_duplicates()
-    if suffix == 'OI':
-        combined_df['OI'] = (combined_df['OI'].astype(float) * cf).round().astype('Int64')
-    return combined_df
-
-def get_combined_n_day_OI(symbols, months, years, forwards, conv_factor_map):
-    from functools import reduce
+    df = n_day_slice(_history(symbol, months, years, suffix), forwards, suffix)
+    return _scaled(df, cf) if suffix == 'OI' else df
 
-    df_list = []
 
-    if len(symbols) == 1:
-        symbol = symbols[0]
-        df = get_n_day_OI(symbol, months, years, forwards, 1)
-        df = df.drop(columns=["Date", "symbol"])
-        df = df.rename(columns={"OI": f"OI_{symbol}"})  # Rename OI per symbol
-        df_list.append(df)
-
-    else:
-        for symbol in symbols:
-            cf = conv_factor_map[symbol]
-            df = get_n_day_OI(symbol, months, years, forwards, cf)
-            df = df.drop(columns=["Date", "symbol"])
-            df = df.rename(columns={"OI": f"OI_{symbol}"})  # Rename OI per symbol
-            df_list.append(df)
-
-    join_cols = ["contract", "n_trading_day", "contract_month", "year"]
-
-    combined_df = reduce(
-        lambda left, right: pd.merge(left, right, on=join_cols),
-        df_list
-    )
-
-    # Sum all renamed OI columns
-    oi_cols = [col for col in combined_df.columns if col.startswith("OI_")]
-    combined_df["OI"] = combined_df[oi_cols].sum(axis=1)
-
-    # Drop individual OI_ columns
-    combined_df = combined_df.drop(columns=oi_cols)
+def get_n_day_OI_many(symbols, months, years, forwards, conv_factor_map, suffix="OI"):
+    """
+    `get_n_day_OI` for every symbol in one pass, as one long table
+    (e.g. every Symbol of data/OI_product_map.xlsx).
+    """
+    hist = pd.concat([_history(s, months, years, suffix) for s in symbols], ignore_index=True)
+    df = n_day_slice(hist, forwards, suffix)
+    if suffix != 'OI':
+        return df
+    cf = df["symbol"].map(conv_factor_map).astype(float)
+    return df.assign(OI=(df["OI"].astype(float) * cf).round().astype("Int64"))
 
-    # Set symbol column to combined string
-    combined_df["symbol"] = " + ".join(symbols)
 
-    return combined_df
+def get_combined_n_day_OI(symbols, months, years, forwards, conv_factor_map):
+    return oi_views(symbols, months, years, forwards, conv_factor_map)["n_day"]
 
 ######################################################################################################
 @st.cache_data
@@ -496,52 +424,40 @@ def style_forward_cells(pivot_df):
         for col in pivot_df.columns
     ], axis=1)
 
-def plot_forwards_combined(symbols, forwards, conv_factor_map):
-    all_contract_data = {}
-
-    for symbol in symbols:
-        dfs = read_dfs(symbol)
-
-        for contract in forwards:
-            month = contract[:3]
-            sheet = f"{symbol}_{month}"
-            if sheet not in dfs:
-                continue
-
-            df = dfs[sheet]
-            df["Date"] = pd.to_datetime(df["Date"])
-            df_contract = df[df["contract"] == contract].copy()
-
-            if not df_contract.empty:
-                latest_date = df_contract["Date"].max()
-                one_year_ago = latest_date - pd.DateOffset(years=1)
-                df_contract = df_contract[df_contract["Date"] >= one_year_ago]
-
-                if len(symbols) > 1:
-                    cf = conv_factor_map[symbol]
-                    df_contract['OI'] = (df_contract['OI'].astype(float) * cf).round().astype('Int64')
-
-                # Aggregate into all_contract_data
-                if contract not in all_contract_data:
-                    all_contract_data[contract] = df_contract[["Date", "OI"]].copy()
-                else:
-                    all_contract_data[contract] = pd.merge(
-                        all_contract_data[contract],
-                        df_contract[["Date", "OI"]],
-                        on="Date",
-                        how="outer",
-                        suffixes=('', '_dup')
-                    )
-
-    # Sum OI across symbols for each contract
+def forward_curve_frame(symbol, forwards):
+    """Last year of OI of each forward contract of one symbol: Date, OI,
+    symbol, contract."""
+    parts = []
+    for contract in forwards:
+        df_contract = read_contract(symbol, contract, columns=["Date", "OI"])
+        if df_contract is None or df_contract.empty:
+            continue
+        one_year_ago = df_contract["Date"].max() - pd.DateOffset(years=1)
+        df_contract = df_contract[df_contract["Date"] >= one_year_ago]
+        parts.append(df_contract[["Date", "OI"]].assign(symbol=symbol, contract=contract))
+    if not parts:
+        return pd.DataFrame(columns=["Date", "OI", "symbol", "contract"])
+    return pd.concat(parts, ignore_index=True)
+
+
+def combine_forward_curves(frames, symbols, forwards, conv_factor_map):
+    """{contract: Date, OI_sum} with OI summed across symbols (scaled by
+    conversion factor when there are several), in `forwards` order."""
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return {}
+    long = pd.concat(frames, ignore_index=True)
+    if len(symbols) > 1:
+        cf = long["symbol"].map(conv_factor_map).astype(float)
+        long["OI"] = (long["OI"].astype(float) * cf).round().astype("Int64")
+    curves = {contract: g.groupby("Date", as_index=False)["OI"].sum().rename(columns={"OI": "OI_sum"})
+              for contract, g in long.groupby("contract", sort=False)}
+    return {c: curves[c] for c in forwards if c in curves}
+
+
+def plot_forward_curves(curves, symbols):
     fig = go.Figure()
-    for contract, df_combined in all_contract_data.items():
-        # Sum all OI columns (some may be OI_dup, OI_dup1, etc.)
-        oi_cols = [col for col in df_combined.columns if col.startswith("OI")]
-        df_combined["OI_sum"] = df_combined[oi_cols].sum(axis=1)
-
-        df_combined = df_combined.sort_values("Date")
-
+    for contract, df_combined in curves.items():
         fig.add_trace(go.Scatter(
             x=df_combined["Date"],
             y=df_combined["OI_sum"],
@@ -561,67 +477,19 @@ def plot_forwards_combined(symbols, forwards, conv_factor_map):
 
     st.plotly_chart(fig, use_container_width=True)
 
+
+def plot_forwards_combined(symbols, forwards, conv_factor_map):
+    frames = [forward_curve_frame(symbol, forwards) for symbol in symbols]
+    plot_forward_curves(combine_forward_curves(frames, symbols, forwards, conv_factor_map), symbols)
+
 #################################################################################################
 #################################################################################################
-@lru_cache(maxsize=None)
+@sized_cache(budget("oi_prompt"), ttl=WORKBOOK_TTL)
 def construct_prompt_mth_rolling_df(symbol):
-    dfs = read_dfs(symbol)
-    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-    years = [25]
-
-    contract_lst = []
-
-    for year in years:
-        for month in months:
-            contract = f"{month}{year}"
-            sheet = f"{symbol}_{month}"
-            if sheet not in dfs:
-                continue
-
-            df = dfs[sheet]
-            df["Date"] = pd.to_datetime(df["Date"])
-            df_contract = df[df["contract"] == contract].copy()
-
-            if not df_contract.empty:
-                last_date = df_contract["Date"].max()
-                last_year = last_date.year
-                last_month = last_date.month
-
-                df_contract = df_contract[
-                    (df_contract["Date"].dt.year == last_year) &
-                    (df_contract["Date"].dt.month == last_month)
-                ]
-
-                if not df_contract.empty:
-                    contract_lst.append(df_contract)
-
-    df = pd.concat(contract_lst, ignore_index=True)
-    df = df.sort_values("Date").reset_index(drop=True)
-
-    #########################################################################################################
-    # Group by contract and compute average OI
-    df_grouped = df.groupby("contract", as_index=False)["OI"].mean().rename(columns={"OI": "avg_OI"})
-    month_map = {month: index for index, month in enumerate(calendar.month_abbr) if month}
-
-    # Vectorized contract-to-date conversion (e.g., 'Jan24' → 2024-01-01)
-    contract_months = df_grouped["contract"].str[:3].map(month_map)
-    contract_years = df_grouped["contract"].str[3:].astype(int) + 2000
-    df_grouped["contract_date"] = pd.to_datetime(
-        contract_years * 10000 + contract_months * 100 + 1, format="%Y%m%d", errors="coerce"
-    )
-
-    # Sort by contract_date
-    df_grouped = df_grouped.sort_values("contract_date").drop(columns=["contract_date"]).reset_index(drop=True)
-        
-    # Shift by 1 so that each contract gets the average of the *previous 3* contracts
-    df_grouped["3m_avg_OI"] = df_grouped["avg_OI"].shift(1).rolling(window=3).mean()
-
-    # Left join avg_OI and 3m_avg_OI back to original df
-    df_1 = df.merge(df_grouped, on="contract", how="left")
-    df_1["pct_from_avg"] = (
-        100*(df_1["OI"] - df_1["3m_avg_OI"]) / df_1["3m_avg_OI"]
-    ).round(1)
-    return df_1
+    """Prompt-month OI series of one symbol, with averages and T-5/T-10/T-20
+    OI; see `utils.oi_prompt` (only dates after the stored ones are read)."""
+    from utils.oi_prompt import update_series
+    return update_series(symbol)
 
 def combined_oi_dfs(symbols):
     dfs = [construct_prompt_mth_rolling_df(symbol) for symbol in symbols]
@@ -633,6 +501,9 @@ def combined_oi_dfs(symbols):
             'avg_OI': f'{symbol}_avg_OI',
             '3m_avg_OI': f'{symbol}_3m_avg_OI',
             'pct_from_avg': f'{symbol}_pct_from_avg',
+            'T-5_OI': f'{symbol}_T-5_OI',
+            'T-10_OI': f'{symbol}_T-10_OI',
+            'T-20_OI': f'{symbol}_T-20_OI',
         })
         df_oi_1 = df_oi_1.drop(columns='symbol', errors='ignore')  # 'symbol' column might not exist
         df_list.append(df_oi_1)
@@ -645,8 +516,10 @@ def combined_oi_dfs(symbols):
 def calc_main_product_oi(main_product, symbols):
     combined_df = combined_oi_dfs(symbols)
     
-    oi_cols = [col for col in combined_df.columns if col.endswith('_OI') and not col.endswith('avg_OI') and not col.endswith('3m_avg_OI')]
+    oi_cols = [f'{symbol}_OI' for symbol in symbols]
     combined_df[f'{main_product}_OI'] = combined_df[oi_cols].sum(axis=1)
+    for col in ['T-5_OI', 'T-10_OI', 'T-20_OI']:
+        combined_df[f'{main_product}_{col}'] = combined_df[[f'{symbol}_{col}' for symbol in symbols]].sum(axis=1)
 
     oi_avg_cols = [col for col in combined_df.columns if col.endswith('3m_avg_OI')]
     combined_df[f'{main_product}_3m_avg_OI'] = combined_df[oi_avg_cols].sum(axis=1, skipna=False)
@@ -679,7 +552,7 @@ def color_pct_from_avg(val):
 
     return f"background-color: {color}"
 
-@st.cache_data
+@st.cache_data(ttl=WORKBOOK_TTL)
 def create_diffs_heatmap(symbols, name_map):
     combined_df = combined_oi_dfs(symbols)
     today_df = combined_df.tail(1)
@@ -705,25 +578,9 @@ def create_diffs_heatmap(symbols, name_map):
     heatmap_data['contract'] = prompt_contract
     heatmap_data['OI_date'] = latest_date
 
-     # ── INSERT: initialize the new columns to empty/NaN ────────────────────
-    heatmap_data['T-5_OI']  = None
-    heatmap_data['T-10_OI'] = None
-    heatmap_data['T-20_OI'] = None
-    # ─────────────────────────────────────────────────────────────────────────
-
-    # ── LOOP OVER EACH ROW AND FILL IN HISTORICALS ───────────────────────────
-    for idx, row in heatmap_data.iterrows():
-        sym = row['symbol']
-        contract = row['contract']
-
-        # Call your helper that returns a dict of {"T-5_OI":…, "T-10_OI":…, "T-20_OI":…}
-        hist_dict = get_historicals_for_contract([sym], contract)
-
-        # Only write back the keys that exist
-        if 'T-5_OI'  in hist_dict: heatmap_data.at[idx, 'T-5_OI']  = hist_dict['T-5_OI']
-        if 'T-10_OI' in hist_dict: heatmap_data.at[idx, 'T-10_OI'] = hist_dict['T-10_OI']
-        if 'T-20_OI' in hist_dict: heatmap_data.at[idx, 'T-20_OI'] = hist_dict['T-20_OI']
-    # ─────────────────────────────────────────────────────────────────────────
+    # Historical OI of the prompt contract, kept on the series
+    for col in ['T-5_OI', 'T-10_OI', 'T-20_OI']:
+        heatmap_data[col] = [today_df[f"{sym}_{col}"].values[0] for sym in symbols]
 
     heatmap_data = heatmap_data[['diff', 'pct_from_avg', 'OI', 'T-5_OI', 'T-10_OI', 'T-20_OI', '3m_avg_OI', 'symbol', 'OI_date', 'contract']]
     heatmap_data = heatmap_data.loc[heatmap_data['pct_from_avg'].abs().sort_values(ascending=False).index].reset_index(drop=True)
@@ -740,7 +597,7 @@ def create_diffs_heatmap(symbols, name_map):
 
     st.dataframe(styled_df, use_container_width=True)
 
-@st.cache_data
+@st.cache_data(ttl=WORKBOOK_TTL)
 def create_main_product_heatmap(dct, product_fam_map_main):
     def process_main_product(main_product, symbols):
         combined_df = calc_main_product_oi(main_product, symbols)
@@ -762,9 +619,8 @@ def create_main_product_heatmap(dct, product_fam_map_main):
         today_df_2['OI_date'] = latest_date
 
         # Historical OI values
-        hist_dict = get_historicals_for_contract(symbols, prompt_contract)
         for col in ['T-5_OI', 'T-10_OI', 'T-20_OI']:
-            today_df_2[col] = hist_dict.get(col)
+            today_df_2[col] = today_df[f"{main_product}_{col}"].values[0]
 
         return today_df_2
 
@@ -789,23 +645,3 @@ def create_main_product_heatmap(dct, product_fam_map_main):
     })
 
     st.dataframe(styled_df, use_container_width=True)
-
-
-@st.cache_data
-def get_historicals_for_contract(symbols, contract):
-    result = {"T-5_OI": 0, "T-10_OI": 0, "T-20_OI": 0}
-    for symbol in symbols:
-        dfs = read_dfs(symbol)
-        month = contract[:3]
-        sheet = f"{symbol}_{month}"
-
-        if sheet not in dfs:
-            continue
-
-        df = dfs[sheet]
-        df_contract = df[df["contract"] == contract].copy()
-        result["T-5_OI"] += df_contract.iloc[-6]["OI"]
-        result["T-10_OI"] += df_contract.iloc[-11]["OI"]
-        result["T-20_OI"] += df_contract.iloc[-21]["OI"]
-
-    return result
\ No newline at end of file
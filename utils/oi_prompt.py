@@ -0,0 +1,146 @@
+"""Persisted prompt-month OI series per symbol, appended incrementally.
+
+The prompt-month series of a symbol is, for every date, the OI of the
+contract delivering next month (in October: the Nov contract, whose
+terminal date is Oct 31). Rebuilding it reads every contract's history.
+Instead it is kept on disk and extended with only the dates after its last
+one:
+
+    data/oi_prompt/<SYMBOL>.parquet
+
+Columns: Date, contract, OI, T-5_OI / T-10_OI / T-20_OI (the contract's OI
+5, 10 and 20 rows earlier in its own history), avg_OI (mean prompt-month OI
+of the contract), 3m_avg_OI (mean of the previous three contracts' avg_OI)
+and pct_from_avg. An append reads only the contracts that were prompt since
+the last stored date (one on a normal day) and recomputes the per-contract
+averages, which only the current contract's new rows change.
+
+    python -m utils.oi_prompt
+    python -m utils.oi_prompt --symbols GDK EOB --rebuild
+"""
+from __future__ import annotations
+
+import argparse
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from utils.atomic_file import atomic_path
+from utils.oi_daily import read_contract
+from utils.trading_calendar import contract_code, contract_index, month_start
+
+PROMPT_DIR = Path(__file__).resolve().parents[1] / "data" / "oi_prompt"
+FIRST_CONTRACT = "Jan25"
+LAGS = (5, 10, 20)
+BASE_COLS = ["Date", "contract", "OI"] + [f"T-{k}_OI" for k in LAGS]
+
+# One lock per (store_dir, symbol): heatmap threads share symbols.
+_LOCKS: dict[tuple[str, str], threading.Lock] = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+def _symbol_lock(symbol: str, store_dir: Path) -> threading.Lock:
+    with _LOCKS_GUARD:
+        return _LOCKS.setdefault((str(store_dir), symbol), threading.Lock())
+
+
+def _month_index(date) -> int:
+    date = pd.Timestamp(date)
+    return (date.year - 2000) * 12 + date.month - 1
+
+
+def prompt_rows(symbol: str, contract: str, after=None) -> pd.DataFrame | None:
+    """Rows of `contract` in the month before its delivery month (after
+    `after`, if given), with its T-k OI."""
+    df = read_contract(symbol, contract, columns=["Date", "OI"])
+    if df is None or df.empty:
+        return None
+    df = df.sort_values("Date", kind="stable", ignore_index=True)
+    for k in LAGS:
+        df[f"T-{k}_OI"] = df["OI"].shift(k)
+    i = contract_index(contract)
+    mask = (df["Date"] >= pd.Timestamp(month_start(i - 1))) & (df["Date"] < pd.Timestamp(month_start(i)))
+    if after is not None:
+        mask &= df["Date"] > after
+    return df[mask].assign(contract=contract)[BASE_COLS]
+
+
+def with_averages(df: pd.DataFrame) -> pd.DataFrame:
+    """`BASE_COLS` rows plus avg_OI, 3m_avg_OI and pct_from_avg."""
+    df = df[BASE_COLS].sort_values("Date", kind="stable", ignore_index=True)
+    grouped = df.groupby("contract", as_index=False)["OI"].mean().rename(columns={"OI": "avg_OI"})
+    grouped = grouped.iloc[contract_index(grouped["contract"]).argsort(kind="stable")]
+    # Shift by 1 so that each contract gets the average of the *previous 3* contracts
+    grouped["3m_avg_OI"] = grouped["avg_OI"].shift(1).rolling(window=3).mean()
+    df = df.merge(grouped, on="contract", how="left")
+    df["pct_from_avg"] = (100 * (df["OI"] - df["3m_avg_OI"]) / df["3m_avg_OI"]).round(1)
+    return df
+
+
+def load_series(symbol: str, store_dir: Path = PROMPT_DIR) -> pd.DataFrame | None:
+    fp = Path(store_dir) / f"{symbol}.parquet"
+    return pd.read_parquet(fp) if fp.exists() else None
+
+
+def update_series(symbol: str, today=None, store_dir: Path = PROMPT_DIR) -> pd.DataFrame:
+    """The stored series extended with every date after its last one (built
+    from `FIRST_CONTRACT` if there is none), written back if it grew.
+
+    Serialised per symbol within the process; the file is replaced through a
+    unique temporary file, so concurrent processes never see a torn file."""
+    with _symbol_lock(symbol, store_dir):
+        return _update_series(symbol, today, store_dir)
+
+
+def _update_series(symbol: str, today, store_dir: Path) -> pd.DataFrame:
+    old = load_series(symbol, store_dir)
+    last = old["Date"].max() if old is not None and not old.empty else None
+    first = contract_index(FIRST_CONTRACT) if last is None else _month_index(last) + 1
+    end = _month_index(today if today is not None else pd.Timestamp.today()) + 1
+
+    new = [prompt_rows(symbol, contract_code(i), after=last) for i in range(first, end + 1)]
+    new = [df for df in new if df is not None and not df.empty]
+    if not new:
+        return old if old is not None else with_averages(pd.DataFrame(columns=BASE_COLS))
+    parts = ([old[BASE_COLS]] if old is not None and not old.empty else []) + new
+    series = with_averages(pd.concat(parts, ignore_index=True))
+
+    with atomic_path(Path(store_dir) / f"{symbol}.parquet") as tmp:
+        series.to_parquet(tmp, index=False)
+    return series
+
+
+def live_symbols() -> list[str]:
+    """Every symbol the OI live heatmaps show."""
+    from utils.oi_constants import dct, dist_dct, name_map
+
+    members = [s for family in (dct, dist_dct) for group in family.values() for s in group]
+    return list(dict.fromkeys(members + list(name_map)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Append new dates to the prompt-month OI series")
+    parser.add_argument("--symbols", nargs="+", help="default: every symbol of the OI live tab")
+    parser.add_argument("--rebuild", action="store_true", help="drop the stored series first")
+    parser.add_argument("--store-dir", default=str(PROMPT_DIR))
+    args = parser.parse_args(argv)
+
+    store_dir = Path(args.store_dir)
+    for symbol in args.symbols or live_symbols():
+        t0 = time.perf_counter()
+        if args.rebuild:
+            (store_dir / f"{symbol}.parquet").unlink(missing_ok=True)
+        before = load_series(symbol, store_dir)
+        try:
+            series = update_series(symbol, store_dir=store_dir)
+        except Exception as e:
+            print(f"{symbol}: skipped ({e})")
+            continue
+        added = len(series) - (0 if before is None else len(before))
+        print(f"{symbol}: +{added} rows ({len(series)}) in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
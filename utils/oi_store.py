@@ -0,0 +1,251 @@
+"""Local columnar store for the 24-month OI and price workbooks.
+
+`read_dfs` parses a whole `OI/<SYMBOL>_24m_<suffix>.xlsx` workbook (every
+`<SYMBOL>_<Mon>` sheet) to use a few rows of one contract, and the OI page
+does that per selected symbol and per suffix. The workbooks are converted
+once into parquet, partitioned by symbol and contract month:
+
+    data/oi_store/<suffix>/<SYMBOL>/<Mon>.parquet     suffix: OI or price
+
+with typed columns: `Date` datetime64, `contract` dictionary-encoded (read
+back as a pandas category), integral value columns such as `OI` as int64,
+and other numeric columns as float64. Rows are sorted by (contract, Date)
+and every contract is its own row group, as in `utils.price_store`.
+`load_contract` locates a contract's row groups from the footer statistics
+and decodes only those groups and the requested columns.
+
+The converter records the source workbook's Firebase generation next to
+each symbol. `is_fresh` compares it with the current blob (metadata
+re-checked at most every `METADATA_TTL`), and readers fall back to the
+workbook when it changed, so a missed conversion never freezes the pages.
+A symbol converted from a local file has no generation and is only served
+while Firebase is unreachable. `is_stale` lets a refresh job re-convert
+only what changed:
+
+    python -m utils.oi_store --symbols BRT DUB
+    python -m utils.oi_store --symbols BRT --suffixes OI --source-dir ~/Downloads/OI
+    python -m utils.oi_store --symbols BRT DUB --only-stale
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.atomic_file import atomic_path
+from utils.firebase_client import get_client
+from utils.oi_constants import OI_V2_SPREAD_SYMBOLS
+
+STORE_DIR = Path(__file__).resolve().parents[1] / "data" / "oi_store"
+# Workbook metadata is re-checked at most this often per workbook (seconds).
+METADATA_TTL = 300
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+SUFFIXES = ("OI", "price")
+
+
+def workbook_path(symbol: str, suffix: str = "OI") -> str:
+    """Firebase path of the source workbook, as `read_dfs` resolves it."""
+    if suffix == "price" and symbol in OI_V2_SPREAD_SYMBOLS:
+        return f"OI/{symbol}_24m_{suffix}_spr.xlsx"
+    return f"OI/{symbol}_24m_{suffix}.xlsx"
+
+
+def sheet_path(symbol: str, month: str, suffix: str = "OI", store_dir: Path = STORE_DIR) -> Path:
+    return Path(store_dir) / suffix / symbol / f"{month}.parquet"
+
+
+def has_symbol(symbol: str, suffix: str = "OI", store_dir: Path = STORE_DIR) -> bool:
+    return (Path(store_dir) / suffix / symbol / "source.json").exists()
+
+
+# ── Reads ─────────────────────────────────────────────────────────────
+
+@lru_cache(maxsize=512)
+def _sheet_index(fp: Path, mtime_ns: int) -> tuple[pq.ParquetFile, dict[str, list[int]]]:
+    """Open file and contract -> row groups, from the footer statistics only.
+
+    Keyed on mtime so a re-converted sheet is picked up."""
+    pf = pq.ParquetFile(fp)
+    col = pf.schema_arrow.get_field_index("contract")
+    groups: dict[str, list[int]] = {}
+    for i in range(pf.metadata.num_row_groups):
+        stats = pf.metadata.row_group(i).column(col).statistics
+        if stats is not None and stats.has_min_max:
+            for contract in {stats.min, stats.max}:
+                groups.setdefault(contract, []).append(i)
+    return pf, groups
+
+
+def load_contract(symbol: str, contract: str, suffix: str = "OI", columns=None,
+                  store_dir: Path = STORE_DIR) -> pd.DataFrame | None:
+    """Rows of one contract (all columns, or `columns`), sorted by Date.
+
+    None if the symbol is not in the store or has no `<Mon>` sheet."""
+    if not has_symbol(symbol, suffix, store_dir):
+        return None
+    fp = sheet_path(symbol, contract[:3], suffix, store_dir)
+    if not fp.exists():
+        return None
+    pf, groups = _sheet_index(fp, fp.stat().st_mtime_ns)
+    table = pf.read_row_groups(groups.get(contract, []), columns=list(columns) if columns else None)
+    return table.to_pandas()
+
+
+def load_sheets(symbol: str, suffix: str = "OI", store_dir: Path = STORE_DIR) -> dict[str, pd.DataFrame] | None:
+    """`{"<SYMBOL>_<Mon>": frame}` for every stored month, as `read_dfs` returns."""
+    if not has_symbol(symbol, suffix, store_dir):
+        return None
+    out = {}
+    for month in MONTHS:
+        fp = sheet_path(symbol, month, suffix, store_dir)
+        if fp.exists():
+            out[f"{symbol}_{month}"] = pq.read_table(fp).to_pandas()
+    return out
+
+
+# ── Conversion ────────────────────────────────────────────────────────
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    """Date as datetime64, contract as string, integral columns as int64."""
+    df = df.dropna(subset=["Date", "contract"]).assign(
+        Date=lambda d: pd.to_datetime(d["Date"]).astype("datetime64[ns]"),
+        contract=lambda d: d["contract"].astype(str),
+    )
+    for col in df.columns.difference(["Date", "contract"]):
+        values = pd.to_numeric(df[col], errors="coerce")
+        if values.isna().all() and df[col].notna().any():
+            continue  # a text column; kept as is
+        if values.notna().all() and np.array_equal(values, np.round(values)):
+            df[col] = values.astype("int64")
+        else:
+            df[col] = values.astype("float64")
+    return df.sort_values(["contract", "Date"], ignore_index=True)
+
+
+def write_sheet(df: pd.DataFrame, symbol: str, month: str, suffix: str = "OI",
+                store_dir: Path = STORE_DIR) -> Path:
+    """Write one sheet, one row group per contract, replacing any old file."""
+    df = _typed(df)
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    schema = schema.set(schema.get_field_index("contract"),
+                        pa.field("contract", pa.dictionary(pa.int32(), pa.string())))
+    fp = sheet_path(symbol, month, suffix, store_dir)
+    with atomic_path(fp) as tmp, pq.ParquetWriter(tmp, schema) as writer:
+        for _, grp in df.groupby("contract", sort=True):
+            writer.write_table(pa.Table.from_pandas(grp, schema=schema, preserve_index=False))
+    return fp
+
+
+def source_generation(symbol: str, suffix: str = "OI") -> str | None:
+    meta = get_client().metadata(workbook_path(symbol, suffix)) or {}
+    version = meta.get("generation") or meta.get("md5Hash") or meta.get("updated")
+    return None if version is None else str(version)
+
+
+@lru_cache(maxsize=1024)
+def _generation_at(symbol: str, suffix: str, ttl_bucket: int) -> str | None:
+    try:
+        return source_generation(symbol, suffix)
+    except Exception:
+        return None
+
+
+def current_generation(symbol: str, suffix: str = "OI") -> str | None:
+    """`source_generation`, fetched at most once per `METADATA_TTL`; None if
+    the workbook's metadata cannot be read."""
+    return _generation_at(symbol, suffix, int(time.time() // METADATA_TTL))
+
+
+@lru_cache(maxsize=1024)
+def _read_source_info(fp: Path, mtime_ns: int) -> dict:
+    return json.loads(fp.read_text())
+
+
+def stored_generation(symbol: str, suffix: str = "OI", store_dir: Path = STORE_DIR) -> str | None:
+    """Generation of the workbook the symbol was converted from (None if
+    unknown or not converted)."""
+    fp = Path(store_dir) / suffix / symbol / "source.json"
+    try:
+        return _read_source_info(fp, fp.stat().st_mtime_ns).get("generation")
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(symbol: str, suffix: str = "OI", store_dir: Path = STORE_DIR) -> bool:
+    """True if the symbol is converted and its workbook has not changed since,
+    as far as `current_generation` can tell (unreachable counts as unchanged)."""
+    if not has_symbol(symbol, suffix, store_dir):
+        return False
+    now = current_generation(symbol, suffix)
+    return now is None or now == stored_generation(symbol, suffix, store_dir)
+
+
+def is_stale(symbol: str, suffix: str = "OI", store_dir: Path = STORE_DIR) -> bool:
+    """True if the symbol is missing from the store or its workbook changed since."""
+    stored = stored_generation(symbol, suffix, store_dir)
+    return stored is None or stored != source_generation(symbol, suffix)
+
+
+def convert_workbook(symbol: str, suffix: str = "OI", source=None,
+                     store_dir: Path = STORE_DIR) -> list[Path]:
+    """Convert every `<SYMBOL>_<Mon>` sheet of one workbook, removing stored
+    months whose sheet is no longer in it.
+
+    `source` is a path; defaults to the Firebase workbook, whose generation
+    is recorded for `is_stale`."""
+    generation = None
+    if source is None:
+        path = workbook_path(symbol, suffix)
+        generation = source_generation(symbol, suffix)
+        raw = get_client().get(path)
+        if raw is None:
+            raise FileNotFoundError(path)
+        source = BytesIO(raw)
+    sheets = pd.read_excel(source, sheet_name=None)
+    written = []
+    for month in MONTHS:
+        df = sheets.get(f"{symbol}_{month}")
+        if df is not None and not df.empty:
+            written.append(write_sheet(df, symbol, month, suffix, store_dir))
+        else:
+            sheet_path(symbol, month, suffix, store_dir).unlink(missing_ok=True)
+    with atomic_path(Path(store_dir) / suffix / symbol / "source.json") as tmp:
+        tmp.write_text(json.dumps({"generation": generation, "converted": time.time()}))
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert OI/<SYMBOL>_24m_<suffix>.xlsx workbooks to parquet")
+    parser.add_argument("--symbols", nargs="+", required=True)
+    parser.add_argument("--suffixes", nargs="+", default=list(SUFFIXES), choices=SUFFIXES)
+    parser.add_argument("--source-dir", help="local folder holding the workbooks (default: Firebase)")
+    parser.add_argument("--only-stale", action="store_true", help="skip symbols whose workbook is unchanged")
+    parser.add_argument("--store-dir", default=str(STORE_DIR))
+    args = parser.parse_args(argv)
+
+    store_dir = Path(args.store_dir)
+    for symbol in args.symbols:
+        for suffix in args.suffixes:
+            t0 = time.perf_counter()
+            source = Path(args.source_dir) / Path(workbook_path(symbol, suffix)).name if args.source_dir else None
+            try:
+                if args.only_stale and source is None and not is_stale(symbol, suffix, store_dir):
+                    print(f"{symbol} {suffix}: unchanged")
+                    continue
+                written = convert_workbook(symbol, suffix, source, store_dir)
+            except Exception as e:
+                print(f"{symbol} {suffix}: skipped ({e})")
+                continue
+            print(f"{symbol} {suffix}: {len(written)} sheets in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
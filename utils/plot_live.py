@@ -2,52 +2,42 @@ import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import plotly.graph_objects as go
+from utils.constants import TRADING_DAYS_MAP
 
 
-@st.cache_data
 def add_rolling_cols(df, selected_rolling_window, selected_sd):
-    # Mapping of months to approximate trading days
-    trading_days_map = {
-        1: 22, 2: 44, 3: 65, 4: 87, 5: 108,
-        6: 130, 9: 195, 12: 260,
-        15: 325, 18: 390, 21: 455, 24: 520,
-        27: 585, 30: 650, 33: 715, 36: 780
-    }
+    """Copy of `df` with rolling median/std and ±SD bands; `df` is left untouched.
 
+    The MR tab gets the same frame from `utils.compute.rolling_frame`, cached by id."""
     price_col = 'exit_norm_price'
 
     rolling_window_months = int(selected_rolling_window[:-1])
-    window = trading_days_map.get(rolling_window_months)
+    window = TRADING_DAYS_MAP.get(rolling_window_months)
 
     if df.empty:
         st.warning(f"No data found")
         return
 
-    df['rolling_median'] = df[price_col].rolling(window=window, min_periods=window).median()
-    df['rolling_std'] = df[price_col].rolling(window=window, min_periods=window).std()
-    df['upper_bound'] = df['rolling_median'] + selected_sd * df['rolling_std']
-    df['lower_bound'] = df['rolling_median'] - selected_sd * df['rolling_std']
-    return df
+    rolling = df[price_col].rolling(window=window, min_periods=window)
+    median, std = rolling.median(), rolling.std()
+    return df.assign(
+        rolling_median=median,
+        rolling_std=std,
+        upper_bound=median + selected_sd * std,
+        lower_bound=median - selected_sd * std,
+    )
 
 def plot_live_contract_roll_plotly(df, selected_diff, selected_contract, selected_rolling_window, selected_sd):
-    # Mapping of months to approximate trading days
-    trading_days_map = {
-        1: 22, 2: 44, 3: 65, 4: 87, 5: 108,
-        6: 130, 9: 195, 12: 260,
-        15: 325, 18: 390, 21: 455, 24: 520,
-        27: 585, 30: 650, 33: 715, 36: 780
-    }
-
     price_col = 'exit_norm_price'
 
     rolling_window_months = int(selected_rolling_window[:-1])
-    window = trading_days_map.get(rolling_window_months)
+    window = TRADING_DAYS_MAP.get(rolling_window_months)
 
     if window is None:
         st.error(f"Invalid rolling window: {selected_rolling_window}")
         return
 
-    df['Date'] = pd.to_datetime(df['Date'])
+    df = df.assign(Date=pd.to_datetime(df['Date']))
     latest_date = df['Date'].max()
     cutoff_date = latest_date - pd.DateOffset(months=12)
 
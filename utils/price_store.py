@@ -0,0 +1,210 @@
+"""Local columnar store for the per-contract price sheets.
+
+`calculate_outright` needs one contract of one `<product>_<Mon>` sheet of the
+Firebase workbook `Symbols/<product>_18m.xlsx`. Parsing the whole Excel sheet
+to keep a few dozen rows dominates a cold start, so the sheets are converted
+once into parquet, one file per (product, delivery month):
+
+    data/price_store/<PRODUCT>/<Mon>.parquet     columns: Date, contract, price
+    data/price_store/<PRODUCT>/source.json       workbook generation converted
+
+Rows are sorted by (contract, Date) and each contract is written as its own
+row group. A contract read is pushed down to the footer: the row groups whose
+`contract` min/max statistics match are located once per file (cached), and
+only those are decoded, then cut to the requested date range.
+
+Readers use a sheet only while `serves_sheet` holds: the workbook's current
+Firebase generation (re-checked at most every `METADATA_TTL`) must equal
+the one recorded at conversion, so a missed conversion falls back to the
+workbook instead of freezing prices. An unreachable Firebase counts as
+unchanged; sheets converted from a local file (or before generations were
+recorded) have none and are only served while Firebase is unreachable.
+
+Usage:
+    python -m utils.price_store --products BRT DUB
+    python -m utils.price_store --products BRT --source-dir ~/Downloads/Symbols
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.atomic_file import atomic_path
+from utils.firebase_client import get_client
+
+STORE_DIR = Path(__file__).resolve().parents[1] / "data" / "price_store"
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+SCHEMA = pa.schema([("Date", pa.timestamp("ns")), ("contract", pa.string()), ("price", pa.float64())])
+# Workbook metadata is re-checked at most this often per product (seconds).
+METADATA_TTL = 300
+
+
+def workbook_path(product: str) -> str:
+    return f"Symbols/{product}_18m.xlsx"
+
+
+def sheet_path(product: str, month: str, store_dir: Path = STORE_DIR) -> Path:
+    return Path(store_dir) / product / f"{month}.parquet"
+
+
+def has_sheet(product: str, month: str, store_dir: Path = STORE_DIR) -> bool:
+    return sheet_path(product, month, store_dir).exists()
+
+
+# ── Source versions ───────────────────────────────────────────────────
+
+def source_generation(product: str) -> str | None:
+    meta = get_client().metadata(workbook_path(product)) or {}
+    version = meta.get("generation") or meta.get("md5Hash") or meta.get("updated")
+    return None if version is None else str(version)
+
+
+@lru_cache(maxsize=1024)
+def _generation_at(product: str, ttl_bucket: int) -> str | None:
+    try:
+        return source_generation(product)
+    except Exception:
+        return None
+
+
+def current_generation(product: str) -> str | None:
+    """`source_generation`, fetched at most once per `METADATA_TTL`; None if
+    the workbook's metadata cannot be read."""
+    return _generation_at(product, int(time.time() // METADATA_TTL))
+
+
+@lru_cache(maxsize=1024)
+def _read_source_info(fp: Path, mtime_ns: int) -> dict:
+    return json.loads(fp.read_text())
+
+
+def stored_generation(product: str, store_dir: Path = STORE_DIR) -> str | None:
+    fp = Path(store_dir) / product / "source.json"
+    try:
+        return _read_source_info(fp, fp.stat().st_mtime_ns).get("generation")
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(product: str, store_dir: Path = STORE_DIR) -> bool:
+    """True unless the workbook changed since the product was converted."""
+    now = current_generation(product)
+    return now is None or now == stored_generation(product, store_dir)
+
+
+def serves_sheet(product: str, month: str, store_dir: Path = STORE_DIR) -> bool:
+    """True if readers should take the (product, month) sheet from the store."""
+    return has_sheet(product, month, store_dir) and is_fresh(product, store_dir)
+
+
+# ── Reads ─────────────────────────────────────────────────────────────
+
+@lru_cache(maxsize=256)
+def _sheet_index(fp: Path, mtime_ns: int) -> tuple[pq.ParquetFile, dict[str, list[int]]]:
+    """Open file and contract -> row groups, from the footer statistics only.
+
+    Keyed on mtime so a re-converted sheet is picked up."""
+    pf = pq.ParquetFile(fp)
+    col = pf.schema_arrow.get_field_index("contract")
+    groups: dict[str, list[int]] = {}
+    for i in range(pf.metadata.num_row_groups):
+        stats = pf.metadata.row_group(i).column(col).statistics
+        if stats is not None and stats.has_min_max:
+            for contract in {stats.min, stats.max}:
+                groups.setdefault(contract, []).append(i)
+    return pf, groups
+
+
+def load_contract(product: str, contract: str, start=None, end=None,
+                  store_dir: Path = STORE_DIR) -> pd.DataFrame | None:
+    """`Date`, `contract`, `price` rows of one contract, optionally within
+    [start, end]. None if the (product, month) sheet is not in the store."""
+    fp = sheet_path(product, contract[:3], store_dir)
+    if not fp.exists():
+        return None
+    pf, groups = _sheet_index(fp, fp.stat().st_mtime_ns)
+    df = pf.read_row_groups(groups.get(contract, [])).to_pandas()
+    if start is not None:
+        df = df[df["Date"] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df["Date"] <= pd.Timestamp(end)]
+    return df.reset_index(drop=True)
+
+
+def load_sheet(product: str, month: str, store_dir: Path = STORE_DIR) -> pd.DataFrame | None:
+    """The whole (product, month) sheet, as `read_excel` would return it."""
+    fp = sheet_path(product, month, store_dir)
+    if not fp.exists():
+        return None
+    return pq.read_table(fp).to_pandas()
+
+
+# ── Conversion ────────────────────────────────────────────────────────
+
+def write_sheet(df: pd.DataFrame, product: str, month: str, store_dir: Path = STORE_DIR) -> Path:
+    """Write one sheet, one row group per contract, replacing any old file."""
+    df = df[["Date", "contract", "price"]].assign(
+        Date=pd.to_datetime(df["Date"]).astype("datetime64[ns]"),
+        contract=df["contract"].astype(str),
+        price=pd.to_numeric(df["price"], errors="coerce"),
+    ).dropna(subset=["Date"]).sort_values(["contract", "Date"], ignore_index=True)
+
+    fp = sheet_path(product, month, store_dir)
+    with atomic_path(fp) as tmp, pq.ParquetWriter(tmp, SCHEMA) as writer:
+        for _, grp in df.groupby("contract", sort=True):
+            writer.write_table(pa.Table.from_pandas(grp, schema=SCHEMA, preserve_index=False))
+    return fp
+
+
+def convert_workbook(product: str, source=None, store_dir: Path = STORE_DIR) -> list[Path]:
+    """Convert every `<product>_<Mon>` sheet of one 18m workbook.
+
+    `source` is a path or URL; defaults to the Firebase workbook, whose
+    generation is recorded for `is_fresh`. The workbook is parsed once for
+    all of its sheets."""
+    generation = None
+    if source is None:
+        generation = source_generation(product)
+        raw = get_client().get(workbook_path(product))
+        if raw is None:
+            raise FileNotFoundError(workbook_path(product))
+        source = BytesIO(raw)
+    sheets = pd.read_excel(source, sheet_name=None)
+    written = []
+    for month in MONTHS:
+        df = sheets.get(f"{product}_{month}")
+        if df is not None and not df.empty:
+            written.append(write_sheet(df, product, month, store_dir))
+    with atomic_path(Path(store_dir) / product / "source.json") as tmp:
+        tmp.write_text(json.dumps({"generation": generation, "converted": time.time()}))
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert Symbols/<product>_18m.xlsx workbooks to parquet")
+    parser.add_argument("--products", nargs="+", required=True)
+    parser.add_argument("--source-dir", help="local folder holding <product>_18m.xlsx (default: Firebase)")
+    parser.add_argument("--store-dir", default=str(STORE_DIR))
+    args = parser.parse_args(argv)
+
+    for product in args.products:
+        t0 = time.perf_counter()
+        source = Path(args.source_dir) / f"{product}_18m.xlsx" if args.source_dir else None
+        try:
+            written = convert_workbook(product, source, Path(args.store_dir))
+        except Exception as e:
+            print(f"{product}: skipped ({e})")
+            continue
+        print(f"{product}: {len(written)} sheets in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""All-diffs backtest scoreboard, run across a process pool.
+
+Builds the price series for every entry of `DIFF_NAMES` (per contract type),
+packs them onto one shared date axis and publishes the aligned arrays once
+through `multiprocessing.shared_memory`. Worker processes attach to those
+blocks by name in their initializer, so a task is just
+`(series_row, window)` — no DataFrame is pickled per task. Each task runs
+every entry SD for its window through the array kernel and returns per-year
+stats.
+
+Cells are ranked by ratio, then returns, among those with at least
+`MIN_TRADES` trades; thinner cells are listed after them without a rank.
+`avg_yearly_returns` is per live year (bands defined), counting years
+without trades as zero, as in `utils.sweep`.
+
+Usage:
+    python -m utils.scoreboard --workers 8 --out data/scoreboard.xlsx
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from utils.backtest_kernel import contract_end_mask, run_sd_backtest
+from utils.constants import CONTRACT_TYPES, DIFF_NAMES, MONTHS_SCENARIO_MAP, TRADING_DAYS_MAP
+from utils.month_offsets import get_price_series
+from utils.sweep import (ENTRY_SDS, MONTHS_M1_LST, ROLLING_WINDOWS, default_years,
+                         resolve_diff_scenario, split_diff_name)
+
+# Cells with fewer trades than this are not ranked.
+MIN_TRADES = 10
+
+# Per-process views onto the published arrays, filled by `_attach`.
+_SHARED: dict[str, np.ndarray] = {}
+_SHM_HANDLES: list[shared_memory.SharedMemory] = []
+
+
+# ── Shared-memory publishing ──────────────────────────────────────────
+
+def publish_arrays(arrays: dict[str, np.ndarray]) -> tuple[list, dict]:
+    """Copy each array into its own shared-memory block.
+
+    Returns (handles, spec). Keep `handles` alive in the parent and call
+    `release` when done; pass `spec` to workers."""
+    handles, spec = [], {}
+    for key, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        handles.append(shm)
+        spec[key] = (shm.name, arr.shape, arr.dtype.str)
+    return handles, spec
+
+
+def release(handles: list) -> None:
+    for shm in handles:
+        shm.close()
+        shm.unlink()
+
+
+def _attach(spec: dict) -> None:
+    """Worker initializer: map the published blocks as read-only arrays."""
+    for key, (name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=name)
+        arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        _SHM_HANDLES.append(shm)
+        _SHARED[key] = arr
+
+
+# ── Series building ───────────────────────────────────────────────────
+
+def build_universe(diff_names=DIFF_NAMES, contract_types=CONTRACT_TYPES,
+                   years=None, max_workers: int = 4) -> tuple[pd.DataFrame, dict]:
+    """Build every (diff, contract type) series and align them on one date axis.
+
+    Returns (series_meta, arrays). `arrays` holds `dates` (n_dates,) plus
+    (n_series, n_dates) matrices `present` (True where the series has a
+    bar), `entry`, `exit` (NaN where it has none) and `contract_end`; row i of each matrix is `series_meta.iloc[i]`."""
+    years = default_years() if years is None else years
+    tasks = [(d, c) for d in diff_names for c in contract_types]
+
+    def build(task):
+        diff_name, contract_type = task
+        try:
+            return get_price_series(resolve_diff_scenario(diff_name, contract_type),
+                                    MONTHS_SCENARIO_MAP[contract_type], MONTHS_M1_LST, years)
+        except Exception as e:
+            print(f"{diff_name} ({contract_type}): skipped ({e})")
+            return None
+
+    # get_price_series is I/O bound and already threads per contract.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = list(executor.map(build, tasks))
+
+    meta, built = [], []
+    for (diff_name, contract_type), df in zip(tasks, frames):
+        if df is None or df.empty:
+            continue
+        product_fam, diff = split_diff_name(diff_name)
+        meta.append({'diff': diff, 'product_fam': product_fam, 'contract_type': contract_type})
+        built.append(df)
+    return pd.DataFrame(meta), align_series(built)
+
+
+def align_series(frames: list[pd.DataFrame]) -> dict[str, np.ndarray]:
+    """Stack price series onto the union of their dates. `present` marks each
+    series' own rows, NaN prices included, apart from the padding."""
+    if not frames:
+        return {'dates': np.empty(0, dtype='datetime64[ns]')}
+    dates = np.unique(np.concatenate(
+        [pd.to_datetime(df['Date']).to_numpy(dtype='datetime64[ns]') for df in frames]))
+    shape = (len(frames), len(dates))
+    present = np.zeros(shape, dtype=bool)
+    entry = np.full(shape, np.nan)
+    exit_ = np.full(shape, np.nan)
+    contract_end = np.zeros(shape, dtype=bool)
+    for i, df in enumerate(frames):
+        pos = np.searchsorted(dates, pd.to_datetime(df['Date']).to_numpy(dtype='datetime64[ns]'))
+        present[i, pos] = True
+        entry[i, pos] = df['entry_norm_price'].to_numpy(dtype=float)
+        exit_[i, pos] = df['exit_norm_price'].to_numpy(dtype=float)
+        contract_end[i, pos] = contract_end_mask(df['exit_contract_month'].to_numpy())
+    return {'dates': dates, 'present': present, 'entry': entry, 'exit': exit_, 'contract_end': contract_end}
+
+
+# ── Worker ────────────────────────────────────────────────────────────
+
+def _run_cell(row: int, window_str: str, sds: tuple) -> list[dict]:
+    """Backtest one series × window for every SD; per-year stats rows."""
+    present = _SHARED['present'][row]
+    dates = _SHARED['dates'][present]
+    entry_px = _SHARED['entry'][row][present]
+    exit_px = _SHARED['exit'][row][present]
+    contract_end = _SHARED['contract_end'][row][present]
+
+    window = TRADING_DAYS_MAP[int(window_str[:-1])]
+    rolling = pd.Series(exit_px).rolling(window=window, min_periods=window)
+    median = rolling.median().to_numpy()
+    std = rolling.std().to_numpy()
+    day = dates.astype('datetime64[D]')
+    years = pd.DatetimeIndex(dates).year.to_numpy()
+    live_years = len(np.unique(years[~np.isnan(median)]))
+
+    out = []
+    for sd in sds:
+        res = run_sd_backtest(dates, entry_px, exit_px, median,
+                              median + sd * std, median - sd * std, contract_end)
+        trades = pd.DataFrame({
+            'year': years[res['entry_idx']],
+            'returns': res['returns'].round(2),
+            'max_loss': res['max_loss'].round(2),
+            'holding_period': np.busday_count(day[res['entry_idx']], day[res['exit_idx']]),
+        }).dropna(subset=['returns', 'max_loss'])
+        for year, grp in trades.groupby('year'):
+            out.append({
+                'row': row, 'rolling_window': int(window_str[:-1]), 'entry_sd': sd,
+                'year': int(year),
+                'returns': grp['returns'].sum(),
+                'max_loss': grp['max_loss'].sum(),
+                'num_trades': len(grp),
+                'wins': int((grp['returns'] > 0).sum()),
+                'holding_days': int(grp['holding_period'].sum()),
+                'live_years': live_years,
+            })
+    return out
+
+
+# ── Scoreboard ────────────────────────────────────────────────────────
+
+def score_universe(meta: pd.DataFrame, arrays: dict, windows=ROLLING_WINDOWS,
+                   sds=ENTRY_SDS, workers: int | None = None,
+                   min_trades: int = MIN_TRADES) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Run every cell across a process pool. Returns (ranked, yearly)."""
+    handles, spec = publish_arrays(arrays)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(spec,)) as executor:
+            futures = [executor.submit(_run_cell, row, w, tuple(sds))
+                       for row in range(len(meta)) for w in windows]
+            rows = [r for f in futures for r in f.result()]
+    finally:
+        release(handles)
+
+    cols = ['row', 'rolling_window', 'entry_sd', 'year', 'returns', 'max_loss',
+            'num_trades', 'wins', 'holding_days', 'live_years']
+    yearly = pd.DataFrame(rows, columns=cols)
+    yearly = meta.reset_index(drop=True).join(yearly.set_index('row'), how='inner')
+    return rank_cells(yearly, min_trades), finish_yearly(yearly)
+
+
+def finish_yearly(yearly: pd.DataFrame) -> pd.DataFrame:
+    yearly = yearly.copy()
+    yearly['ratio'] = (yearly['returns'] / -yearly['max_loss']).replace([np.inf, -np.inf], np.nan).round(2)
+    yearly['win_rate'] = (100 * yearly['wins'] / yearly['num_trades']).round(1)
+    yearly['avg_holding_period'] = (yearly['holding_days'] / yearly['num_trades']).round(1)
+    yearly['returns'] = yearly['returns'].round(2)
+    yearly['max_loss'] = yearly['max_loss'].round(2)
+    cols = ['diff', 'product_fam', 'contract_type', 'rolling_window', 'entry_sd', 'year',
+            'returns', 'ratio', 'max_loss', 'num_trades', 'win_rate', 'avg_holding_period']
+    return yearly[cols].sort_values(['diff', 'contract_type', 'rolling_window', 'entry_sd', 'year'],
+                                    ignore_index=True)
+
+
+def rank_cells(yearly: pd.DataFrame, min_trades: int = MIN_TRADES) -> pd.DataFrame:
+    """One row per cell, ranked by ratio then returns. Cells with fewer than
+    `min_trades` trades follow the ranked ones with no rank."""
+    keys = ['diff', 'product_fam', 'contract_type', 'rolling_window', 'entry_sd']
+    agg = yearly.groupby(keys, as_index=False).agg(
+        returns=('returns', 'sum'),
+        max_loss=('max_loss', 'sum'),
+        num_trades=('num_trades', 'sum'),
+        wins=('wins', 'sum'),
+        holding_days=('holding_days', 'sum'),
+        years_w_trades=('year', 'nunique'),
+        live_years=('live_years', 'first'),
+    )
+    agg['avg_yearly_returns'] = (agg['returns'] / agg['live_years']).round(2)
+    agg['ratio'] = (agg['returns'] / -agg['max_loss']).replace([np.inf, -np.inf], np.nan).round(2)
+    agg['win_rate'] = (100 * agg['wins'] / agg['num_trades']).round(1)
+    agg['avg_holding_period'] = (agg['holding_days'] / agg['num_trades']).round(1)
+    agg['returns'] = agg['returns'].round(2)
+    agg['max_loss'] = agg['max_loss'].round(2)
+    agg['ranked'] = agg['num_trades'] >= min_trades
+    agg = agg.sort_values(['ranked', 'ratio', 'returns'], ascending=False, ignore_index=True)
+    rank = pd.Series(np.arange(1, len(agg) + 1), dtype='Int64')
+    agg.insert(0, 'rank', rank.where(agg['ranked']))
+    return agg[['rank'] + keys + ['returns', 'avg_yearly_returns', 'ratio', 'max_loss',
+                                  'num_trades', 'win_rate', 'avg_holding_period', 'years_w_trades',
+                                  'live_years']]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest scoreboard for all diffs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--contract-types", nargs="*", default=CONTRACT_TYPES)
+    parser.add_argument("--min-trades", type=int, default=MIN_TRADES, help="fewest trades to be ranked")
+    parser.add_argument("--out", default="data/scoreboard.xlsx")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    meta, arrays = build_universe(contract_types=args.contract_types)
+    t1 = time.perf_counter()
+    ranked, yearly = score_universe(meta, arrays, workers=args.workers, min_trades=args.min_trades)
+    t2 = time.perf_counter()
+
+    with pd.ExcelWriter(args.out) as writer:
+        ranked.to_excel(writer, sheet_name="scoreboard", index=False)
+        yearly.to_excel(writer, sheet_name="by_year", index=False)
+    print(f"{len(meta)} series built in {t1 - t0:.1f}s, "
+          f"{len(ranked)} cells scored in {t2 - t1:.1f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""On-disk cache of built price series, shared across sessions and restarts.
+
+`get_price_series` outputs are written as parquet under
+`data/series_cache/`, one file per (diff_scenario, months_scenario, M1
+contract list), plus `index.json` recording, for each entry, the version of
+every source it was built from:
+
+- a product served from `utils.price_store` (converted from the current
+  workbook generation): the newest mtime of the month files the series reads;
+- otherwise the Firebase workbook `Symbols/<product>_18m.xlsx`: its
+  `generation` from the blob metadata (no download).
+
+A lookup re-reads only those versions. If they all match, the parquet is
+served as is; otherwise the series is rebuilt and the entry replaced. When a
+version cannot be fetched (offline), an existing entry is served rather than
+failing on a rebuild that would need the same network.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+
+from utils import price_store
+from utils.atomic_file import atomic_path
+from utils.expressions import compile_expression
+from utils.firebase_client import get_client
+from utils.month_offsets import get_m1_to_m4_contracts, get_price_series, m1_contract_list
+
+CACHE_DIR = Path(__file__).resolve().parents[1] / "data" / "series_cache"
+CACHE_VERSION = 1
+# Blob metadata is re-checked at most this often per product (seconds).
+METADATA_TTL = 300
+
+_INDEX_LOCK = threading.Lock()
+
+
+# ── Source versions ───────────────────────────────────────────────────
+
+@lru_cache(maxsize=512)
+def _firebase_generation(product: str, ttl_bucket: int) -> str | None:
+    """`generation` of Symbols/<product>_18m.xlsx, or None if unreachable."""
+    try:
+        meta = get_client().metadata(f"Symbols/{product}_18m.xlsx") or {}
+    except Exception:
+        return None
+    version = meta.get("generation") or meta.get("md5Hash") or meta.get("updated")
+    return None if version is None else str(version)
+
+
+def source_version(product: str, months) -> str | None:
+    months = sorted(set(months))
+    if all(price_store.serves_sheet(product, m) for m in months):
+        mtime = max(price_store.sheet_path(product, m).stat().st_mtime_ns for m in months)
+        return f"store:{mtime}"
+    generation = _firebase_generation(product, int(time.time() // METADATA_TTL))
+    return None if generation is None else f"firebase:{generation}"
+
+
+def series_sources(diff_scenario, months_scenario, m1_contracts) -> dict[str, list[str]]:
+    """Raw product -> delivery months of its sheets the series reads."""
+    sources: dict[str, set[str]] = {}
+    for diff, ms in zip(diff_scenario, months_scenario):
+        months = {get_m1_to_m4_contracts(c)[ms - 1][:3] for c in m1_contracts}
+        for product in compile_expression(diff):
+            sources.setdefault(product, set()).update(months)
+    return {p: sorted(m) for p, m in sources.items()}
+
+
+def source_versions(sources: dict[str, list[str]]) -> dict[str, str | None]:
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        versions = executor.map(lambda item: source_version(*item), sources.items())
+        return dict(zip(sources, versions))
+
+
+# ── Index and files ───────────────────────────────────────────────────
+
+def series_key(diff_scenario, months_scenario, m1_contracts) -> str:
+    return (f"{'|'.join(diff_scenario)}__{months_scenario[0]}-{months_scenario[1]}"
+            f"__{','.join(m1_contracts)}")
+
+
+def _entry_id(key: str) -> str:
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def load_index(cache_dir: Path = CACHE_DIR) -> dict:
+    fp = Path(cache_dir) / "index.json"
+    try:
+        index = json.loads(fp.read_text())
+    except (OSError, ValueError):
+        return {}
+    return index.get("entries", {}) if index.get("version") == CACHE_VERSION else {}
+
+
+def _update_index(entry_id: str, entry: dict, cache_dir: Path) -> None:
+    fp = Path(cache_dir) / "index.json"
+    with _INDEX_LOCK:
+        entries = load_index(cache_dir)
+        entries[entry_id] = entry
+        with atomic_path(fp) as tmp:
+            tmp.write_text(json.dumps({"version": CACHE_VERSION, "entries": entries}, indent=1))
+
+
+def _read_series(fp: Path, months_scenario) -> pd.DataFrame:
+    df = pd.read_parquet(fp)
+    # Tuples do not survive parquet; the column is one constant anyway.
+    df.insert(3, "mths_scenario", [months_scenario] * len(df))
+    return df
+
+
+def _write_series(df: pd.DataFrame, fp: Path) -> None:
+    with atomic_path(fp) as tmp:
+        df.drop(columns="mths_scenario").to_parquet(tmp, index=False)
+
+
+# ── Lookup ────────────────────────────────────────────────────────────
+
+def cached_price_series(diff_scenario, months_scenario, months_m1_lst, years,
+                        df_cache=None, cache_dir: Path = CACHE_DIR) -> pd.DataFrame:
+    """`get_price_series`, served from disk while its sources are unchanged."""
+    cache_dir = Path(cache_dir)
+    m1_contracts = m1_contract_list(list(months_m1_lst), list(years))
+    key = series_key(diff_scenario, months_scenario, m1_contracts)
+    entry_id = _entry_id(key)
+    fp = cache_dir / f"{entry_id}.parquet"
+
+    versions = source_versions(series_sources(diff_scenario, months_scenario, m1_contracts))
+    entry = load_index(cache_dir).get(entry_id)
+    if entry is not None and entry.get("key") == key and fp.exists():
+        stored = entry.get("sources", {})
+        unknown = any(v is None for v in versions.values())
+        if unknown or stored == versions:
+            try:
+                return _read_series(fp, months_scenario)
+            except (OSError, ValueError):
+                pass
+
+    df = get_price_series(diff_scenario, months_scenario, list(months_m1_lst), list(years), df_cache=df_cache)
+    if df is not None and not df.empty and not any(v is None for v in versions.values()):
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        _write_series(df, fp)
+        _update_index(entry_id, {
+            "key": key,
+            "sources": versions,
+            "rows": len(df),
+            "created": datetime.now().isoformat(timespec="seconds"),
+        }, cache_dir)
+    return df
@@ -0,0 +1,208 @@
+"""Parameter sweep over rolling window × entry SD × contract type.
+
+Regenerates the `scenarios_*` rows of `data/ContractRolls_1-4sd_V3.xlsx`
+locally. For each diff the price series is built once per contract type, the
+rolling median/std once per window, and every SD multiple reuses them: only
+the bands change, so each extra SD costs one run of the array kernel in
+`utils/backtest_kernel.py`.
+
+Usage:
+    python -m utils.sweep --out data/ContractRolls_local.xlsx
+    python -m utils.sweep --diffs "[Dist] HOGO" "[IP] RB-HO" --out hogo.xlsx
+"""
+from __future__ import annotations
+
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.backtest_kernel import contract_end_mask, run_sd_backtest
+from utils.constants import (CONTRACT_TYPES, DIFF_NAMES, DIFFS_MAP,
+                             MONTHS_SCENARIO_MAP, TRADING_DAYS_MAP)
+from utils.month_offsets import get_price_series
+
+ROLLING_WINDOWS = ['1m', '3m', '6m', '12m']
+ENTRY_SDS = [1, 2, 3, 4]
+MONTHS_M1_LST = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+PRICE_COL = 'exit_norm_price'
+
+SCENARIO_COLUMNS = [
+    'diff', 'product_fam', 'scenario', 'rolling_window', 'entry_sd',
+    'num_trades', 'avg_holding_period', 'avg_yearly_max_loss',
+    'std_yearly_returns', 'avg_yearly_returns', 'num_years_w_trades',
+    'ratio', 'cv', 'inv_cv', 'last_median', 'last_std', 'std_band',
+    'returns_z', 'ratio_z_filtered', 'cv_z_filtered', 'score', 'label',
+]
+
+# Cross-sectional z-scores of ratio / inverse cv are clipped to this range.
+Z_CLIP = 3.0
+
+
+def split_diff_name(diff_name: str) -> tuple[str, str]:
+    """'[IP] RB-HO' -> ('IP', 'RB-HO')."""
+    product_fam, _, diff = diff_name.partition("]")
+    return product_fam.lstrip("["), diff.lstrip()
+
+
+def resolve_diff_scenario(diff_name: str, contract_type: str) -> tuple:
+    """The `diff_scenario` tuple `get_price_series` expects for a contract type."""
+    if contract_type == "Box":
+        return DIFFS_MAP[diff_name][1]
+    if contract_type == "Outright":
+        diff_scenario_og = DIFFS_MAP[diff_name][1]
+        return (f"{diff_scenario_og[0]}+{diff_scenario_og[0]}", diff_scenario_og[1])
+    return DIFFS_MAP[diff_name][0]
+
+
+def default_years() -> list[int]:
+    return list(range(16, datetime.now().year % 100 + 1))
+
+
+def summarise_cell(res: dict, years: np.ndarray, year_axis: np.ndarray) -> dict:
+    """Scenario-sheet metrics for one kernel result.
+
+    `years` is the entry year of every bar, `year_axis` the calendar years the
+    cell was live for (bands defined). Yearly sums include zero for years
+    without trades, so the averages are per live year."""
+    entry_idx, exit_idx = res["entry_idx"], res["exit_idx"]
+    returns = res["returns"].round(2)
+    max_loss = res["max_loss"].round(2)
+    keep = ~(np.isnan(returns) | np.isnan(max_loss))
+    entry_idx, exit_idx = entry_idx[keep], exit_idx[keep]
+    returns, max_loss = returns[keep], max_loss[keep]
+
+    pos = np.searchsorted(year_axis, years[entry_idx])
+    yearly_returns = np.bincount(pos, weights=returns, minlength=len(year_axis))
+    yearly_max_loss = np.bincount(pos, weights=max_loss, minlength=len(year_axis))
+    years_w_trades = np.bincount(pos, minlength=len(year_axis)) > 0
+
+    avg_returns = yearly_returns.mean() if len(year_axis) else 0.0
+    avg_max_loss = yearly_max_loss.mean() if len(year_axis) else 0.0
+    std_returns = pd.Series(yearly_returns).std() if len(year_axis) > 1 else 0.0
+    ratio = avg_returns / -avg_max_loss if avg_max_loss != 0 else np.nan
+    cv = std_returns / avg_returns if avg_returns != 0 else np.nan
+    return {
+        'num_trades': int(len(returns)),
+        'avg_holding_period': int(res["holding_period"][keep].mean()) if len(returns) else 0,
+        'avg_yearly_max_loss': round(avg_max_loss, 2),
+        'std_yearly_returns': round(std_returns, 2),
+        'avg_yearly_returns': round(avg_returns, 2),
+        'num_years_w_trades': round(years_w_trades.mean(), 2) if len(year_axis) else 0.0,
+        'ratio': round(ratio, 2),
+        'cv': round(cv, 2),
+        'inv_cv': round(1 / cv, 2) if cv else np.nan,
+    }
+
+
+def sweep_series(df: pd.DataFrame, windows=ROLLING_WINDOWS, sds=ENTRY_SDS,
+                 entry_col: str = 'entry_norm_price', exit_col: str = PRICE_COL) -> list[dict]:
+    """All (window, sd) cells for one built price series."""
+    dates = pd.to_datetime(df['Date']).to_numpy()
+    entry_px = df[entry_col].to_numpy(dtype=float)
+    exit_px = df[exit_col].to_numpy(dtype=float)
+    contract_end = contract_end_mask(df['exit_contract_month'].to_numpy())
+    years = pd.DatetimeIndex(dates).year.to_numpy()
+    day = dates.astype('datetime64[D]')
+    price = df[PRICE_COL]
+
+    rows = []
+    for window_str in windows:
+        window = TRADING_DAYS_MAP[int(window_str[:-1])]
+        rolling = price.rolling(window=window, min_periods=window)
+        median = rolling.median().to_numpy()
+        std = rolling.std().to_numpy()
+        year_axis = np.unique(years[~np.isnan(median)])
+        for sd in sds:
+            res = run_sd_backtest(dates, entry_px, exit_px, median,
+                                  median + sd * std, median - sd * std, contract_end)
+            res["holding_period"] = np.busday_count(day[res["entry_idx"]], day[res["exit_idx"]])
+            row = {
+                'scenario': f'{window_str}_{sd}sd_0sd',
+                'rolling_window': int(window_str[:-1]),
+                'entry_sd': sd,
+            }
+            row.update(summarise_cell(res, years, year_axis))
+            row['last_median'] = round(median[-1], 2)
+            row['last_std'] = round(std[-1], 2)
+            row['std_band'] = round(sd * std[-1], 2)
+            rows.append(row)
+    return rows
+
+
+def sweep_diff(diff_name: str, contract_types=CONTRACT_TYPES, windows=ROLLING_WINDOWS,
+               sds=ENTRY_SDS, years=None) -> pd.DataFrame:
+    """Every window × SD × contract type cell for one entry of `DIFF_NAMES`."""
+    years = default_years() if years is None else years
+    product_fam, diff = split_diff_name(diff_name)
+    rows = []
+    for contract_type in contract_types:
+        df = get_price_series(resolve_diff_scenario(diff_name, contract_type),
+                              MONTHS_SCENARIO_MAP[contract_type], MONTHS_M1_LST, years)
+        for row in sweep_series(df, windows, sds):
+            row.update({'diff': diff, 'product_fam': product_fam, 'contract_type': contract_type})
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def _zscore(s: pd.Series) -> pd.Series:
+    std = s.std()
+    return (s - s.mean()) / std if std else s * 0.0
+
+
+def score_scenarios(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the cross-sectional z-scores, score and label columns.
+
+    z-scores are taken within each contract type across every cell passed in,
+    so score the full universe before shortlisting."""
+    out = []
+    for contract_type, grp in df.groupby('contract_type', sort=False):
+        grp = grp.copy()
+        grp['returns_z'] = _zscore(grp['avg_yearly_returns']).round(2)
+        grp['ratio_z_filtered'] = _zscore(grp['ratio']).clip(-Z_CLIP, Z_CLIP).round(2)
+        grp['cv_z_filtered'] = _zscore(grp['inv_cv']).clip(-Z_CLIP, Z_CLIP).round(2)
+        grp['score'] = grp[['returns_z', 'ratio_z_filtered', 'cv_z_filtered']].mean(axis=1).round(2)
+        grp['label'] = [f"'{d}': ['{pf}', {w}, '{contract_type}'],"
+                        for d, pf, w in zip(grp['diff'], grp['product_fam'], grp['rolling_window'])]
+        out.append(grp)
+    scored = pd.concat(out, ignore_index=True)
+    return scored.sort_values('score', ascending=False).reset_index(drop=True)
+
+
+def run_sweep(diff_names=DIFF_NAMES, contract_types=CONTRACT_TYPES, years=None) -> pd.DataFrame:
+    frames = []
+    for diff_name in diff_names:
+        try:
+            frames.append(sweep_diff(diff_name, contract_types, years=years))
+        except Exception as e:
+            print(f"{diff_name}: skipped ({e})")
+    if not frames:
+        return pd.DataFrame(columns=SCENARIO_COLUMNS + ['contract_type'])
+    return score_scenarios(pd.concat(frames, ignore_index=True))
+
+
+def write_scenario_sheets(scenarios: pd.DataFrame, path: str) -> None:
+    """One sheet per contract type, columns as in `scenarios_Boxes_50`."""
+    sheet_names = {'Box': 'scenarios_Boxes', 'Outright': 'scenarios_Outrights'}
+    with pd.ExcelWriter(path) as writer:
+        for contract_type, grp in scenarios.groupby('contract_type', sort=False):
+            sheet = sheet_names.get(contract_type, f'scenarios_{contract_type}')[:31]
+            grp[SCENARIO_COLUMNS].to_excel(writer, sheet_name=sheet, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Window × SD × contract type sweep")
+    parser.add_argument("--diffs", nargs="*", default=DIFF_NAMES,
+                        help="entries of DIFF_NAMES, e.g. '[Dist] HOGO' (default: all)")
+    parser.add_argument("--contract-types", nargs="*", default=CONTRACT_TYPES)
+    parser.add_argument("--out", default="data/ContractRolls_local.xlsx")
+    args = parser.parse_args(argv)
+
+    scenarios = run_sweep(args.diffs, args.contract_types)
+    write_scenario_sheets(scenarios, args.out)
+    print(f"{len(scenarios)} cells written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
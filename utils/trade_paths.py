@@ -0,0 +1,123 @@
+"""Per-trade path statistics for many trades at once.
+
+Given the bar indices of each trade's entry and exit over one price array,
+every bar of every trade is laid out in a single flat array and the
+statistics come from segment reductions over it (`reduceat`, grouped
+cumulative max, `bincount`), with no per-trade Python loop:
+
+    returns         roll-adjusted P&L at the exit bar
+    mae / mfe       worst / best roll-adjusted P&L while in the trade
+                    (0 at the entry bar, so mae <= 0 <= mfe)
+    bars_to_mae     bars from entry to the first bar at the MAE
+    bars_to_mfe     bars from entry to the first bar at the MFE
+    drawdown_bars   longest run of bars below the trade's running P&L peak
+    holding_bars    exit bar - entry bar
+
+Contract rolls follow the backtest kernel: on a `contract_end` bar strictly
+inside the trade the leg is banked at `exit_px` and the trade re-anchors at
+that bar's `entry_px`. Removing that jump from the price path gives one
+continuous roll-adjusted path per trade. Note `mae` is the worst point of
+the whole path, whereas the kernel's `max_loss` sums each leg's worst point.
+"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+PATH_COLUMNS = ["returns", "mae", "mfe", "bars_to_mae", "bars_to_mfe",
+                "drawdown_bars", "holding_bars"]
+
+
+def trade_path_stats(exit_px, entry_idx, exit_idx, direction, entry_px=None,
+                     contract_end=None) -> pd.DataFrame:
+    """One row of `PATH_COLUMNS` per trade.
+
+    `exit_px` is the marked price per bar, `entry_px` the price a leg is
+    entered at (defaults to `exit_px`), `direction` +1 long / -1 short and
+    `contract_end` the roll mask from `contract_end_mask` (no rolls if None).
+    Trades must satisfy 0 <= entry_idx <= exit_idx < len(exit_px)."""
+    exit_px = np.asarray(exit_px, dtype=float)
+    entry_px = exit_px if entry_px is None else np.asarray(entry_px, dtype=float)
+    entry_idx = np.asarray(entry_idx, dtype=np.int64)
+    exit_idx = np.asarray(exit_idx, dtype=np.int64)
+    direction = np.asarray(direction, dtype=float)
+    n_trades = len(entry_idx)
+    if n_trades == 0:
+        return pd.DataFrame({c: np.empty(0, dtype=float if c in ("returns", "mae", "mfe") else np.int64)
+                             for c in PATH_COLUMNS})
+    if np.any(exit_idx < entry_idx):
+        raise ValueError("exit_idx must not precede entry_idx")
+
+    # Cumulative roll gap before each bar: C[b] = sum of (entry - exit) on roll bars < b.
+    n = len(exit_px)
+    gap = np.zeros(n)
+    if contract_end is not None:
+        rolls = np.asarray(contract_end, dtype=bool)
+        gap[rolls] = entry_px[rolls] - exit_px[rolls]
+    roll_gap = np.concatenate(([0.0], np.cumsum(gap)))
+
+    # Flat layout: trade t occupies bars entry_idx[t] .. exit_idx[t].
+    lengths = exit_idx - entry_idx + 1
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    trade = np.repeat(np.arange(n_trades), lengths)
+    offset = np.arange(lengths.sum()) - starts[trade]
+    bar = entry_idx[trade] + offset
+
+    adjusted = exit_px[bar] - (roll_gap[bar] - roll_gap[entry_idx[trade] + 1])
+    path = direction[trade] * (adjusted - entry_px[entry_idx[trade]])
+    path[offset == 0] = 0.0
+
+    mae = np.minimum.reduceat(path, starts)
+    mfe = np.maximum.reduceat(path, starts)
+    # First bar reaching the extreme: lexsort is stable, so ties keep bar order.
+    first_min = np.lexsort((path, trade))[starts]
+    first_max = np.lexsort((-path, trade))[starts]
+
+    peak = pd.Series(path).groupby(trade).cummax().to_numpy()
+    under = path < peak
+    run_id = np.cumsum(~under | (offset == 0))
+    run_len = np.bincount(run_id, weights=under)
+    drawdown = np.zeros(n_trades)
+    np.maximum.at(drawdown, trade[under], run_len[run_id[under]])
+
+    return pd.DataFrame({
+        "returns": path[starts + lengths - 1],
+        "mae": mae,
+        "mfe": mfe,
+        "bars_to_mae": offset[first_min],
+        "bars_to_mfe": offset[first_max],
+        "drawdown_bars": drawdown.astype(np.int64),
+        "holding_bars": lengths - 1,
+    })
+
+
+def _bar_index(dates: np.ndarray, when) -> np.ndarray:
+    """Position of each of `when` in `dates`, -1 where it is not a bar."""
+    when = pd.to_datetime(pd.Series(when)).to_numpy(dtype="datetime64[ns]")
+    pos = np.minimum(np.searchsorted(dates, when), max(len(dates) - 1, 0))
+    found = (pos < len(dates)) & (dates[pos] == when) if len(dates) else np.zeros(len(when), dtype=bool)
+    return np.where(found, pos, -1)
+
+
+def trade_path_stats_by_date(dates, exit_px, trades: pd.DataFrame, entry_px=None,
+                             contract_end=None, side_col: str = "side") -> pd.DataFrame:
+    """`trade_path_stats` for a trades table keyed by `entry_date` / `exit_date`.
+
+    Direction comes from `trade_direction` (+1 / -1) if present, else from
+    `side_col` ('long' / 'short'). Rows come back in the order of `trades`.
+    A trade whose entry or exit date is not one of `dates` (e.g. the trades
+    and the price frame were synced at different times) gets NaN stats
+    (<NA> in the bar-count columns)."""
+    dates = pd.to_datetime(pd.Series(dates)).to_numpy(dtype="datetime64[ns]")
+    entry = _bar_index(dates, trades["entry_date"])
+    exit_ = _bar_index(dates, trades["exit_date"])
+    if "trade_direction" in trades.columns:
+        direction = trades["trade_direction"].to_numpy(dtype=float)
+    else:
+        direction = np.where(trades[side_col].astype(str).str.lower() == "long", 1.0, -1.0)
+    ok = (entry >= 0) & (exit_ >= entry)
+    stats = trade_path_stats(exit_px, entry[ok], exit_[ok], direction[ok], entry_px, contract_end)
+    out = pd.DataFrame(np.nan, index=trades.index, columns=PATH_COLUMNS)
+    out.iloc[np.flatnonzero(ok)] = stats.to_numpy(dtype=float)
+    ints = [c for c in PATH_COLUMNS if c not in ("returns", "mae", "mfe")]
+    return out.astype({c: "Int64" for c in ints})
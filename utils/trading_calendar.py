@@ -0,0 +1,121 @@
+"""Business-day calendars and contract-month arithmetic, vectorised.
+
+Two precompiled `np.busdaycalendar`s:
+
+- `WEEKDAYS`: Monday to Friday, no holidays. This is the calendar the OI
+  pages and the contract windows have always counted in (`np.busday_*`
+  defaults).
+- `STRATEGY`: Monday to Friday without New Year's Day, Good Friday and
+  Christmas Day, for `HOLIDAY_YEARS`. The monitor uses it for the real
+  last-5-business-day roll window.
+
+Contract codes such as `"Jun25"` are interned to integer month indices
+(months since Jan 2000: `Jun25` -> 305), so date arithmetic over a column
+of contracts parses each distinct code once and runs as numpy operations.
+Every function accepts scalars, arrays, Series or Index and returns numpy
+arrays (or a scalar for scalar input).
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from dateutil.easter import easter
+
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+MONTH_NUMBER = {m: i + 1 for i, m in enumerate(MONTHS)}
+HOLIDAY_YEARS = range(2000, 2051)
+
+_EPOCH = np.datetime64("2000-01", "M")
+
+
+def strategy_holidays(years=HOLIDAY_YEARS) -> np.ndarray:
+    """New Year's Day, Good Friday and Christmas Day, unadjusted for weekends."""
+    days = []
+    for y in years:
+        days += [np.datetime64(f"{y}-01-01"), np.datetime64(easter(y)) - np.timedelta64(2, "D"),
+                 np.datetime64(f"{y}-12-25")]
+    return np.array(sorted(days), dtype="datetime64[D]")
+
+
+WEEKDAYS = np.busdaycalendar()
+STRATEGY = np.busdaycalendar(holidays=strategy_holidays())
+
+
+def _days(dates) -> np.ndarray:
+    """`datetime64[D]` array (or 0-d array) of dates given in any pandas/numpy form."""
+    if isinstance(dates, (pd.Series, pd.Index)):
+        return dates.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+    if np.ndim(dates) == 0:
+        return np.datetime64(pd.Timestamp(dates).date(), "D")
+    return pd.DatetimeIndex(dates).to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+
+
+# ── Contract codes ────────────────────────────────────────────────────
+
+@lru_cache(maxsize=4096)
+def _code_index(code: str) -> int:
+    return int(code[3:]) * 12 + MONTH_NUMBER[code[:3]] - 1
+
+
+def contract_index(contracts):
+    """Months since Jan 2000 for contract codes ("Jun25" -> 305)."""
+    if isinstance(contracts, str):
+        return _code_index(contracts)
+    codes, uniques = pd.factorize(np.asarray(contracts, dtype=object))
+    return np.array([_code_index(c) for c in uniques], dtype=np.int64)[codes]
+
+
+def contract_code(index):
+    """Inverse of `contract_index` (305 -> "Jun25")."""
+    if np.ndim(index) == 0:
+        return f"{MONTHS[int(index) % 12]}{int(index) // 12:02d}"
+    return np.array([contract_code(i) for i in np.asarray(index)], dtype=object)
+
+
+def month_start(index):
+    """First calendar day of month index `index`, as datetime64[D]."""
+    return (_EPOCH + np.asarray(index, dtype=np.int64)).astype("datetime64[D]")
+
+
+# ── Lookups ───────────────────────────────────────────────────────────
+
+def terminal_dates(contracts):
+    """Day before the 1st of each contract month ("Jun25" -> 2025-05-31)."""
+    return month_start(contract_index(contracts)) - np.timedelta64(1, "D")
+
+
+def n_trading_days(dates, terminals, calendar: np.busdaycalendar = WEEKDAYS):
+    """Business days from `terminals` to `dates` (negative before the terminal),
+    as `np.busday_count(terminal, date)` element-wise."""
+    return np.busday_count(_days(terminals), _days(dates), busdaycal=calendar)
+
+
+def business_days_left(dates, calendar: np.busdaycalendar = WEEKDAYS):
+    """Business days from each date (rolled forward to a business day) to the
+    last business day of its calendar month, both inclusive. 0 or less when
+    the date rolls past the month's last business day."""
+    days = _days(dates)
+    month_end = (days.astype("datetime64[M]") + 1).astype("datetime64[D]") - 1
+    last_bd = np.busday_offset(month_end, 0, roll="backward", busdaycal=calendar)
+    rolled = np.busday_offset(days, 0, roll="forward", busdaycal=calendar)
+    return np.busday_count(rolled, last_bd, busdaycal=calendar) + 1
+
+
+def roll_window_day(dates, n: int = 5, calendar: np.busdaycalendar = STRATEGY):
+    """For dates that are one of the last `n` business days of their month,
+    the business days left including the date (n on the first day of the
+    window, 1 on the month's last business day); 0 for every other date."""
+    days = _days(dates)
+    left = business_days_left(days, calendar)
+    inside = np.is_busday(days, busdaycal=calendar) & (left >= 1) & (left <= n)
+    return np.where(inside, left, 0)
+
+
+def last_n_business_days(year: int, month: int, n: int = 5,
+                         calendar: np.busdaycalendar = STRATEGY) -> np.ndarray:
+    """The last `n` business days of a calendar month, ascending."""
+    month_end = (np.datetime64(f"{year:04d}-{month:02d}", "M") + 1).astype("datetime64[D]") - 1
+    last_bd = np.busday_offset(month_end, 0, roll="backward", busdaycal=calendar)
+    return np.busday_offset(last_bd, np.arange(1 - n, 1), busdaycal=calendar)
@@ -0,0 +1,307 @@
+"""Walk-forward out-of-sample selection of mean-reversion cells.
+
+For every test year Y the engine scores each cell on the `lookback` years
+before Y, keeps the `top_k` best cells of each group (a family_tag such as
+`C_Brt-Dub_1mbox`, or diff × contract type for kernel output) and books
+their P&L in Y, so every number it reports is out of sample.
+
+Nothing is re-run per step. Cell P&L is reduced once to per-year sums
+(P&L, sum of squares, bar count, active bars, max loss, trades); a trailing
+window is then
+a difference of cumulative sums along the year axis, so a whole 2016–2026
+walk-forward over hundreds of cells is a few array operations. Selection rules
+are plain functions of the window sums (see `SCORERS`), cheap to iterate on.
+
+Inputs:
+  * `yearly_from_daily` — wide daily P&L per cell, e.g.
+    `data/perfamily/<F>/cells.parquet` with groups from `meta.json`;
+  * `yearly_from_scoreboard` — the per-year table of `utils.scoreboard`,
+    i.e. the array kernel run over the whole diff universe.
+
+Usage:
+    python -m utils.walk_forward --family C --lookback 3 --rule sharpe
+    python -m utils.walk_forward --family D --rule total --top-k 2 --out wf_D.xlsx
+"""
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+PERFAMILY_DIR = DATA_DIR / "perfamily"
+TRADING_DAYS_PER_YEAR = 252
+
+# Per-year sums every scorer can draw on; missing ones are NaN.
+YEARLY_FIELDS = ["pnl", "pnl_sq", "n_bars", "active_bars", "max_loss", "num_trades"]
+
+
+# ── Per-year cell P&L ─────────────────────────────────────────────────
+
+def load_family_cells(family: str) -> tuple[pd.DataFrame, dict]:
+    """Wide daily P&L (`Date` + one column per cell) and meta for a family."""
+    fp = PERFAMILY_DIR / family / "cells.parquet"
+    meta_fp = PERFAMILY_DIR / family / "meta.json"
+    df = pd.read_parquet(fp)
+    df["Date"] = pd.to_datetime(df["Date"])
+    return df.sort_values("Date").reset_index(drop=True), json.loads(meta_fp.read_text())
+
+
+def yearly_from_daily(cells: pd.DataFrame, groups: dict[str, str] | None = None) -> pd.DataFrame:
+    """Long per-(cell, year) table from a wide daily P&L frame.
+
+    `groups` maps cell -> group (default: every cell its own group)."""
+    years = cells["Date"].dt.year.to_numpy()
+    values = cells.drop(columns="Date")
+    pnl = values.to_numpy(dtype=float)
+    year_axis, pos = np.unique(years, return_inverse=True)
+
+    def per_year(x):
+        out = np.zeros((len(year_axis), x.shape[1]))
+        np.add.at(out, pos, np.nan_to_num(x))
+        return out
+
+    n_bars = per_year(~np.isnan(pnl) * 1.0)
+    # Flat bars carry 0 P&L, so bars with non-zero P&L are the bars in a trade.
+    active_bars = per_year((np.nan_to_num(pnl) != 0) * 1.0)
+    # Max loss: worst drawdown of the cumulative P&L inside each year.
+    max_loss = np.zeros((len(year_axis), pnl.shape[1]))
+    for i in range(len(year_axis)):
+        block = np.nan_to_num(pnl[pos == i]).cumsum(axis=0)
+        peak = np.maximum.accumulate(np.vstack([np.zeros((1, block.shape[1])), block]), axis=0)[1:]
+        max_loss[i] = (block - peak).min(axis=0) if len(block) else 0.0
+
+    cell_ids = values.columns.to_list()
+    out = pd.DataFrame({
+        "cell": np.tile(cell_ids, len(year_axis)),
+        "year": np.repeat(year_axis, len(cell_ids)),
+        "pnl": per_year(pnl).ravel(),
+        "pnl_sq": per_year(pnl ** 2).ravel(),
+        "n_bars": n_bars.ravel(),
+        "active_bars": active_bars.ravel(),
+        "max_loss": max_loss.ravel(),
+        "num_trades": np.nan,
+    })
+    groups = groups or {}
+    out.insert(0, "group", out["cell"].map(lambda c: groups.get(c, c)))
+    return out
+
+
+def yearly_from_scoreboard(yearly: pd.DataFrame) -> pd.DataFrame:
+    """Long per-(cell, year) table from `utils.scoreboard` per-year rows.
+
+    Cells are diff × contract type × window × SD, grouped by diff × contract
+    type, P&L by entry year as in the scoreboard."""
+    cell = (yearly["product_fam"] + "|" + yearly["diff"] + "|" + yearly["contract_type"] + "|"
+            + yearly["rolling_window"].astype(str) + "m|" + yearly["entry_sd"].astype(str) + "sd")
+    return pd.DataFrame({
+        "group": (yearly["product_fam"] + "|" + yearly["diff"] + "|" + yearly["contract_type"]).to_numpy(),
+        "cell": cell.to_numpy(),
+        "year": yearly["year"].to_numpy(),
+        "pnl": yearly["returns"].to_numpy(dtype=float),
+        "pnl_sq": np.nan,
+        "n_bars": yearly["num_trades"].to_numpy(dtype=float),
+        "active_bars": yearly["num_trades"].to_numpy(dtype=float),
+        "max_loss": yearly["max_loss"].to_numpy(dtype=float),
+        "num_trades": yearly["num_trades"].to_numpy(dtype=float),
+    })
+
+
+def family_groups(meta: dict) -> dict[str, str]:
+    return {cell: m.get("family_tag", cell) for cell, m in meta.items()}
+
+
+def production_winners(meta: dict) -> pd.DataFrame:
+    """(year, group, cell, P_winner) rows of the production picks in `meta.json`."""
+    rows = [{"year": int(y), "group": m.get("family_tag", cell), "cell": cell, "P_winner": p}
+            for cell, m in meta.items() for y, p in m.get("P_winner_by_year", {}).items()]
+    return pd.DataFrame(rows, columns=["year", "group", "cell", "P_winner"])
+
+
+# ── Cube ──────────────────────────────────────────────────────────────
+
+class YearlyCube:
+    """Per-year sums as (field, cell, year) arrays with O(1) window sums."""
+
+    def __init__(self, yearly: pd.DataFrame):
+        cells = yearly.drop_duplicates("cell")[["cell", "group"]].reset_index(drop=True)
+        self.cells = cells["cell"].to_numpy()
+        self.groups = cells["group"].to_numpy()
+        self.years = np.sort(yearly["year"].unique())
+        ci = pd.Index(self.cells).get_indexer(yearly["cell"])
+        yi = np.searchsorted(self.years, yearly["year"].to_numpy())
+        # A (cell, year) is present if the cell traded in it.
+        self.present = np.zeros((len(self.cells), len(self.years)), dtype=bool)
+        active = yearly["active_bars"] if "active_bars" in yearly else yearly["n_bars"]
+        self.present[ci, yi] = active.to_numpy(dtype=float) > 0
+        self._cum = {}
+        for field in YEARLY_FIELDS:
+            grid = np.zeros((len(self.cells), len(self.years)))
+            vals = yearly[field].to_numpy(dtype=float) if field in yearly else np.full(len(yearly), np.nan)
+            grid[ci, yi] = vals
+            # cum[:, j] = sum of years < j
+            self._cum[field] = np.concatenate([np.zeros((len(self.cells), 1)), np.cumsum(grid, axis=1)], axis=1)
+        self._cum["years_present"] = np.concatenate(
+            [np.zeros((len(self.cells), 1)), np.cumsum(self.present, axis=1)], axis=1)
+
+    def year_index(self, year: int) -> int:
+        return int(np.searchsorted(self.years, year))
+
+    def window(self, field: str, start: int, stop: int) -> np.ndarray:
+        """Per-cell sum of `field` over year positions [start, stop)."""
+        cum = self._cum[field]
+        return cum[:, stop] - cum[:, start]
+
+    def window_stats(self, start: int, stop: int) -> dict[str, np.ndarray]:
+        stats = {f: self.window(f, start, stop) for f in YEARLY_FIELDS}
+        stats["years_present"] = self.window("years_present", start, stop)
+        stats["n_years"] = stop - start
+        return stats
+
+    def year_pnl(self, pos: int) -> np.ndarray:
+        return self.window("pnl", pos, pos + 1)
+
+
+# ── Selection rules ───────────────────────────────────────────────────
+
+def score_total(s: dict) -> np.ndarray:
+    return s["pnl"]
+
+
+def score_avg_yearly(s: dict) -> np.ndarray:
+    return s["pnl"] / s["n_years"]
+
+
+def score_sharpe(s: dict) -> np.ndarray:
+    n = s["n_bars"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = s["pnl"] / n
+        var = (s["pnl_sq"] - n * mean ** 2) / (n - 1)
+        return np.where(var > 0, mean / np.sqrt(var) * np.sqrt(TRADING_DAYS_PER_YEAR), np.nan)
+
+
+def score_ratio(s: dict) -> np.ndarray:
+    """P&L over summed yearly max loss (the sweep's `ratio`)."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(s["max_loss"] < 0, s["pnl"] / -s["max_loss"], np.nan)
+
+
+SCORERS = {
+    "total": score_total,
+    "avg_yearly": score_avg_yearly,
+    "sharpe": score_sharpe,
+    "ratio": score_ratio,
+}
+
+
+# ── Walk-forward ──────────────────────────────────────────────────────
+
+def walk_forward(yearly: pd.DataFrame, lookback: int = 3, rule="sharpe", top_k: int = 1,
+                 test_years=None, min_years: int | None = None) -> pd.DataFrame:
+    """Out-of-sample picks, one row per (test year, group, pick).
+
+    `rule` is a key of `SCORERS` or a function of the window-stats dict
+    returning one score per cell (higher is better; NaN never picked). A cell
+    must have traded in at least `min_years` (default: all) of the lookback
+    years."""
+    cube = YearlyCube(yearly)
+    scorer = SCORERS[rule] if isinstance(rule, str) else rule
+    min_years = lookback if min_years is None else min_years
+    if test_years is None:
+        test_years = cube.years[lookback:]
+    group_codes, group_names = pd.factorize(cube.groups)
+
+    rows = []
+    for year in test_years:
+        stop = cube.year_index(year)
+        start = stop - lookback
+        if start < 0 or stop >= len(cube.years) or cube.years[stop] != year:
+            continue
+        stats = cube.window_stats(start, stop)
+        score = np.asarray(scorer(stats), dtype=float)
+        eligible = (stats["years_present"] >= min_years) & ~np.isnan(score)
+        if not eligible.any():
+            continue
+        # Rank within group: sort by (group, -score) and keep the first top_k.
+        idx = np.flatnonzero(eligible)
+        order = idx[np.lexsort((-score[idx], group_codes[idx]))]
+        g = group_codes[order]
+        first = np.r_[True, g[1:] != g[:-1]]
+        rank = np.arange(len(order)) - np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))
+        picked = order[rank < top_k]
+        oos = cube.year_pnl(stop)
+        for c, r in zip(picked, rank[rank < top_k]):
+            rows.append({
+                "year": int(year),
+                "group": group_names[group_codes[c]],
+                "rank": int(r) + 1,
+                "cell": cube.cells[c],
+                "train_score": float(score[c]),
+                "train_pnl": float(stats["pnl"][c]),
+                "oos_pnl": float(oos[c]),
+                "oos_traded": bool(cube.present[c, stop]),
+            })
+    return pd.DataFrame(rows, columns=["year", "group", "rank", "cell", "train_score",
+                                       "train_pnl", "oos_pnl", "oos_traded"])
+
+
+def summarise(picks: pd.DataFrame, yearly: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Per test year: picks, OOS P&L (equal weight per pick) and, given the
+    yearly table, the oracle (best cell in hindsight per group) for scale."""
+    if picks.empty:
+        return pd.DataFrame(columns=["year", "num_picks", "oos_pnl", "oos_win_rate", "oracle_pnl"])
+    out = picks.groupby("year").agg(
+        num_picks=("cell", "count"),
+        oos_pnl=("oos_pnl", "sum"),
+        oos_win_rate=("oos_pnl", lambda s: round(100 * (s > 0).mean(), 1)),
+    ).reset_index()
+    if yearly is not None:
+        test = yearly[yearly["year"].isin(out["year"]) & yearly["group"].isin(picks["group"].unique())]
+        oracle = test.groupby(["year", "group"])["pnl"].max().groupby(level="year").sum()
+        out["oracle_pnl"] = out["year"].map(oracle).round(3)
+    out["oos_pnl"] = out["oos_pnl"].round(3)
+    return out
+
+
+def compare_with_production(picks: pd.DataFrame, meta: dict) -> pd.DataFrame:
+    """Join the engine's rank-1 picks with the production winners per (year, group)."""
+    prod = production_winners(meta).rename(columns={"cell": "production_cell"})
+    ours = picks[picks["rank"] == 1][["year", "group", "cell", "oos_pnl"]]
+    out = ours.merge(prod, on=["year", "group"], how="outer")
+    out["same_pick"] = out["cell"] == out["production_cell"]
+    return out.sort_values(["year", "group"], ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Walk-forward cell selection")
+    parser.add_argument("--family", nargs="*", default=["C", "D", "F", "L"])
+    parser.add_argument("--lookback", type=int, default=3)
+    parser.add_argument("--rule", choices=sorted(SCORERS), default="sharpe")
+    parser.add_argument("--top-k", type=int, default=1)
+    parser.add_argument("--out", help="optional .xlsx with picks and summary per family")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for family in args.family:
+        cells, meta = load_family_cells(family)
+        yearly = yearly_from_daily(cells, family_groups(meta))
+        picks = walk_forward(yearly, args.lookback, args.rule, args.top_k)
+        summary = summarise(picks, yearly)
+        match = compare_with_production(picks, meta).dropna(subset=["cell", "production_cell"])
+        results[family] = (picks, summary)
+        print(f"── {family}: {yearly['cell'].nunique()} cells, {yearly['group'].nunique()} groups, "
+              f"same pick as production {match['same_pick'].mean():.0%}")
+        print(summary.to_string(index=False))
+
+    if args.out:
+        with pd.ExcelWriter(args.out) as writer:
+            for family, (picks, summary) in results.items():
+                summary.to_excel(writer, sheet_name=f"{family}_summary", index=False)
+                picks.to_excel(writer, sheet_name=f"{family}_picks", index=False)
+
+
+if __name__ == "__main__":
+    main()